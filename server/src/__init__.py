@@ -5,9 +5,26 @@ from .keling_video_generator import VideoGenerator as KlingVideoGenerator
 from .keling_image_generator import ImageGenerator as KlingImageGenerator, ImageStyle as KlingImageStyle, ImageRatio
 from .cover_generator import CoverGenerator, CoverStyle
 from .url_content_rewriter import UrlContentRewriter
-from .title_rewriter import TitleRewriter
-from .content_style_rewriter import ContentStyleRewriter
+from .title_rewriter import TitleRewriter, TITLE_STYLES
+from .content_style_rewriter import ContentStyleRewriter, CONTENT_STYLES
 from .magazine_card_generator import get_magazine_card_generator, MagazineCardRequest, MagazineStyle, MagazineCardResponse
+from .task_store import TaskStore, get_task_store
+from .task_events import TaskEventBus, get_task_event_bus
+from .job_executor import JobExecutor, JobKind, QueueFullError, map_sequentially
+from .poll_scheduler import PollScheduler, get_poll_scheduler
+from .webhooks import WebhookSigner, get_webhook_signer
+from .http_client import get_http_session, get_async_http_client, close_async_http_client
+from .llm_cache import LLMCache, get_llm_cache, normalize_input
+from .page_cache import PageCache, get_page_cache
+from .progressive_file import ProgressiveFileWriter, ProgressiveFileReader
+from .bulk_jobs import BulkJobStore, BulkJobRunner, get_bulk_job_store, parse_bulk_rows, stream_results_jsonl, stream_results_zip
+from .pipeline import Pipeline, PipelineStage, StageStatus
+from .generator_registry import GeneratorRegistry, GeneratorUnavailableError, get_generator_registry
+from .artifact_index import ArtifactIndex, get_artifact_index, file_cache_headers, is_not_modified
+from .media_response import media_response, MediaStaticFiles, precompress_directory, is_content_hashed, IMMUTABLE_CACHE_CONTROL
+from .blob_store import BlobStore, BlobWriter, get_blob_store
+from .upload_store import save_image_upload, detect_image_type, UploadRejectedError, UploadSizeLimitMiddleware
+from .image_variants import ImageVariantCache, VariantFormat, ImageTooLargeError, VariantWorkerError, get_image_variant_cache
 
 # 导出所有模块，使它们可以通过src包直接导入
 __all__ = [
@@ -15,6 +32,19 @@ __all__ = [
     'MiniMaxiVideoGenerator', 'VideoQuality', 'VideoFormat', 'VideoContentType',
     'KlingVideoGenerator', 'KlingImageGenerator', 'KlingImageStyle', 'ImageRatio',
     'CoverGenerator', 'CoverStyle',
-    'UrlContentRewriter', 'TitleRewriter', 'ContentStyleRewriter',
-    'get_magazine_card_generator', 'MagazineCardRequest', 'MagazineStyle', 'MagazineCardResponse'
+    'UrlContentRewriter', 'TitleRewriter', 'ContentStyleRewriter', 'TITLE_STYLES', 'CONTENT_STYLES',
+    'get_magazine_card_generator', 'MagazineCardRequest', 'MagazineStyle', 'MagazineCardResponse',
+    'TaskStore', 'get_task_store', 'TaskEventBus', 'get_task_event_bus',
+    'JobExecutor', 'JobKind', 'QueueFullError', 'map_sequentially',
+    'PollScheduler', 'get_poll_scheduler', 'WebhookSigner', 'get_webhook_signer',
+    'get_http_session', 'get_async_http_client', 'close_async_http_client',
+    'LLMCache', 'get_llm_cache', 'normalize_input', 'PageCache', 'get_page_cache', 'ProgressiveFileWriter', 'ProgressiveFileReader',
+    'BulkJobStore', 'BulkJobRunner', 'get_bulk_job_store', 'parse_bulk_rows', 'stream_results_jsonl', 'stream_results_zip',
+    'Pipeline', 'PipelineStage', 'StageStatus',
+    'GeneratorRegistry', 'GeneratorUnavailableError', 'get_generator_registry',
+    'ArtifactIndex', 'get_artifact_index', 'file_cache_headers', 'is_not_modified',
+    'media_response', 'MediaStaticFiles', 'precompress_directory', 'is_content_hashed', 'IMMUTABLE_CACHE_CONTROL',
+    'BlobStore', 'BlobWriter', 'get_blob_store',
+    'save_image_upload', 'detect_image_type', 'UploadRejectedError', 'UploadSizeLimitMiddleware',
+    'ImageVariantCache', 'VariantFormat', 'ImageTooLargeError', 'VariantWorkerError', 'get_image_variant_cache'
 ] 
\ No newline at end of file
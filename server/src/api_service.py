@@ -1,19 +1,24 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Query, File, UploadFile, Form, Body, Depends
+from fastapi import FastAPI, HTTPException, Query, File, UploadFile, Form, Body, Depends, Request, WebSocket, WebSocketDisconnect, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any, Union
+from typing import Optional, List, Dict, Any, Union, Tuple, Set
 import os
 import uuid
 import shutil
 import base64
 import io
 import re
+import copy
 from enum import Enum
 import logging
 import json
 import time
+import hashlib
+import asyncio
+import functools
+import threading
 from datetime import datetime
 
 # 导入各个功能模块 - 使用方式二：利用__init__.py的包导入方式
@@ -24,8 +29,18 @@ try:
         MiniMaxiVideoGenerator, VideoQuality, VideoFormat, VideoContentType,
         KlingVideoGenerator, KlingImageGenerator, KlingImageStyle, ImageRatio,
         CoverGenerator, CoverStyle,
-        UrlContentRewriter, TitleRewriter, ContentStyleRewriter,
-        get_magazine_card_generator, MagazineCardRequest, MagazineStyle, MagazineCardResponse
+        UrlContentRewriter, TitleRewriter, ContentStyleRewriter, TITLE_STYLES, CONTENT_STYLES,
+        get_magazine_card_generator, MagazineCardRequest, MagazineStyle, MagazineCardResponse,
+        get_task_store, get_task_event_bus,
+        JobExecutor, JobKind, QueueFullError,
+        get_poll_scheduler, get_webhook_signer,
+        close_async_http_client, get_llm_cache, get_page_cache, normalize_input, ProgressiveFileReader,
+        BulkJobRunner, get_bulk_job_store, parse_bulk_rows, stream_results_jsonl, stream_results_zip,
+        Pipeline, PipelineStage, get_generator_registry, GeneratorUnavailableError,
+        get_artifact_index, media_response, MediaStaticFiles, get_blob_store,
+        save_image_upload, UploadRejectedError, UploadSizeLimitMiddleware,
+        get_image_variant_cache, VariantFormat, ImageTooLargeError, VariantWorkerError,
+        is_content_hashed, IMMUTABLE_CACHE_CONTROL
     )
 except ImportError:
     # 如果相对导入失败，尝试从src包导入
@@ -40,8 +55,18 @@ except ImportError:
             MiniMaxiVideoGenerator, VideoQuality, VideoFormat, VideoContentType,
             KlingVideoGenerator, KlingImageGenerator, KlingImageStyle, ImageRatio,
             CoverGenerator, CoverStyle,
-            UrlContentRewriter, TitleRewriter, ContentStyleRewriter,
-            get_magazine_card_generator, MagazineCardRequest, MagazineStyle, MagazineCardResponse
+            UrlContentRewriter, TitleRewriter, ContentStyleRewriter, TITLE_STYLES, CONTENT_STYLES,
+            get_magazine_card_generator, MagazineCardRequest, MagazineStyle, MagazineCardResponse,
+            get_task_store, get_task_event_bus,
+            JobExecutor, JobKind, QueueFullError,
+            get_poll_scheduler, get_webhook_signer,
+            close_async_http_client, get_llm_cache, get_page_cache, normalize_input, ProgressiveFileReader,
+            BulkJobRunner, get_bulk_job_store, parse_bulk_rows, stream_results_jsonl, stream_results_zip,
+            Pipeline, PipelineStage, get_generator_registry, GeneratorUnavailableError,
+            get_artifact_index, media_response, MediaStaticFiles, get_blob_store,
+            save_image_upload, UploadRejectedError, UploadSizeLimitMiddleware,
+            get_image_variant_cache, VariantFormat, ImageTooLargeError, VariantWorkerError,
+            is_content_hashed, IMMUTABLE_CACHE_CONTROL
         )
     except ImportError as e:
         logging.error(f"导入模块失败: {e}")
@@ -57,6 +82,10 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# 上传文件大小上限（单个文件），请求体超出两个文件的上限时在解析之前直接拒绝
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(10 * 1024 * 1024)))
+app.add_middleware(UploadSizeLimitMiddleware, path="/api/upload", max_bytes=2 * UPLOAD_MAX_BYTES + 64 * 1024)
+
 # 配置CORS
 app.add_middleware(
     CORSMiddleware,
@@ -82,18 +111,52 @@ for dir_name in dirs_to_create:
     print(f"确保目录存在: {dir_name}")
 
 # 添加静态文件服务
-app.mount("/magazine_cards", StaticFiles(directory="magazine_cards"), name="magazine_cards")
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
-app.mount("/files/uploads", StaticFiles(directory="uploads"), name="files_uploads")
+# 静态文件支持Range请求、预压缩和长期缓存
+app.mount("/magazine_cards", MediaStaticFiles(directory="magazine_cards"), name="magazine_cards")
+app.mount("/uploads", MediaStaticFiles(directory="uploads"), name="uploads")
+app.mount("/files/uploads", MediaStaticFiles(directory="uploads"), name="files_uploads")
 # 添加server/src/magazine_cards目录的直接挂载
-app.mount("/server/src/magazine_cards", StaticFiles(directory="server/src/magazine_cards"), name="server_src_magazine_cards")
+app.mount("/server/src/magazine_cards", MediaStaticFiles(directory="server/src/magazine_cards"), name="server_src_magazine_cards")
 
 # 创建输出目录
 os.makedirs("outputs", exist_ok=True)
 os.makedirs("uploads", exist_ok=True)  # 确保上传目录存在
 
-# 任务状态存储
-task_storage = {}
+# 任务状态存储（后端由TASK_STORE_BACKEND环境变量决定，默认SQLite，可在多个工作进程间共享）
+task_store = get_task_store()
+
+# 任务事件总线，用于向SSE/WebSocket连接推送任务状态变化
+task_event_bus = get_task_event_bus()
+
+# 推送连接回查任务存储的间隔(秒)，用于感知其他工作进程更新的任务
+TASK_EVENTS_STORE_POLL_INTERVAL = float(os.getenv("TASK_EVENTS_STORE_POLL_INTERVAL", "2"))
+# SSE心跳间隔(秒)，防止代理断开空闲连接
+TASK_EVENTS_HEARTBEAT_INTERVAL = 15
+# 流式生成推送检查输出文件新内容的间隔(秒)
+TASK_STREAM_POLL_INTERVAL = float(os.getenv("TASK_STREAM_POLL_INTERVAL", "0.2"))
+# 长轮询允许的最长等待时间(秒)
+TASK_LONG_POLL_MAX_WAIT = float(os.getenv("TASK_LONG_POLL_MAX_WAIT", "60"))
+# 多风格封面批量生成时同时进行的生成数量上限
+COVER_BATCH_MAX_PARALLEL = int(os.getenv("COVER_BATCH_MAX_PARALLEL", "4"))
+# 批量任务允许的最大行数
+BULK_JOB_MAX_ROWS = int(os.getenv("BULK_JOB_MAX_ROWS", "1000"))
+# 是否合并内容相同的进行中请求
+TASK_DEDUP_ENABLED = os.getenv("TASK_DEDUP_ENABLED", "true").lower() in ("1", "true", "yes")
+# 请求合并键的最长有效期(秒)，任务结束时即释放；进程异常退出时由任务租约判断任务已中断
+TASK_DEDUP_TTL = float(os.getenv("TASK_DEDUP_TTL", "3600"))
+# 任务租约(秒)：执行任务的进程定期续约，进程退出后租约过期，未结束的任务被视为已中断
+TASK_LEASE_SECONDS = float(os.getenv("TASK_LEASE_SECONDS", "60"))
+# 本进程的标识，记录在任务租约中
+WORKER_ID = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+# 租约过期的任务被标记为失败时的错误信息
+TASK_INTERRUPTED_ERROR = "任务执行中断（服务进程已退出），请重新提交"
+# Idempotency-Key的有效期(秒)，期间同一个键总是返回同一个任务
+IDEMPOTENCY_KEY_TTL = float(os.getenv("IDEMPOTENCY_KEY_TTL", "86400"))
+
+@app.on_event("startup")
+def start_task_store_compaction():
+    """启动任务存储的后台压缩，按保留策略淘汰已结束的任务"""
+    task_store.start_compaction(interval=float(os.getenv("TASK_COMPACTION_INTERVAL", "300")))
 
 class TaskStatus(str, Enum):
     PENDING = "pending"
@@ -108,6 +171,10 @@ class Task(BaseModel):
     completed_at: Optional[str] = None
     result: Optional[Dict[str, Any]] = None
     error: Optional[str] = None
+    queue_position: Optional[int] = None
+
+# 已结束的任务状态，之后不会再发生变化
+FINISHED_TASK_STATUSES = (TaskStatus.COMPLETED.value, TaskStatus.FAILED.value)
 
 # API请求模型
 class MiniMaxiImageRequest(BaseModel):
@@ -177,12 +244,24 @@ class WechatCoverRequest(BaseModel):
     title: str
     emoji_url: Optional[str] = None
     style: str = "default"
+    use_cache: bool = True
+    stream: bool = False
 
 class XiaohongshuCoverRequest(BaseModel):
     content: str
     account_name: str
     slogan: Optional[str] = None
     style: str = "default"
+    use_cache: bool = True
+    stream: bool = False
+
+class XiaohongshuCoverBatchRequest(BaseModel):
+    content: str
+    account_name: str
+    slogan: Optional[str] = None
+    styles: Union[List[str], str] = "all"  # 风格列表，或 "all" 表示全部风格
+    max_parallel: Optional[int] = Field(None, ge=1, description="同时生成的风格数量，不超过COVER_BATCH_MAX_PARALLEL")
+    use_cache: bool = True
 
 class ContentRewriteRequest(BaseModel):
     content: str
@@ -192,13 +271,28 @@ class ContentRewriteRequest(BaseModel):
 class TitleRewriteRequest(BaseModel):
     title: str
     style: Optional[str] = None
+    use_cache: bool = True
 
 class ContentStyleRewriteRequest(BaseModel):
     content: str
     style: str
+    use_cache: bool = True
 
 class UrlContentRewriteRequest(BaseModel):
     url: str = Field(description="需要重写的文章URL")
+    use_cache: bool = True
+
+class ContentPipelineRequest(BaseModel):
+    url: str = Field(description="需要处理的文章URL")
+    title_style: Optional[str] = Field(None, description="标题风格，为空时跳过标题重写")
+    account_name: Optional[str] = Field(None, description="小红书账号名称，为空时跳过封面生成")
+    slogan: Optional[str] = None
+    cover_style: str = "default"
+    card: bool = Field(True, description="是否生成杂志卡片")
+    card_style: Optional[MagazineStyle] = None
+    image: bool = Field(False, description="是否使用海螺API生成配图")
+    image_prompt: Optional[str] = Field(None, description="配图提示词，默认使用重写后的标题")
+    use_cache: bool = True
 
 class MagazineCardBase64Request(BaseModel):
     content: str
@@ -210,16 +304,36 @@ class MagazineCardBase64Request(BaseModel):
     qr_code_base64: Optional[str] = None
     product_image_base64: Optional[str] = None
 
-# 实例化各个生成器
-minimaxi_image_generator = MiniMaxiImageGenerator()
-minimaxi_video_generator = MiniMaxiVideoGenerator()
-kling_image_generator = KlingImageGenerator()
-kling_video_generator = KlingVideoGenerator()
-cover_generator = CoverGenerator()
-url_content_rewriter = UrlContentRewriter()
-title_rewriter = TitleRewriter()
-content_style_rewriter = ContentStyleRewriter()
-magazine_card_generator = get_magazine_card_generator()
+# 登记各个生成器，第一次使用时才创建，某个提供方缺少配置不影响服务启动和其他功能
+generator_registry = get_generator_registry()
+minimaxi_image_generator = generator_registry.register("minimaxi_image", MiniMaxiImageGenerator, provider="minimaxi")
+minimaxi_video_generator = generator_registry.register("minimaxi_video", MiniMaxiVideoGenerator, provider="minimaxi")
+kling_image_generator = generator_registry.register("kling_image", KlingImageGenerator, provider="kling")
+kling_video_generator = generator_registry.register("kling_video", KlingVideoGenerator, provider="kling")
+# 多风格封面和长文分块的并发调用借用LLM作业的空闲名额（job_executor在创建生成器时已初始化）
+cover_generator = generator_registry.register(
+    "cover", lambda: CoverGenerator(map_fn=functools.partial(job_executor.map, JobKind.LLM)), provider="llm"
+)
+url_content_rewriter = generator_registry.register(
+    "url_content", lambda: UrlContentRewriter(map_fn=functools.partial(job_executor.map, JobKind.LLM)), provider="llm"
+)
+title_rewriter = generator_registry.register("title", TitleRewriter, provider="llm")
+content_style_rewriter = generator_registry.register("content_style", ContentStyleRewriter, provider="llm")
+magazine_card_generator = generator_registry.register("magazine_card", get_magazine_card_generator, provider="llm")
+
+@app.exception_handler(GeneratorUnavailableError)
+async def generator_unavailable_handler(request: Request, exc: GeneratorUnavailableError):
+    """生成器缺少配置无法创建时返回503"""
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
+
+@app.on_event("startup")
+def preload_generators():
+    """按GENERATOR_PRELOAD在后台预先创建生成器，不阻塞服务启动"""
+    preload = os.getenv("GENERATOR_PRELOAD", "").strip()
+    if not preload:
+        return
+    names = None if preload == "all" else [name.strip() for name in preload.split(",") if name.strip()]
+    threading.Thread(target=generator_registry.preload, args=(names,), name="generator-preload", daemon=True).start()
 
 # 辅助函数
 def generate_task_id():
@@ -231,12 +345,77 @@ def store_task(task_id: str, status: TaskStatus = TaskStatus.PENDING):
         status=status,
         created_at=datetime.now().isoformat()
     )
-    task_storage[task_id] = task
+    # 先取得租约再写入任务，其他请求看到任务时租约已经存在
+    acquire_task_lease(task_id)
+    task_store.put(task_id, task.model_dump(mode="json"))
     return task
 
+# 本进程持有租约（负责执行）的任务
+task_leases: Set[str] = set()
+
+def task_lease_key(task_id: str) -> str:
+    return f"lease:{task_id}"
+
+def acquire_task_lease(task_id: str):
+    """登记本进程负责执行的任务，租约由后台线程续约直到任务结束"""
+    task_store.set_key(task_lease_key(task_id), WORKER_ID, TASK_LEASE_SECONDS)
+    task_leases.add(task_id)
+
+def release_task_lease(task_id: str):
+    """任务结束或被删除时释放租约"""
+    if task_id in task_leases:
+        task_leases.discard(task_id)
+        task_store.release_key(task_lease_key(task_id), WORKER_ID)
+
+def renew_task_leases():
+    """
+    定期续约本进程的任务，续约间隔为租约时长的三分之一；
+    同时接管其他进程退出后遗留的远程任务（包括服务重启前提交、仍在提供方生成中的任务）
+    """
+    while True:
+        for task_id in list(task_leases):
+            try:
+                task_store.set_key(task_lease_key(task_id), WORKER_ID, TASK_LEASE_SECONDS)
+            except Exception as e:
+                logger.error(f"任务租约续约失败 {task_id}: {str(e)}")
+        try:
+            adopted = adopt_orphaned_remote_tasks()
+            if adopted:
+                logger.info(f"已接管 {adopted} 个遗留的远程任务")
+        except Exception as e:
+            logger.error(f"接管远程任务失败: {str(e)}")
+        time.sleep(TASK_LEASE_SECONDS / 3)
+
+def load_task(task_id: str) -> Optional[Dict[str, Any]]:
+    """
+    读取任务，未结束的任务租约已过期（执行任务的进程已退出）时把任务标记为失败
+
+    Args:
+        task_id: 任务ID
+
+    Returns:
+        任务数据，不存在时返回None
+    """
+    data = task_store.get(task_id)
+    if data is None or data["status"] in FINISHED_TASK_STATUSES or task_id in task_leases:
+        return data
+    if task_store.get_key(task_lease_key(task_id)) is not None:
+        return data
+    # 仍在提供方生成中的远程任务由本进程接管轮询，不标记为失败
+    if adopt_remote_task(task_id):
+        return task_store.get(task_id)
+    logger.warning(f"任务 {task_id} 的租约已过期，执行任务的进程可能已退出")
+    task = update_task_status(task_id, TaskStatus.FAILED, error=TASK_INTERRUPTED_ERROR)
+    return task.model_dump(mode="json") if task else None
+
+async def aload_task(task_id: str) -> Optional[Dict[str, Any]]:
+    """在线程池中读取任务，供异步接口使用：读取任务存储（以及可能的接管和状态写入）不阻塞事件循环"""
+    return await run_in_threadpool(load_task, task_id)
+
 def update_task_status(task_id: str, status: TaskStatus, result=None, error=None):
-    if task_id in task_storage:
-        task = task_storage[task_id]
+    data = task_store.get(task_id)
+    if data is not None:
+        task = Task(**data)
         task.status = status
         if status in [TaskStatus.COMPLETED, TaskStatus.FAILED]:
             task.completed_at = datetime.now().isoformat()
@@ -244,22 +423,446 @@ def update_task_status(task_id: str, status: TaskStatus, result=None, error=None
             task.result = result
         if error:
             task.error = error
-        task_storage[task_id] = task
+        task_data = task.model_dump(mode="json")
+        task_store.put(task_id, task_data)
+        task_event_bus.publish(task_data)
+        if status in [TaskStatus.COMPLETED, TaskStatus.FAILED]:
+            release_task_dedup_key(task_id)
+            release_task_lease(task_id)
+        if status == TaskStatus.COMPLETED and result:
+            index_result_artifacts(result)
         return task
     return None
 
+
+async def aupdate_task_status(task_id: str, status: TaskStatus, result=None, error=None):
+    """在线程池中更新任务状态，供协程作业使用，任务存储的写入不阻塞事件循环"""
+    return await run_in_threadpool(update_task_status, task_id, status, result=result, error=error)
+
+def index_result_artifacts(value: Any):
+    """把任务结果中出现的生成文件路径登记到文件索引，生成后立即可以通过 /api/files 访问"""
+    if isinstance(value, str):
+        artifact_index.add(value)
+    elif isinstance(value, dict):
+        for item in value.values():
+            index_result_artifacts(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            index_result_artifacts(item)
+
+def set_task_queue_positions(positions: Dict[str, Optional[int]]):
+    """更新任务的排队位置，None表示已开始执行"""
+    for task_id, position in positions.items():
+        data = task_store.get(task_id)
+        if data is None or data.get("queue_position") == position:
+            continue
+        data["queue_position"] = position
+        task_store.put(task_id, data)
+        task_event_bus.publish(data)
+
+# 本进程创建的任务 -> 请求合并键，任务结束时释放，之后相同的请求会重新生成
+task_dedup_keys: Dict[str, str] = {}
+
+def request_fingerprint(endpoint: str, request: BaseModel) -> str:
+    """计算请求内容指纹，字符串先统一换行符并去掉首尾空白"""
+    payload = normalize_input(request.model_dump(mode="json"))
+    material = json.dumps({"endpoint": endpoint, "payload": payload}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+def claim_task_key(key: str, value: str, ttl: float, reusable) -> Optional[str]:
+    """
+    在任务存储中登记键，多个工作进程之间只有一个登记成功
+
+    Args:
+        key: 键
+        value: 值
+        ttl: 有效期(秒)
+        reusable: 判断已有的值是否仍可复用的函数，不可复用时（任务已结束或已被淘汰）替换为新值
+
+    Returns:
+        登记成功返回None，否则返回可复用的已有值
+
+    Raises:
+        HTTPException: 多次替换不可复用的已有值后仍未登记成功（其他请求在同时登记同一个键）
+    """
+    for _ in range(3):
+        existing = task_store.claim_key(key, value, ttl)
+        if existing is None or reusable(existing):
+            return existing
+        task_store.release_key(key, existing)
+    raise HTTPException(status_code=503, detail="相同请求正在同时提交，请稍后重试")
+
+def create_task(endpoint: str, request: BaseModel, idempotency_key: Optional[str] = None) -> Tuple[str, bool]:
+    """
+    创建任务，相同的请求复用已有任务而不是重复调用模型和提供方。
+    带Idempotency-Key时同一个键在有效期内总是返回同一个任务（包括已结束的任务），
+    否则内容相同的请求在任务进行中时合并到该任务
+
+    Args:
+        endpoint: 接口名称，不同接口的请求互不合并
+        request: 请求体
+        idempotency_key: 客户端提供的Idempotency-Key请求头
+
+    Returns:
+        (任务ID, 是否复用了已有任务)
+    """
+    fingerprint = request_fingerprint(endpoint, request)
+    task_id = generate_task_id()
+    # 先写入任务再登记键，保证其他请求看到键时任务已经存在
+    store_task(task_id)
+
+    # 已中断的任务不再复用，load_task会把它标记为失败
+    def exists(value: str) -> bool:
+        data = load_task(value.split(":", 1)[0])
+        return data is not None and data.get("error") != TASK_INTERRUPTED_ERROR
+
+    def running(value: str) -> bool:
+        data = load_task(value)
+        return data is not None and data["status"] not in FINISHED_TASK_STATUSES
+
+    def discard():
+        release_task_lease(task_id)
+        task_store.delete(task_id)
+
+    idempotency_claim = None
+    if idempotency_key:
+        idempotency_claim = f"idempotency:{endpoint}:{idempotency_key}"
+        try:
+            existing = claim_task_key(idempotency_claim, f"{task_id}:{fingerprint}", IDEMPOTENCY_KEY_TTL, exists)
+        except HTTPException:
+            discard()
+            raise
+        if existing is not None:
+            release_task_lease(task_id)
+            task_store.delete(task_id)
+            existing_task_id, _, existing_fingerprint = existing.partition(":")
+            if existing_fingerprint != fingerprint:
+                raise HTTPException(status_code=422, detail="Idempotency-Key已用于内容不同的请求")
+            logger.info(f"Idempotency-Key命中，返回已有任务 {existing_task_id}")
+            return existing_task_id, True
+
+    if TASK_DEDUP_ENABLED:
+        dedup_key = f"inflight:{fingerprint}"
+        try:
+            existing = claim_task_key(dedup_key, task_id, TASK_DEDUP_TTL, running)
+        except HTTPException:
+            discard()
+            if idempotency_claim:
+                task_store.release_key(idempotency_claim, f"{task_id}:{fingerprint}")
+            raise
+        if existing is not None:
+            release_task_lease(task_id)
+            task_store.delete(task_id)
+            if idempotency_claim:
+                task_store.set_key(idempotency_claim, f"{existing}:{fingerprint}", IDEMPOTENCY_KEY_TTL)
+            logger.info(f"相同请求正在进行，合并到任务 {existing}")
+            return existing, True
+        task_dedup_keys[task_id] = dedup_key
+
+    return task_id, False
+
+def release_task_dedup_key(task_id: str):
+    """任务结束或被删除时释放请求合并键"""
+    dedup_key = task_dedup_keys.pop(task_id, None)
+    if dedup_key:
+        task_store.release_key(dedup_key, task_id)
+
+# 后台作业执行器，按LLM/图像/视频分别限制并发和排队数
+job_executor = JobExecutor.from_env(on_queue_change=set_task_queue_positions)
+
+# 远程任务回调通知签名器，配置WEBHOOK_BASE_URL和WEBHOOK_SECRET后启用
+webhook_signer = get_webhook_signer()
+
+# 远程任务轮询调度器，海螺/Kling的在途任务集中在事件循环中查询，不再每个任务占用一个线程
+poll_scheduler = get_poll_scheduler()
+
+# 回调通知落到其他工作进程时，通过任务存储中的唤醒键转交给正在轮询该任务的进程
+WEBHOOK_WAKEUP_PREFIX = "wakeup:"
+WEBHOOK_WAKEUP_TTL = 300
+
+def take_webhook_wakeups(watching: List[str]) -> List[str]:
+    """读取并删除本进程正在轮询的任务的唤醒键，返回需要立即查询的任务"""
+    if not webhook_signer.enabled:
+        return []
+    watching = set(watching)
+    woken = []
+    for key in task_store.list_keys(WEBHOOK_WAKEUP_PREFIX):
+        poll_key = key[len(WEBHOOK_WAKEUP_PREFIX):]
+        if poll_key in watching and task_store.release_key(key):
+            woken.append(poll_key)
+    return woken
+
+poll_scheduler.wakeup_source = take_webhook_wakeups
+
+# LLM响应缓存，封面、杂志卡片、标题、风格重写和URL内容重写共用
+llm_cache = get_llm_cache()
+
+# 网页正文和译文缓存，同一URL换风格重写时不再重复下载和翻译
+page_cache = get_page_cache()
+
+# 生成文件索引，/api/files 按索引直接定位文件
+artifact_index = get_artifact_index()
+
+# 按内容寻址的文件存储，相同内容的生成文件和上传文件只保存一份
+blob_store = get_blob_store()
+blob_store.discover(dirs_to_create)
+
+# 派生图片缓存，缩略图等在进程池中生成
+image_variant_cache = get_image_variant_cache()
+
+@app.on_event("startup")
+async def start_poll_scheduler():
+    """在事件循环中启动远程任务轮询调度器，之后启动任务租约的续约（同时接管遗留的远程任务）"""
+    poll_scheduler.start()
+    threading.Thread(target=renew_task_leases, name="task-lease-renewal", daemon=True).start()
+
+@app.on_event("startup")
+async def start_artifact_index():
+    """启动文件索引的后台扫描"""
+    artifact_index.start()
+
+@app.on_event("shutdown")
+async def close_provider_connections():
+    """关闭提供方异步连接池"""
+    await close_async_http_client()
+
+@app.on_event("shutdown")
+async def stop_image_variant_workers():
+    """关闭派生图片的编码进程"""
+    image_variant_cache.shutdown()
+
+def submit_job(kind: JobKind, task_id: str, fn):
+    """提交后台作业，排队已满时删除任务并返回429"""
+    try:
+        position = job_executor.submit(kind, task_id, fn)
+    except QueueFullError as e:
+        release_task_dedup_key(task_id)
+        release_task_lease(task_id)
+        task_store.delete(task_id)
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    if position:
+        set_task_queue_positions({task_id: position})
+
+async def complete_minimaxi_image(task_id: str, spec: Dict[str, Any], generation_result):
+    """海螺图像任务完成：下载图像并更新任务状态"""
+    if "images" not in generation_result:
+        await aupdate_task_status(task_id, TaskStatus.FAILED, error="No images in generation result")
+        return
+
+    # 下载图像
+    image_paths = await minimaxi_image_generator.adownload_all_images(
+        generation_result, 
+        prefix=f"minimaxi_{task_id}"
+    )
+
+    # 构建结果
+    images_info = []
+    for i, path in enumerate(image_paths):
+        images_info.append({
+            "index": i,
+            "url": generation_result["images"][i].get("url", ""),
+            "local_path": os.path.relpath(path)
+        })
+    await aupdate_task_status(task_id, TaskStatus.COMPLETED, result={"images": images_info})
+
+async def complete_minimaxi_video(task_id: str, spec: Dict[str, Any], video_result):
+    """海螺视频任务完成：下载视频并更新任务状态"""
+    if "video_url" not in video_result:
+        await aupdate_task_status(task_id, TaskStatus.FAILED, error="No video URL in result")
+        return
+
+    output_path = os.path.join(minimaxi_video_generator.output_dir, spec["filename"])
+    video_path = await minimaxi_video_generator.adownload_video(video_result["video_url"], output_path)
+    await aupdate_task_status(
+        task_id, 
+        TaskStatus.COMPLETED, 
+        result={
+            "video_url": video_result["video_url"],
+            "local_path": os.path.relpath(video_path)
+        }
+    )
+
+async def complete_kling_video(task_id: str, spec: Dict[str, Any], video_result):
+    """Kling视频任务完成：下载视频并更新任务状态"""
+    output_path = os.path.join(kling_video_generator.output_dir, spec["filename"])
+    video_path = await kling_video_generator.adownload_video(video_result.video_url, output_path)
+    await aupdate_task_status(
+        task_id, 
+        TaskStatus.COMPLETED, 
+        result={
+            "video_url": video_result.video_url,
+            "local_path": os.path.relpath(video_path)
+        }
+    )
+
+# 远程任务类型 -> (提供方, 查询函数, 完成处理, 首次查询间隔, 超时时间)
+# 查询函数和完成处理只依赖保存的参数，服务重启后可以据此恢复轮询
+REMOTE_TASK_KINDS = {
+    "minimaxi_image": ("minimaxi", lambda: minimaxi_image_generator.acheck_task, complete_minimaxi_image, 2, 180),
+    "minimaxi_video": ("minimaxi", lambda: minimaxi_video_generator.acheck_task, complete_minimaxi_video, 5, 600),
+    "kling_video": ("kling", lambda: kling_video_generator.acheck_task, complete_kling_video, 5, 300),
+}
+
+def remote_task_key(task_id: str) -> str:
+    return f"remote:{task_id}"
+
+def watch_remote_task(task_id: str, kind: str, spec: Dict[str, Any]):
+    """
+    把远程生成任务登记到轮询调度器，提交作业随即结束并释放并发名额。
+    远程任务同时记录在任务存储中，本进程退出后由其他进程（或重启后的进程）接管轮询；
+    配置了回调通知时，轮询只作为慢速兜底，任务通常由 /api/webhooks/{provider} 直接完成
+
+    Args:
+        task_id: 本地任务ID
+        kind: 远程任务类型，见REMOTE_TASK_KINDS
+        spec: 恢复轮询所需的参数，包括远程任务ID（remote_task_id）和输出文件名等，必须可以JSON序列化
+    """
+    timeout = REMOTE_TASK_KINDS[kind][4]
+    record = {"kind": kind, "spec": spec, "deadline": time.time() + timeout}
+    # 记录保留到超时之后再过一个租约周期，保证接管的进程能发现已超时的任务
+    task_store.set_key(remote_task_key(task_id), json.dumps(record), timeout + TASK_LEASE_SECONDS)
+    start_remote_watch(task_id, record)
+
+def start_remote_watch(task_id: str, record: Dict[str, Any]):
+    """根据远程任务记录登记轮询，任务结束后删除记录"""
+    provider, check, on_complete, interval, _ = REMOTE_TASK_KINDS[record["kind"]]
+    spec = record["spec"]
+    key = f"{provider}:{task_id}"
+
+    async def complete(result):
+        try:
+            await on_complete(task_id, spec, result)
+        except Exception as e:
+            logger.error(f"Error handling remote task {key}: {str(e)}")
+            await aupdate_task_status(task_id, TaskStatus.FAILED, error=str(e))
+        finally:
+            await run_in_threadpool(task_store.release_key, remote_task_key(task_id))
+
+    def fail(error: Exception):
+        update_task_status(task_id, TaskStatus.FAILED, error=str(error))
+        task_store.release_key(remote_task_key(task_id))
+
+    if webhook_signer.enabled:
+        interval = max(interval, poll_scheduler.max_interval)
+    poll_scheduler.watch(
+        key,
+        functools.partial(check(), spec["remote_task_id"]),
+        complete,
+        fail,
+        interval=interval,
+        timeout=max(0.0, record["deadline"] - time.time())
+    )
+
+def adopt_remote_task(task_id: str, raw_record: Optional[str] = None) -> bool:
+    """
+    接管租约已过期的远程任务（原进程已退出），在本进程中恢复轮询
+
+    Args:
+        task_id: 本地任务ID
+        raw_record: 已读取的远程任务记录，默认从任务存储读取
+
+    Returns:
+        是否由本进程接管
+    """
+    raw_record = raw_record or task_store.get_key(remote_task_key(task_id))
+    if raw_record is None or task_id in task_leases:
+        return False
+    # 多个进程同时发现时只有一个能取得租约
+    if task_store.claim_key(task_lease_key(task_id), WORKER_ID, TASK_LEASE_SECONDS) is not None:
+        return False
+    task_leases.add(task_id)
+
+    data = task_store.get(task_id)
+    if data is None or data["status"] in FINISHED_TASK_STATUSES:
+        release_task_lease(task_id)
+        task_store.release_key(remote_task_key(task_id))
+        return False
+    try:
+        start_remote_watch(task_id, json.loads(raw_record))
+    except Exception as e:
+        logger.error(f"恢复远程任务 {task_id} 失败: {str(e)}")
+        update_task_status(task_id, TaskStatus.FAILED, error=TASK_INTERRUPTED_ERROR)
+        task_store.release_key(remote_task_key(task_id))
+        return False
+    logger.info(f"已接管远程任务 {task_id}")
+    return True
+
+def adopt_orphaned_remote_tasks() -> int:
+    """接管所有租约已过期的远程任务，返回接管的数量"""
+    adopted = 0
+    for key, raw_record in task_store.list_keys("remote:").items():
+        task_id = key[len("remote:"):]
+        if task_id in task_leases or task_store.get_key(task_lease_key(task_id)) is not None:
+            continue
+        if adopt_remote_task(task_id, raw_record):
+            adopted += 1
+    return adopted
+
+async def wait_remote_result(task_id: str, provider: str, check, interval: float, timeout: float):
+    """
+    把远程生成任务登记到轮询调度器并等待结果，供需要在同一个作业中继续处理结果的场景（如内容流水线）使用。
+    与watch_remote_task相同，配置了回调通知时由 /api/webhooks/{provider} 直接完成
+
+    Args:
+        task_id: 回调URL中使用的本地ID
+        provider: 提供方名称
+        check: 查询一次远程状态的协程函数
+        interval: 首次查询间隔(秒)
+        timeout: 超时时间(秒)
+
+    Returns:
+        远程任务的结果
+
+    Raises:
+        Exception: 远程任务失败或超时
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def resolve(result=None, error: Optional[Exception] = None):
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    # 回调可能在调度器的线程池中执行，通过事件循环设置结果
+    def complete(result):
+        loop.call_soon_threadsafe(resolve, result)
+
+    def fail(error: Exception):
+        loop.call_soon_threadsafe(resolve, None, error)
+
+    if webhook_signer.enabled:
+        interval = max(interval, poll_scheduler.max_interval)
+    poll_scheduler.watch(f"{provider}:{task_id}", check, complete, fail, interval=interval, timeout=timeout)
+    return await future
+
+def format_sse_event(event: str, data: Dict[str, Any]) -> str:
+    """格式化一条Server-Sent Events消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
 # 海螺图像生成API
 @app.post("/api/minimaxi/images/generate", response_model=Dict[str, str])
-async def generate_minimaxi_image(request: MiniMaxiImageRequest, background_tasks: BackgroundTasks):
+async def generate_minimaxi_image(
+    request: MiniMaxiImageRequest,
+    idempotency_key: Optional[str] = Header(None, description="幂等键，客户端重试时携带相同的值会得到同一个任务")
+):
     """生成图像（使用海螺API）"""
-    task_id = generate_task_id()
-    store_task(task_id)
+    task_id, existing = create_task("minimaxi.images", request, idempotency_key)
+    if existing:
+        return {"task_id": task_id}
     
-    def process_task():
+    async def process_task():
         try:
-            update_task_status(task_id, TaskStatus.PROCESSING)
+            await aupdate_task_status(task_id, TaskStatus.PROCESSING)
             
-            result = minimaxi_image_generator.generate_image(
+            result = await minimaxi_image_generator.agenerate_image(
                 prompt=request.prompt,
                 negative_prompt=request.negative_prompt,
                 model=request.model,
@@ -271,69 +874,42 @@ async def generate_minimaxi_image(request: MiniMaxiImageRequest, background_task
                 guidance_scale=request.guidance_scale,
                 num_images=request.num_images,
                 seed=request.seed,
-                reference_images=request.reference_images
+                reference_images=request.reference_images,
+                webhook_url=webhook_signer.build_url("minimaxi", task_id)
             )
             
             if "error" in result:
-                update_task_status(task_id, TaskStatus.FAILED, error=result["error"])
+                await aupdate_task_status(task_id, TaskStatus.FAILED, error=result["error"])
                 return
                 
             if "task_id" in result:
-                # 异步任务，需要等待结果
-                try:
-                    generation_result = minimaxi_image_generator.wait_for_result(result["task_id"])
-                    if "images" in generation_result:
-                        # 下载图像
-                        image_paths = minimaxi_image_generator.download_all_images(
-                            generation_result, 
-                            prefix=f"minimaxi_{task_id}"
-                        )
-                        
-                        # 构建结果
-                        images_info = []
-                        for i, path in enumerate(image_paths):
-                            # 获取相对路径
-                            rel_path = os.path.relpath(path)
-                            images_info.append({
-                                "index": i,
-                                "url": generation_result["images"][i].get("url", ""),
-                                "local_path": rel_path
-                            })
-                            
-                        update_task_status(
-                            task_id, 
-                            TaskStatus.COMPLETED, 
-                            result={"images": images_info}
-                        )
-                    else:
-                        update_task_status(
-                            task_id, 
-                            TaskStatus.FAILED, 
-                            error="No images in generation result"
-                        )
-                except Exception as e:
-                    update_task_status(task_id, TaskStatus.FAILED, error=str(e))
+                # 异步任务，登记到轮询调度器，完成后下载图像
+                await run_in_threadpool(watch_remote_task, task_id, "minimaxi_image", {"remote_task_id": result["task_id"]})
             else:
-                update_task_status(task_id, TaskStatus.FAILED, error="Failed to submit task")
+                await aupdate_task_status(task_id, TaskStatus.FAILED, error="Failed to submit task")
         except Exception as e:
             logger.error(f"Error processing image generation task: {str(e)}")
-            update_task_status(task_id, TaskStatus.FAILED, error=str(e))
+            await aupdate_task_status(task_id, TaskStatus.FAILED, error=str(e))
     
-    background_tasks.add_task(process_task)
+    submit_job(JobKind.IMAGE, task_id, process_task)
     return {"task_id": task_id}
 
 # Kling图像生成API
 @app.post("/api/kling/images/generate", response_model=Dict[str, str])
-async def generate_kling_image(request: KlingImageRequest, background_tasks: BackgroundTasks):
+async def generate_kling_image(
+    request: KlingImageRequest,
+    idempotency_key: Optional[str] = Header(None, description="幂等键，客户端重试时携带相同的值会得到同一个任务")
+):
     """生成图像（使用Kling API）"""
-    task_id = generate_task_id()
-    store_task(task_id)
+    task_id, existing = create_task("kling.images", request, idempotency_key)
+    if existing:
+        return {"task_id": task_id}
     
-    def process_task():
+    async def process_task():
         try:
-            update_task_status(task_id, TaskStatus.PROCESSING)
+            await aupdate_task_status(task_id, TaskStatus.PROCESSING)
             
-            result = kling_image_generator.generate_image(
+            result = await kling_image_generator.agenerate_image(
                 prompt=request.prompt,
                 negative_prompt=request.negative_prompt,
                 ratio=request.ratio,
@@ -341,20 +917,21 @@ async def generate_kling_image(request: KlingImageRequest, background_tasks: Bac
                 steps=request.steps,
                 seed=request.seed,
                 model=request.model,
-                guidance_scale=request.guidance_scale
+                guidance_scale=request.guidance_scale,
+                save_to_file=False
             )
             
             if "error" in result:
-                update_task_status(task_id, TaskStatus.FAILED, error=result["error"])
+                await aupdate_task_status(task_id, TaskStatus.FAILED, error=result["error"])
                 return
                 
             # Kling API返回直接结果
             if "url" in result:
                 # 下载图像
                 output_path = os.path.join(kling_image_generator.output_dir, f"kling_{task_id}.png")
-                local_path = kling_image_generator._save_image_from_url(result["url"], request.prompt)
+                local_path = await kling_image_generator._asave_image_from_url(result["url"], request.prompt)
                 
-                update_task_status(
+                await aupdate_task_status(
                     task_id, 
                     TaskStatus.COMPLETED, 
                     result={
@@ -363,26 +940,30 @@ async def generate_kling_image(request: KlingImageRequest, background_tasks: Bac
                     }
                 )
             else:
-                update_task_status(task_id, TaskStatus.FAILED, error="No URL in result")
+                await aupdate_task_status(task_id, TaskStatus.FAILED, error="No URL in result")
         except Exception as e:
             logger.error(f"Error processing image generation task: {str(e)}")
-            update_task_status(task_id, TaskStatus.FAILED, error=str(e))
+            await aupdate_task_status(task_id, TaskStatus.FAILED, error=str(e))
     
-    background_tasks.add_task(process_task)
+    submit_job(JobKind.IMAGE, task_id, process_task)
     return {"task_id": task_id}
 
 # 海螺视频生成API
 @app.post("/api/minimaxi/videos/generate", response_model=Dict[str, str])
-async def generate_minimaxi_video(request: MiniMaxiVideoRequest, background_tasks: BackgroundTasks):
+async def generate_minimaxi_video(
+    request: MiniMaxiVideoRequest,
+    idempotency_key: Optional[str] = Header(None, description="幂等键，客户端重试时携带相同的值会得到同一个任务")
+):
     """生成视频（使用海螺API）"""
-    task_id = generate_task_id()
-    store_task(task_id)
+    task_id, existing = create_task("minimaxi.videos", request, idempotency_key)
+    if existing:
+        return {"task_id": task_id}
     
-    def process_task():
+    async def process_task():
         try:
-            update_task_status(task_id, TaskStatus.PROCESSING)
+            await aupdate_task_status(task_id, TaskStatus.PROCESSING)
             
-            result = minimaxi_video_generator.generate_video(
+            result = await minimaxi_video_generator.agenerate_video(
                 prompt=request.prompt,
                 negative_prompt=request.negative_prompt,
                 images=request.images,
@@ -390,62 +971,45 @@ async def generate_minimaxi_video(request: MiniMaxiVideoRequest, background_task
                 content_type=request.content_type,
                 quality=request.quality,
                 format=request.format,
-                seed=request.seed
+                seed=request.seed,
+                webhook_url=webhook_signer.build_url("minimaxi", task_id)
             )
             
             if "error" in result:
-                update_task_status(task_id, TaskStatus.FAILED, error=result["error"])
+                await aupdate_task_status(task_id, TaskStatus.FAILED, error=result["error"])
                 return
                 
             if "task_id" in result:
-                # 异步任务，需要等待结果
-                try:
-                    video_result = minimaxi_video_generator.wait_for_result(result["task_id"])
-                    if "video_url" in video_result:
-                        # 下载视频
-                        output_path = os.path.join(
-                            minimaxi_video_generator.output_dir, 
-                            f"minimaxi_video_{task_id}.{request.format}"
-                        )
-                        video_path = minimaxi_video_generator.download_video(video_result["video_url"], output_path)
-                        
-                        update_task_status(
-                            task_id, 
-                            TaskStatus.COMPLETED, 
-                            result={
-                                "video_url": video_result["video_url"],
-                                "local_path": os.path.relpath(video_path)
-                            }
-                        )
-                    else:
-                        update_task_status(
-                            task_id, 
-                            TaskStatus.FAILED, 
-                            error="No video URL in result"
-                        )
-                except Exception as e:
-                    update_task_status(task_id, TaskStatus.FAILED, error=str(e))
+                # 异步任务，登记到轮询调度器，完成后下载视频
+                await run_in_threadpool(watch_remote_task, task_id, "minimaxi_video", {
+                    "remote_task_id": result["task_id"],
+                    "filename": f"minimaxi_video_{task_id}.{request.format}"
+                })
             else:
-                update_task_status(task_id, TaskStatus.FAILED, error="Failed to submit task")
+                await aupdate_task_status(task_id, TaskStatus.FAILED, error="Failed to submit task")
         except Exception as e:
             logger.error(f"Error processing video generation task: {str(e)}")
-            update_task_status(task_id, TaskStatus.FAILED, error=str(e))
+            await aupdate_task_status(task_id, TaskStatus.FAILED, error=str(e))
     
-    background_tasks.add_task(process_task)
+    submit_job(JobKind.VIDEO, task_id, process_task)
     return {"task_id": task_id}
 
 # Kling文本到视频API
 @app.post("/api/kling/videos/text-to-video", response_model=Dict[str, str])
-async def generate_kling_text_to_video(request: KlingVideoFromTextRequest, background_tasks: BackgroundTasks):
+async def generate_kling_text_to_video(
+    request: KlingVideoFromTextRequest,
+    idempotency_key: Optional[str] = Header(None, description="幂等键，客户端重试时携带相同的值会得到同一个任务")
+):
     """生成视频（使用Kling API从文本）"""
-    task_id = generate_task_id()
-    store_task(task_id)
+    task_id, existing = create_task("kling.text_to_video", request, idempotency_key)
+    if existing:
+        return {"task_id": task_id}
     
-    def process_task():
+    async def process_task():
         try:
-            update_task_status(task_id, TaskStatus.PROCESSING)
+            await aupdate_task_status(task_id, TaskStatus.PROCESSING)
             
-            result = kling_video_generator.generate_video_from_text(
+            result = await kling_video_generator.agenerate_video_from_text(
                 prompt=request.prompt,
                 negative_prompt=request.negative_prompt,
                 duration=request.duration,
@@ -458,55 +1022,38 @@ async def generate_kling_text_to_video(request: KlingVideoFromTextRequest, backg
                 model=request.model,
                 style=request.style,
                 output_format=request.output_format,
-                quality=request.quality
+                quality=request.quality,
+                callback_url=webhook_signer.build_url("kling", task_id)
             )
             
-            # 等待结果
-            try:
-                video_result = kling_video_generator.wait_for_result(result.task_id)
-                if kling_video_generator.is_generation_completed(result.task_id):
-                    # 下载视频
-                    output_path = os.path.join(
-                        kling_video_generator.output_dir, 
-                        f"kling_t2v_{task_id}.{request.output_format}"
-                    )
-                    video_path = kling_video_generator.download_video(video_result.video_url, output_path)
-                    
-                    update_task_status(
-                        task_id, 
-                        TaskStatus.COMPLETED, 
-                        result={
-                            "video_url": video_result.video_url,
-                            "local_path": os.path.relpath(video_path)
-                        }
-                    )
-                else:
-                    update_task_status(
-                        task_id, 
-                        TaskStatus.FAILED, 
-                        error=f"Task failed with status: {video_result.status}"
-                    )
-            except Exception as e:
-                update_task_status(task_id, TaskStatus.FAILED, error=str(e))
+            # 登记到轮询调度器，完成后下载视频
+            await run_in_threadpool(watch_remote_task, task_id, "kling_video", {
+                "remote_task_id": result.task_id,
+                "filename": f"kling_t2v_{task_id}.{request.output_format}"
+            })
         except Exception as e:
             logger.error(f"Error processing text-to-video task: {str(e)}")
-            update_task_status(task_id, TaskStatus.FAILED, error=str(e))
+            await aupdate_task_status(task_id, TaskStatus.FAILED, error=str(e))
     
-    background_tasks.add_task(process_task)
+    submit_job(JobKind.VIDEO, task_id, process_task)
     return {"task_id": task_id}
 
 # Kling图像到视频API
 @app.post("/api/kling/videos/image-to-video", response_model=Dict[str, str])
-async def generate_kling_image_to_video(request: KlingVideoFromImageRequest, background_tasks: BackgroundTasks):
+async def generate_kling_image_to_video(
+    request: KlingVideoFromImageRequest,
+    idempotency_key: Optional[str] = Header(None, description="幂等键，客户端重试时携带相同的值会得到同一个任务")
+):
     """生成视频（使用Kling API从图像）"""
-    task_id = generate_task_id()
-    store_task(task_id)
+    task_id, existing = create_task("kling.image_to_video", request, idempotency_key)
+    if existing:
+        return {"task_id": task_id}
     
-    def process_task():
+    async def process_task():
         try:
-            update_task_status(task_id, TaskStatus.PROCESSING)
+            await aupdate_task_status(task_id, TaskStatus.PROCESSING)
             
-            result = kling_video_generator.generate_video_from_image(
+            result = await kling_video_generator.agenerate_video_from_image(
                 image_url=request.image_url,
                 prompt=request.prompt,
                 negative_prompt=request.negative_prompt,
@@ -518,49 +1065,48 @@ async def generate_kling_image_to_video(request: KlingVideoFromImageRequest, bac
                 seed=request.seed,
                 model=request.model,
                 output_format=request.output_format,
-                quality=request.quality
+                quality=request.quality,
+                callback_url=webhook_signer.build_url("kling", task_id)
             )
             
-            # 等待结果
-            try:
-                video_result = kling_video_generator.wait_for_result(result.task_id)
-                if kling_video_generator.is_generation_completed(result.task_id):
-                    # 下载视频
-                    output_path = os.path.join(
-                        kling_video_generator.output_dir, 
-                        f"kling_i2v_{task_id}.{request.output_format}"
-                    )
-                    video_path = kling_video_generator.download_video(video_result.video_url, output_path)
-                    
-                    update_task_status(
-                        task_id, 
-                        TaskStatus.COMPLETED, 
-                        result={
-                            "video_url": video_result.video_url,
-                            "local_path": os.path.relpath(video_path)
-                        }
-                    )
-                else:
-                    update_task_status(
-                        task_id, 
-                        TaskStatus.FAILED, 
-                        error=f"Task failed with status: {video_result.status}"
-                    )
-            except Exception as e:
-                update_task_status(task_id, TaskStatus.FAILED, error=str(e))
+            # 登记到轮询调度器，完成后下载视频
+            await run_in_threadpool(watch_remote_task, task_id, "kling_video", {
+                "remote_task_id": result.task_id,
+                "filename": f"kling_i2v_{task_id}.{request.output_format}"
+            })
         except Exception as e:
             logger.error(f"Error processing image-to-video task: {str(e)}")
-            update_task_status(task_id, TaskStatus.FAILED, error=str(e))
+            await aupdate_task_status(task_id, TaskStatus.FAILED, error=str(e))
     
-    background_tasks.add_task(process_task)
+    submit_job(JobKind.VIDEO, task_id, process_task)
     return {"task_id": task_id}
 
+def cover_result(html_file: str, stream: bool = False) -> Dict[str, Any]:
+    """封面任务的结果，流式生成时附带正在写入的文件路径供 /api/tasks/{task_id}/stream 读取"""
+    result = {
+        "html_file": html_file,
+        "local_path": os.path.relpath(html_file)
+    }
+    if stream:
+        result["stream_file"] = html_file
+    return result
+
+def stream_cover_output(task_id: str):
+    """返回封面流式生成开始时的回调，把正在写入的文件路径记录到任务结果中"""
+    def on_stream_start(html_file: str):
+        update_task_status(task_id, TaskStatus.PROCESSING, result=cover_result(html_file, stream=True))
+    return on_stream_start
+
 # 微信公众号封面生成API
 @app.post("/api/covers/wechat", response_model=Dict[str, str])
-async def generate_wechat_cover(request: WechatCoverRequest, background_tasks: BackgroundTasks):
+async def generate_wechat_cover(
+    request: WechatCoverRequest,
+    idempotency_key: Optional[str] = Header(None, description="幂等键，客户端重试时携带相同的值会得到同一个任务")
+):
     """生成微信公众号封面HTML"""
-    task_id = generate_task_id()
-    store_task(task_id)
+    task_id, existing = create_task("covers.wechat", request, idempotency_key)
+    if existing:
+        return {"task_id": task_id}
     
     def process_task():
         try:
@@ -569,30 +1115,33 @@ async def generate_wechat_cover(request: WechatCoverRequest, background_tasks: B
             html_file = cover_generator.generate_wechat_cover(
                 title=request.title,
                 emoji_url=request.emoji_url,
-                style=request.style
+                style=request.style,
+                use_cache=request.use_cache,
+                on_stream_start=stream_cover_output(task_id) if request.stream else None
             )
             
             update_task_status(
                 task_id, 
                 TaskStatus.COMPLETED, 
-                result={
-                    "html_file": html_file,
-                    "local_path": os.path.relpath(html_file)
-                }
+                result=cover_result(html_file, request.stream)
             )
         except Exception as e:
             logger.error(f"Error generating WeChat cover: {str(e)}")
             update_task_status(task_id, TaskStatus.FAILED, error=str(e))
     
-    background_tasks.add_task(process_task)
+    submit_job(JobKind.LLM, task_id, process_task)
     return {"task_id": task_id}
 
 # 小红书封面生成API
 @app.post("/api/covers/xiaohongshu", response_model=Dict[str, str])
-async def generate_xiaohongshu_cover(request: XiaohongshuCoverRequest, background_tasks: BackgroundTasks):
+async def generate_xiaohongshu_cover(
+    request: XiaohongshuCoverRequest,
+    idempotency_key: Optional[str] = Header(None, description="幂等键，客户端重试时携带相同的值会得到同一个任务")
+):
     """生成小红书封面HTML"""
-    task_id = generate_task_id()
-    store_task(task_id)
+    task_id, existing = create_task("covers.xiaohongshu", request, idempotency_key)
+    if existing:
+        return {"task_id": task_id}
     
     def process_task():
         try:
@@ -602,40 +1151,116 @@ async def generate_xiaohongshu_cover(request: XiaohongshuCoverRequest, backgroun
                 content=request.content,
                 account_name=request.account_name,
                 slogan=request.slogan,
-                style=request.style
+                style=request.style,
+                use_cache=request.use_cache,
+                on_stream_start=stream_cover_output(task_id) if request.stream else None
             )
             
             update_task_status(
                 task_id, 
                 TaskStatus.COMPLETED, 
-                result={
-                    "html_file": html_file,
-                    "local_path": os.path.relpath(html_file)
-                }
+                result=cover_result(html_file, request.stream)
             )
         except Exception as e:
             logger.error(f"Error generating Xiaohongshu cover: {str(e)}")
             update_task_status(task_id, TaskStatus.FAILED, error=str(e))
     
-    background_tasks.add_task(process_task)
+    submit_job(JobKind.LLM, task_id, process_task)
+    return {"task_id": task_id}
+
+# 小红书封面多风格批量生成API
+@app.post("/api/covers/xiaohongshu/batch", response_model=Dict[str, str])
+async def generate_xiaohongshu_cover_batch(
+    request: XiaohongshuCoverBatchRequest,
+    idempotency_key: Optional[str] = Header(None, description="幂等键，客户端重试时携带相同的值会得到同一个任务")
+):
+    """
+    一次生成多种风格的小红书封面，返回一个父任务。
+    各风格并发生成，每完成一个就更新父任务的result.covers，
+    可通过 /api/tasks/{task_id}/events 或 WebSocket 逐个接收各风格的结果
+    """
+    all_styles = [s.value for s in CoverStyle]
+    if isinstance(request.styles, str):
+        if request.styles != "all":
+            raise HTTPException(status_code=400, detail="styles必须是风格列表或\"all\"")
+        styles = all_styles
+    else:
+        styles = list(dict.fromkeys(request.styles))
+        invalid = [style for style in styles if style not in all_styles]
+        if not styles or invalid:
+            raise HTTPException(
+                status_code=400,
+                detail=f"不支持的封面风格: {', '.join(invalid) or '(空)'}。支持的风格有: {', '.join(all_styles)}"
+            )
+    max_parallel = min(request.max_parallel or COVER_BATCH_MAX_PARALLEL, COVER_BATCH_MAX_PARALLEL)
+
+    task_id, existing = create_task("covers.xiaohongshu.batch", request, idempotency_key)
+    if existing:
+        return {"task_id": task_id}
+    
+    def process_task():
+        covers = {style: {"status": TaskStatus.PENDING.value} for style in styles}
+        
+        def batch_result():
+            completed = sum(1 for cover in covers.values() if cover["status"] != TaskStatus.PENDING.value)
+            return {"covers": covers, "completed": completed, "total": len(styles)}
+        
+        try:
+            update_task_status(task_id, TaskStatus.PROCESSING, result=batch_result())
+            
+            for style, html_file, error in cover_generator.generate_xiaohongshu_cover_variants(
+                content=request.content,
+                account_name=request.account_name,
+                slogan=request.slogan,
+                styles=styles,
+                max_parallel=max_parallel,
+                use_cache=request.use_cache
+            ):
+                if error is None:
+                    covers[style] = {"status": TaskStatus.COMPLETED.value, **cover_result(html_file)}
+                else:
+                    logger.error(f"Error generating Xiaohongshu cover in style {style}: {str(error)}")
+                    covers[style] = {"status": TaskStatus.FAILED.value, "error": str(error)}
+                update_task_status(task_id, TaskStatus.PROCESSING, result=batch_result())
+            
+            if any(cover["status"] == TaskStatus.COMPLETED.value for cover in covers.values()):
+                update_task_status(task_id, TaskStatus.COMPLETED, result=batch_result())
+            else:
+                update_task_status(task_id, TaskStatus.FAILED, result=batch_result(), error="所有风格的封面均生成失败")
+        except Exception as e:
+            logger.error(f"Error generating Xiaohongshu cover batch: {str(e)}")
+            update_task_status(task_id, TaskStatus.FAILED, error=str(e))
+    
+    submit_job(JobKind.LLM, task_id, process_task)
     return {"task_id": task_id}
 
 # 修改杂志卡片生成接口支持文件上传
 @app.post("/api/magazine-cards/generate", response_model=Dict[str, str])
 async def generate_magazine_card(
     request: MagazineCardRequest,
-    background_tasks: BackgroundTasks
+    idempotency_key: Optional[str] = Header(None, description="幂等键，客户端重试时携带相同的值会得到同一个任务")
 ):
     """生成杂志风格卡片"""
-    task_id = generate_task_id()
-    store_task(task_id)
+    task_id, existing = create_task("magazine_cards", request, idempotency_key)
+    if existing:
+        return {"task_id": task_id}
     
     def process_task():
         try:
             update_task_status(task_id, TaskStatus.PROCESSING)
             
-            generator = get_magazine_card_generator()
-            response = generator.generate_card(request)
+            def on_stream_start(card_id: str, file_path: str):
+                update_task_status(
+                    task_id,
+                    TaskStatus.PROCESSING,
+                    result={
+                        "card_id": card_id,
+                        "html_path": f"/magazine_cards/{os.path.basename(file_path)}",
+                        "stream_file": file_path
+                    }
+                )
+            
+            response = magazine_card_generator.generate_card(request, on_stream_start=on_stream_start if request.stream else None)
             
             # 日志记录文件路径
             logger.info(f"杂志卡片生成完成: {response.file_path}")
@@ -654,14 +1279,15 @@ async def generate_magazine_card(
                 result={
                     "card_id": response.card_id,
                     "style": response.style,
-                    "html_path": relative_path
+                    "html_path": relative_path,
+                    **({"stream_file": response.file_path} if request.stream else {})
                 }
             )
         except Exception as e:
             logger.error(f"生成杂志卡片失败: {str(e)}")
             update_task_status(task_id, TaskStatus.FAILED, error=str(e))
     
-    background_tasks.add_task(process_task)
+    submit_job(JobKind.LLM, task_id, process_task)
     return {"task_id": task_id}
 
 @app.get("/api/magazine-cards/styles", response_model=List[Dict[str, str]])
@@ -674,7 +1300,7 @@ def list_magazine_styles():
 def rewrite_url_content(request: UrlContentRewriteRequest):
     """重写URL文章内容"""
     try:
-        result = url_content_rewriter.process_url(url=request.url)
+        result = url_content_rewriter.process_url(url=request.url, use_cache=request.use_cache)
         return {
             "success": True,
             "result": {
@@ -689,6 +1315,156 @@ def rewrite_url_content(request: UrlContentRewriteRequest):
             detail=f"处理URL内容时发生错误: {str(e)}"
         )
 
+# 内容流水线API
+@app.post("/api/pipelines/content", response_model=Dict[str, str])
+async def run_content_pipeline(
+    request: ContentPipelineRequest,
+    idempotency_key: Optional[str] = Header(None, description="幂等键，客户端重试时携带相同的值会得到同一个任务")
+):
+    """
+    从URL一键生成整套内容：重写文章后，标题、小红书封面、杂志卡片和配图并发生成。
+    任务结果中的stages记录各阶段的状态和耗时，outputs为已完成阶段的产物
+    """
+    if request.title_style and request.title_style not in TITLE_STYLES:
+        raise HTTPException(status_code=400, detail=f"不支持的标题风格：{request.title_style}")
+    if request.account_name and request.cover_style not in [s.value for s in CoverStyle]:
+        raise HTTPException(status_code=400, detail=f"不支持的封面风格：{request.cover_style}")
+
+    task_id, existing = create_task("pipelines.content", request, idempotency_key)
+    if existing:
+        return {"task_id": task_id}
+
+    def rewrite(_):
+        result = url_content_rewriter.process_url(url=request.url, use_cache=request.use_cache)
+        return {"title": result.title, "content": result.content}
+
+    def title(deps):
+        return {"title": title_rewriter.rewrite_title(
+            content=deps["rewrite"]["title"],
+            style=request.title_style,
+            use_cache=request.use_cache
+        )}
+
+    def cover(deps):
+        html_file = cover_generator.generate_xiaohongshu_cover(
+            content=f"{deps['rewrite']['title']}\n{deps['rewrite']['content']}",
+            account_name=request.account_name,
+            slogan=request.slogan,
+            style=request.cover_style,
+            use_cache=request.use_cache
+        )
+        return cover_result(html_file)
+
+    def card(deps):
+        response = magazine_card_generator.generate_card(MagazineCardRequest(
+            content=f"{deps['rewrite']['title']}\n{deps['rewrite']['content']}",
+            style=request.card_style,
+            use_cache=request.use_cache
+        ))
+        return {
+            "card_id": response.card_id,
+            "style": response.style,
+            "html_path": f"/magazine_cards/{os.path.basename(response.file_path)}"
+        }
+
+    async def image(deps):
+        # 配图使用独立的回调ID，避免与流水线任务本身混淆
+        image_id = f"{task_id}.image"
+        submitted = await minimaxi_image_generator.agenerate_image(
+            prompt=request.image_prompt or deps["rewrite"]["title"],
+            webhook_url=webhook_signer.build_url("minimaxi", image_id)
+        )
+        if "error" in submitted:
+            raise RuntimeError(submitted["error"])
+        if "task_id" not in submitted:
+            raise RuntimeError("Failed to submit task")
+
+        generation_result = await wait_remote_result(
+            image_id,
+            "minimaxi",
+            functools.partial(minimaxi_image_generator.acheck_task, submitted["task_id"]),
+            interval=2,
+            timeout=180
+        )
+        if "images" not in generation_result:
+            raise RuntimeError("No images in generation result")
+        image_paths = await minimaxi_image_generator.adownload_all_images(generation_result, prefix=f"pipeline_{task_id}")
+        return {"images": [
+            {
+                "index": i,
+                "url": generation_result["images"][i].get("url", ""),
+                "local_path": os.path.relpath(path)
+            }
+            for i, path in enumerate(image_paths)
+        ]}
+
+    # 流水线作业占用一个LLM名额，调用模型的阶段同时运行时借用LLM的空闲名额，没有空闲名额时依次运行
+    own_slot = asyncio.Semaphore(1)
+
+    def llm_stage(fn):
+        async def run(deps):
+            async with job_executor.slot(JobKind.LLM, own_slot):
+                return await asyncio.get_running_loop().run_in_executor(None, fn, deps)
+        return run
+
+    # 标题、封面、卡片和配图只依赖重写结果，彼此并发执行
+    stages = [PipelineStage("rewrite", llm_stage(rewrite))]
+    if request.title_style:
+        stages.append(PipelineStage("title", llm_stage(title), depends_on=["rewrite"]))
+    if request.account_name:
+        stages.append(PipelineStage("cover", llm_stage(cover), depends_on=["rewrite"]))
+    if request.card:
+        stages.append(PipelineStage("card", llm_stage(card), depends_on=["rewrite"]))
+    if request.image:
+        stages.append(PipelineStage("image", image, depends_on=["rewrite"]))
+
+    def pipeline_result(pipeline: Pipeline) -> Dict[str, Any]:
+        # 复制一份快照，在线程池中写入时流水线可能已经继续更新
+        return copy.deepcopy({**pipeline.report(), "outputs": dict(pipeline.results)})
+
+    async def process_task():
+        # 阶段状态的写入在线程池中依次进行，不阻塞事件循环，也不会让较早的状态覆盖较新的状态
+        last_write: Optional[asyncio.Future] = None
+
+        def on_stage_change(pipeline: Pipeline):
+            nonlocal last_write
+            previous = last_write
+            result = pipeline_result(pipeline)
+
+            async def write():
+                if previous is not None:
+                    await previous
+                try:
+                    await aupdate_task_status(task_id, TaskStatus.PROCESSING, result=result)
+                except Exception as e:
+                    logger.error(f"更新流水线进度失败: {str(e)}")
+
+            last_write = asyncio.ensure_future(write())
+
+        try:
+            await aupdate_task_status(task_id, TaskStatus.PROCESSING)
+            pipeline = Pipeline(stages, on_stage_change=on_stage_change)
+            await pipeline.run()
+            if last_write is not None:
+                await last_write
+            if pipeline.succeeded:
+                await aupdate_task_status(task_id, TaskStatus.COMPLETED, result=pipeline_result(pipeline))
+            else:
+                await aupdate_task_status(
+                    task_id,
+                    TaskStatus.FAILED,
+                    result=pipeline_result(pipeline),
+                    error=f"流水线阶段未完成: {', '.join(pipeline.incomplete)}"
+                )
+        except Exception as e:
+            logger.error(f"Error running content pipeline: {str(e)}")
+            if last_write is not None:
+                await last_write
+            await aupdate_task_status(task_id, TaskStatus.FAILED, error=str(e))
+
+    submit_job(JobKind.LLM, task_id, process_task)
+    return {"task_id": task_id}
+
 # 标题重写API
 @app.post("/api/rewrite/title", response_model=Dict[str, Any])
 def rewrite_title(request: TitleRewriteRequest):
@@ -700,7 +1476,8 @@ def rewrite_title(request: TitleRewriteRequest):
         # 使用 title_rewriter 重写标题
         rewritten_title = title_rewriter.rewrite_title(
             content=request.title,
-            style=style
+            style=style,
+            use_cache=request.use_cache
         )
         
         return {
@@ -721,102 +1498,422 @@ def rewrite_content_style(request: ContentStyleRewriteRequest):
     try:
         result = content_style_rewriter.rewrite_content(
             content=request.content,
-            style=request.style
+            style=request.style,
+            use_cache=request.use_cache
         )
         return {"success": True, "styled_content": result}
     except Exception as e:
         logger.error(f"Error applying style to content: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def process_bulk_row(row: Dict[str, Any], options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    处理批量任务的一行：依次重写标题、重写内容风格、生成小红书封面，
+    行内缺少的字段使用任务级默认值，未指定的步骤跳过
+
+    Args:
+        row: 行数据，包含content及可选的title、title_style、content_style、cover_style、account_name、slogan
+        options: 任务级默认参数
+
+    Returns:
+        该行的结果
+    """
+    params = {**options, **{key: value for key, value in row.items() if value not in (None, "")}}
+    content = params["content"]
+    cover_style = params.get("cover_style") or "default"
+    if cover_style not in [s.value for s in CoverStyle]:
+        raise ValueError(f"不支持的封面风格：{cover_style}")
+
+    output: Dict[str, Any] = {}
+    # 每行占用一个LLM名额依次调用模型，与其他LLM作业共用JOB_CONCURRENCY_LLM
+    with job_executor.hold(JobKind.LLM):
+        if params.get("title_style"):
+            output["title"] = title_rewriter.rewrite_title(content=params.get("title") or content, style=params["title_style"])
+        if params.get("content_style"):
+            output["styled_content"] = content_style_rewriter.rewrite_content(content=content, style=params["content_style"])
+        if params.get("account_name"):
+            html_file = cover_generator.generate_xiaohongshu_cover(
+                content=content,
+                account_name=params["account_name"],
+                slogan=params.get("slogan"),
+                style=cover_style
+            )
+            output["cover"] = cover_result(html_file)
+    return output
+
+# 批量任务存储和执行器，行结果逐行写入检查点，进程退出后由存活的进程从断点继续
+bulk_job_store = get_bulk_job_store()
+bulk_job_runner = BulkJobRunner.from_env(process_bulk_row)
+
+@app.on_event("startup")
+def start_bulk_job_runner():
+    """启动批量任务执行器，接管上次未处理完的任务"""
+    # 行处理线程通过作业执行器占用LLM名额，需要先绑定事件循环
+    job_executor.bind_loop()
+    bulk_job_runner.start()
+
+# 批量任务创建API
+@app.post("/api/bulk-jobs", response_model=Dict[str, Any])
+async def create_bulk_job(
+    file: UploadFile = File(..., description="JSONL或CSV文件，每行包含content及可选的title、title_style、content_style、cover_style、account_name、slogan"),
+    title_style: Optional[str] = Form(None, description="默认标题风格"),
+    content_style: Optional[str] = Form(None, description="默认内容风格"),
+    cover_style: Optional[str] = Form(None, description="默认封面风格"),
+    account_name: Optional[str] = Form(None, description="默认账号名称，为空时不生成封面"),
+    slogan: Optional[str] = Form(None, description="默认封面标语")
+):
+    """上传JSONL/CSV批量重写标题、内容风格并生成小红书封面"""
+    if title_style and title_style not in TITLE_STYLES:
+        raise HTTPException(status_code=400, detail=f"不支持的标题风格：{title_style}")
+    if content_style and content_style not in CONTENT_STYLES:
+        raise HTTPException(status_code=400, detail=f"不支持的内容风格：{content_style}")
+    if cover_style and cover_style not in [s.value for s in CoverStyle]:
+        raise HTTPException(status_code=400, detail=f"不支持的封面风格：{cover_style}")
+
+    data = await file.read()
+    try:
+        rows = await run_in_threadpool(parse_bulk_rows, file.filename or "", data, max_rows=BULK_JOB_MAX_ROWS)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"解析批量任务文件失败: {str(e)}")
+
+    options = {
+        key: value for key, value in {
+            "title_style": title_style,
+            "content_style": content_style,
+            "cover_style": cover_style,
+            "account_name": account_name,
+            "slogan": slogan
+        }.items() if value
+    }
+    # 写入所有行（最多BULK_JOB_MAX_ROWS行）在线程池中进行
+    job_id = await run_in_threadpool(bulk_job_runner.submit, rows, options)
+    return {"job_id": job_id, "total": len(rows)}
+
+# 批量任务进度查询API
+@app.get("/api/bulk-jobs/{job_id}", response_model=Dict[str, Any])
+def get_bulk_job(job_id: str):
+    """查询批量任务状态和各状态的行数"""
+    job = bulk_job_store.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Bulk job not found")
+    return job
+
+# 批量任务恢复API
+@app.post("/api/bulk-jobs/{job_id}/resume", response_model=Dict[str, Any])
+def resume_bulk_job(job_id: str, retry_failed: bool = Query(False, description="是否重新处理失败的行")):
+    """立即继续处理未完成的批量任务，retry_failed=true时同时重新处理失败的行"""
+    if bulk_job_store.get_job(job_id) is None:
+        raise HTTPException(status_code=404, detail="Bulk job not found")
+    reset = bulk_job_store.reset_failed_rows(job_id) if retry_failed else 0
+    processing = bulk_job_runner.resume(job_id)
+    return {"job": bulk_job_store.get_job(job_id), "reset_rows": reset, "processing": processing}
+
+# 批量任务结果下载API
+@app.get("/api/bulk-jobs/{job_id}/results")
+def download_bulk_job_results(
+    job_id: str,
+    format: str = Query("jsonl", pattern="^(jsonl|zip)$", description="jsonl只包含结果记录，zip同时打包生成的封面HTML")
+):
+    """以流式方式下载批量任务结果，任务未完成时包含当前已处理的行"""
+    if bulk_job_store.get_job(job_id) is None:
+        raise HTTPException(status_code=404, detail="Bulk job not found")
+
+    if format == "zip":
+        def attachments(row: Dict[str, Any]):
+            cover = (row.get("output") or {}).get("cover")
+            if not cover:
+                return []
+            return [(f"covers/{row['row']:05d}_{os.path.basename(cover['html_file'])}", cover["html_file"])]
+
+        return StreamingResponse(
+            stream_results_zip(bulk_job_store, job_id, attachments),
+            media_type="application/zip",
+            headers={"Content-Disposition": f'attachment; filename="bulk_{job_id}.zip"'}
+        )
+
+    return StreamingResponse(
+        stream_results_jsonl(bulk_job_store, job_id),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="bulk_{job_id}.jsonl"'}
+    )
+
+# 远程任务回调通知API
+@app.post("/api/webhooks/{provider}", response_model=Dict[str, Any])
+async def receive_webhook(
+    provider: str,
+    task_id: str = Query(..., description="本地任务ID"),
+    sig: str = Query(..., description="回调URL签名")
+):
+    """
+    接收海螺/Kling的任务完成通知，校验签名后立即向提供方查询一次对应的远程任务
+    通知内容不可信（签名只覆盖URL），只作为唤醒信号，结果（包括下载地址）总是来自提供方的查询接口
+    """
+    if provider not in ("minimaxi", "kling"):
+        raise HTTPException(status_code=404, detail=f"Unknown provider: {provider}")
+    if not webhook_signer.verify(provider, task_id, sig):
+        raise HTTPException(status_code=401, detail="Invalid webhook signature")
+
+    key = f"{provider}:{task_id}"
+    handled = poll_scheduler.poke(key)
+    if not handled:
+        # 任务由其他工作进程轮询，通过任务存储通知该进程
+        task_store.set_key(f"{WEBHOOK_WAKEUP_PREFIX}{key}", "1", WEBHOOK_WAKEUP_TTL)
+    logger.info(f"Received {provider} webhook for task {task_id}, handled locally: {handled}")
+    return {"received": True, "handled": handled}
+
+# 任务存储统计API
+@app.get("/api/tasks/stats", response_model=Dict[str, Any])
+def get_task_stats():
+    """查询任务存储的任务数量和淘汰统计"""
+    return {
+        "count": task_store.count(),
+        "evicted_count": task_store.evicted_count,
+        "retention": task_store.retention.model_dump(),
+        "jobs": job_executor.stats(),
+        "polling": poll_scheduler.stats(),
+        "bulk": bulk_job_runner.stats()
+    }
+
+# 缓存统计API
+@app.get("/api/cache/stats", response_model=Dict[str, Any])
+def get_cache_stats():
+    """查询LLM响应缓存和网页缓存的条目数和命中统计，以及生成文件索引和文件存储的统计"""
+    return {
+        "llm": llm_cache.stats(),
+        "pages": page_cache.stats(),
+        "artifacts": artifact_index.stats(),
+        "blobs": blob_store.stats(),
+        "image_variants": image_variant_cache.stats()
+    }
+
+# 清空LLM响应缓存API
+@app.delete("/api/cache/llm", response_model=Dict[str, Any])
+def clear_llm_cache():
+    """清空LLM响应缓存"""
+    return {"success": True, "deleted": llm_cache.clear()}
+
+# 清空网页缓存API
+@app.delete("/api/cache/pages", response_model=Dict[str, Any])
+def clear_page_cache():
+    """清空网页正文和译文缓存"""
+    return {"success": True, "deleted": page_cache.clear()}
+
+# 清理文件存储API
+@app.delete("/api/cache/blobs", response_model=Dict[str, Any])
+def collect_blob_garbage():
+    """删除已没有任何文件引用的存储内容"""
+    return {"success": True, **blob_store.collect_garbage()}
+
 # 任务状态查询API
 @app.get("/api/tasks/{task_id}", response_model=Task)
-def get_task_status(task_id: str):
-    """查询任务状态"""
-    if task_id in task_storage:
-        return task_storage[task_id]
-    raise HTTPException(status_code=404, detail="Task not found")
+async def get_task_status(
+    task_id: str,
+    wait: Optional[float] = Query(None, ge=0, le=TASK_LONG_POLL_MAX_WAIT, description="长轮询等待时间(秒)"),
+    since: Optional[TaskStatus] = Query(None, description="客户端已知的任务状态，默认为当前状态")
+):
+    """查询任务状态，传入wait时以长轮询方式等待任务状态变化或超时后返回"""
+    data = await aload_task(task_id)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    known_status = since.value if since else data["status"]
+    if not wait or data["status"] != known_status or data["status"] in FINISHED_TASK_STATUSES:
+        return Task(**data)
+
+    deadline = time.monotonic() + wait
+    with task_event_bus.subscribe([task_id]) as subscription:
+        # 先订阅再读取，避免遗漏两者之间发生的状态变化
+        data = await aload_task(task_id) or data
+        while data["status"] == known_status:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            event = await subscription.get(timeout=min(remaining, TASK_EVENTS_STORE_POLL_INTERVAL))
+            # 超时则回查任务存储，兼容其他工作进程更新的任务
+            data = event or await aload_task(task_id) or data
+
+    return Task(**data)
+
+# 任务状态推送API（Server-Sent Events）
+@app.get("/api/tasks/{task_id}/events")
+async def stream_task_events(task_id: str, request: Request):
+    """以Server-Sent Events推送任务状态变化，任务结束后关闭连接"""
+    if await aload_task(task_id) is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    async def event_stream():
+        with task_event_bus.subscribe([task_id]) as subscription:
+            # 先订阅再读取，避免遗漏两者之间发生的状态变化
+            last = await aload_task(task_id)
+            if last is None:
+                return
+            yield format_sse_event("status", last)
+            last_sent = time.monotonic()
+
+            while last["status"] not in FINISHED_TASK_STATUSES:
+                if await request.is_disconnected():
+                    break
+
+                event = await subscription.get(timeout=TASK_EVENTS_STORE_POLL_INTERVAL)
+                if event is None:
+                    # 兜底：其他工作进程更新的任务不会经过本进程的事件总线
+                    event = await aload_task(task_id)
+                    if event is None:
+                        break
+
+                if event == last:
+                    if time.monotonic() - last_sent >= TASK_EVENTS_HEARTBEAT_INTERVAL:
+                        yield ": keep-alive\n\n"
+                        last_sent = time.monotonic()
+                    continue
+
+                last = event
+                yield format_sse_event("status", event)
+                last_sent = time.monotonic()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# 流式生成输出推送API
+@app.get("/api/tasks/{task_id}/stream")
+async def stream_task_output(task_id: str, request: Request):
+    """
+    以Server-Sent Events推送流式生成任务（stream=true的封面和杂志卡片）的HTML片段。
+    每段新内容推送一条 chunk 事件 {"text": ...}，任务结束后推送 done 事件（最终任务数据）并关闭连接
+    """
+    if await aload_task(task_id) is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    async def event_stream():
+        with task_event_bus.subscribe([task_id]) as subscription:
+            task = await aload_task(task_id)
+            if task is None:
+                return
+            reader = None
+            last_checked = last_sent = time.monotonic()
+
+            while True:
+                finished = task["status"] in FINISHED_TASK_STATUSES
+                stream_file = (task.get("result") or {}).get("stream_file")
+                if reader is None and stream_file:
+                    reader = ProgressiveFileReader(stream_file)
+
+                # 输出文件由生成线程（可能在其他工作进程）渐进写入，这里只读取新增部分
+                if reader is not None:
+                    text = reader.read_new(final=finished)
+                    if text:
+                        yield format_sse_event("chunk", {"text": text})
+                        last_sent = time.monotonic()
+
+                if finished:
+                    yield format_sse_event("done", task)
+                    break
+                if await request.is_disconnected():
+                    break
+
+                event = await subscription.get(timeout=TASK_STREAM_POLL_INTERVAL)
+                if event is not None:
+                    task = event
+                elif time.monotonic() - last_checked >= TASK_EVENTS_STORE_POLL_INTERVAL:
+                    # 兜底：其他工作进程更新的任务不会经过本进程的事件总线
+                    task = await aload_task(task_id) or task
+                    last_checked = time.monotonic()
+
+                if time.monotonic() - last_sent >= TASK_EVENTS_HEARTBEAT_INTERVAL:
+                    yield ": keep-alive\n\n"
+                    last_sent = time.monotonic()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# 任务状态推送API（WebSocket，多任务复用一个连接）
+@app.websocket("/api/tasks/ws")
+async def task_events_websocket(websocket: WebSocket):
+    """
+    通过WebSocket推送多个任务的状态变化
+    客户端发送 {"action": "subscribe" | "unsubscribe", "task_ids": [...]} 管理订阅，
+    服务端推送 {"type": "task", "task": {...}} 或 {"type": "error", "task_id": ..., "error": ...}
+    """
+    await websocket.accept()
+    subscription = task_event_bus.subscribe([])
+    known: Dict[str, Dict[str, Any]] = {}
+
+    async def send_if_changed(task_data: Dict[str, Any]):
+        task_id = task_data["task_id"]
+        if known.get(task_id) == task_data:
+            return
+        known[task_id] = task_data
+        await websocket.send_json({"type": "task", "task": task_data})
+
+    async def receive_commands():
+        while True:
+            message = await websocket.receive_json()
+            action = message.get("action")
+            for task_id in message.get("task_ids", []):
+                if action == "subscribe":
+                    subscription.add(task_id)
+                    task_data = await aload_task(task_id)
+                    if task_data is None:
+                        subscription.discard(task_id)
+                        await websocket.send_json({"type": "error", "task_id": task_id, "error": "Task not found"})
+                    else:
+                        await send_if_changed(task_data)
+                elif action == "unsubscribe":
+                    subscription.discard(task_id)
+                    known.pop(task_id, None)
+
+    receiver = asyncio.create_task(receive_commands())
+    try:
+        while not receiver.done():
+            event = await subscription.get(timeout=TASK_EVENTS_STORE_POLL_INTERVAL)
+            if event is not None:
+                if subscription.wants(event["task_id"]):
+                    await send_if_changed(event)
+                continue
+
+            # 兜底：回查尚未结束的任务
+            for task_id in list(subscription.task_ids):
+                if known.get(task_id, {}).get("status") in FINISHED_TASK_STATUSES:
+                    continue
+                task_data = await aload_task(task_id)
+                if task_data is not None:
+                    await send_if_changed(task_data)
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"任务推送WebSocket异常: {str(e)}")
+    finally:
+        receiver.cancel()
+        subscription.close()
 
 # 获取文件内容API
 @app.get("/api/files/{file_path:path}")
-def get_file(file_path: str):
-    """获取生成的文件内容"""
-    logger.info(f"请求文件: {file_path}")
-    
-    # 处理可能的src目录前缀
-    if file_path.startswith("src/"):
-        # 如果路径以src/开头，移除src/并记录
-        file_path = file_path[4:]
-        logger.info(f"检测到src/前缀，已移除: {file_path}")
-    
-    # 检查文件是否存在，先直接检查原始路径
-    if os.path.exists(file_path) and os.path.isfile(file_path):
-        logger.info(f"文件找到(原始路径): {file_path}")
-        return FileResponse(file_path)
-    
-    # 尝试检查相对于当前工作目录的路径
-    current_dir = os.getcwd()
-    absolute_path = os.path.join(current_dir, file_path)
-    if os.path.exists(absolute_path) and os.path.isfile(absolute_path):
-        logger.info(f"文件找到(绝对路径): {absolute_path}")
-        return FileResponse(absolute_path)
-    
-    # 尝试去除可能的前导斜杠
-    cleaned_path = file_path.lstrip('/')
-    if os.path.exists(cleaned_path) and os.path.isfile(cleaned_path):
-        logger.info(f"文件找到(清理路径): {cleaned_path}")
-        return FileResponse(cleaned_path)
-    
-    # 尝试server/src目录下的路径 - 添加这个特殊处理
-    server_src_path = os.path.join("server", "src", cleaned_path)
-    if os.path.exists(server_src_path) and os.path.isfile(server_src_path):
-        logger.info(f"文件找到(server/src路径): {server_src_path}")
-        return FileResponse(server_src_path)
-    
-    # 尝试src目录下的路径
-    src_path = os.path.join("src", cleaned_path)
-    if os.path.exists(src_path) and os.path.isfile(src_path):
-        logger.info(f"文件找到(src路径): {src_path}")
-        return FileResponse(src_path)
-    
-    # 尝试outputs目录下的路径
-    outputs_path = os.path.join("outputs", cleaned_path)
-    if os.path.exists(outputs_path) and os.path.isfile(outputs_path):
-        logger.info(f"文件找到(outputs路径): {outputs_path}")
-        return FileResponse(outputs_path)
-    
-    # 尝试magazine_cards目录
-    magazine_cards_path = os.path.join("magazine_cards", os.path.basename(cleaned_path))
-    if os.path.exists(magazine_cards_path) and os.path.isfile(magazine_cards_path):
-        logger.info(f"文件找到(magazine_cards路径): {magazine_cards_path}")
-        return FileResponse(magazine_cards_path)
-    
-    # 尝试server/src/magazine_cards目录 - 添加这个特殊处理
-    server_magazine_path = os.path.join("server", "src", "magazine_cards", os.path.basename(cleaned_path))
-    if os.path.exists(server_magazine_path) and os.path.isfile(server_magazine_path):
-        logger.info(f"文件找到(server/src/magazine_cards路径): {server_magazine_path}")
-        return FileResponse(server_magazine_path)
-    
-    # 尝试src/magazine_cards目录
-    src_magazine_path = os.path.join("src", "magazine_cards", os.path.basename(cleaned_path))
-    if os.path.exists(src_magazine_path) and os.path.isfile(src_magazine_path):
-        logger.info(f"文件找到(src/magazine_cards路径): {src_magazine_path}")
-        return FileResponse(src_magazine_path)
-    
-    # 尝试templates目录
-    templates_path = os.path.join("templates", os.path.basename(cleaned_path))
-    if os.path.exists(templates_path) and os.path.isfile(templates_path):
-        logger.info(f"文件找到(templates路径): {templates_path}")
-        return FileResponse(templates_path)
-    
-    # 输出调试信息
-    logger.error(f"文件未找到: 原始路径={file_path}")
-    logger.error(f"尝试路径: 绝对路径={absolute_path}, 清理路径={cleaned_path}")
-    logger.error(f"尝试路径: server/src路径={server_src_path}, src路径={src_path}, outputs路径={outputs_path}")
-    logger.error(f"尝试路径: magazine_cards路径={magazine_cards_path}, server/src/magazine_cards路径={server_magazine_path}, src/magazine_cards路径={src_magazine_path}")
-    logger.error(f"尝试路径: templates路径={templates_path}")
-    logger.info(f"当前工作目录: {current_dir}")
-    
-    raise HTTPException(status_code=404, detail=f"File not found: {file_path}")
+def get_file(file_path: str, request: Request):
+    """
+    获取生成的文件内容
+    通过文件索引直接定位文件；支持Range请求（视频拖动）、ETag/Last-Modified条件请求，
+    HTML等文本文件按Accept-Encoding返回br/gzip压缩副本
+    """
+    path = artifact_index.resolve(file_path)
+    if path is None:
+        logger.warning(f"文件未找到: {file_path}")
+        raise HTTPException(status_code=404, detail=f"File not found: {file_path}")
+
+    try:
+        stat_result = os.stat(path)
+    except FileNotFoundError:
+        # 文件已被删除，索引尚未刷新
+        artifact_index.discard(path)
+        logger.warning(f"文件未找到: {file_path}")
+        raise HTTPException(status_code=404, detail=f"File not found: {file_path}")
+
+    return media_response(path, request.headers, stat_result)
 
 # 列出所有可用的封面风格
 @app.get("/api/covers/styles", response_model=Dict[str, List[Dict[str, str]]])
@@ -885,11 +1982,62 @@ def list_image_options():
         }
     }
 
+def resolve_image_source(image_id: str) -> Optional[str]:
+    """把图片ID解析为原图路径，ID可以是生成文件的路径（同 /api/files）或文件存储中的SHA-256摘要"""
+    if re.fullmatch(r"[0-9a-f]{64}", image_id):
+        return blob_store.find(image_id)
+    return artifact_index.resolve(image_id)
+
+# 派生图片API（缩略图、WebP/AVIF版本、响应式尺寸）
+@app.get("/api/images/{image_id:path}")
+async def get_image_variant(
+    image_id: str,
+    request: Request,
+    w: int = Query(320, ge=16, le=4096, description="最大宽度，取到最近的一档（64到2048），不放大原图"),
+    fmt: VariantFormat = Query(VariantFormat.AUTO, description="输出格式，auto按Accept请求头选择avif/webp/jpeg"),
+    q: int = Query(80, ge=1, le=100, description="有损格式的质量")
+):
+    """
+    获取缩放和转码后的图片
+    第一次请求时在进程池中生成并缓存在磁盘上，之后直接返回缓存；原图改变后自动重新生成
+    """
+    source = resolve_image_source(image_id)
+    if source is None:
+        raise HTTPException(status_code=404, detail=f"Image not found: {image_id}")
+
+    try:
+        output_format = image_variant_cache.choose_format(fmt, request.headers.get("accept"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        path = await image_variant_cache.get(source, w, output_format, q)
+    except ImageTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except VariantWorkerError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Image not found: {image_id}")
+
+    # 原图按内容命名（上传文件、文件存储）时同一URL的内容不会改变，可以长期缓存
+    # 缓存文件本身按哈希命名，需要按原图决定；原图可能被改写时每次重新验证
+    cache_control = IMMUTABLE_CACHE_CONTROL if is_content_hashed(source) else "no-cache"
+    response = media_response(path, request.headers, cache_control=cache_control)
+    if fmt == VariantFormat.AUTO:
+        response.headers["Vary"] = "Accept"
+    return response
+
 # 提供健康检查接口
 @app.get("/health")
 def health_check():
-    """API健康状态检查"""
-    return {"status": "healthy", "timestamp": datetime.now().isoformat()}
+    """API健康状态检查，附带各生成器和提供方的就绪状态"""
+    return {
+        "status": "healthy",
+        "timestamp": datetime.now().isoformat(),
+        **generator_registry.readiness()
+    }
 
 # 主页
 @app.get("/")
@@ -908,38 +2056,25 @@ async def upload_file(
     qr_code: Optional[UploadFile] = File(None),
     product_image: Optional[UploadFile] = File(None)
 ):
-    """处理文件上传"""
+    """
+    处理文件上传
+    分块读取并在线程池中写入，边写入边计算哈希；只接受图片，超出大小上限时立即拒绝。
+    文件按内容命名，相同图片的重复上传返回同一个URL，不再占用额外空间
+    """
     result = {}
-    
+
     try:
-        # 创建上传目录
-        upload_dir = os.path.join("uploads", datetime.now().strftime("%Y%m%d"))
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        # 处理二维码文件
-        if qr_code:
-            filename = f"qr_{uuid.uuid4()}{os.path.splitext(qr_code.filename)[1]}"
-            file_path = os.path.join(upload_dir, filename)
-            
-            with open(file_path, "wb") as f:
-                content = await qr_code.read()
-                f.write(content)
-            
-            result["qr_code_url"] = f"/uploads/{datetime.now().strftime('%Y%m%d')}/{filename}"
-        
-        # 处理产品图片
-        if product_image:
-            filename = f"product_{uuid.uuid4()}{os.path.splitext(product_image.filename)[1]}"
-            file_path = os.path.join(upload_dir, filename)
-            
-            with open(file_path, "wb") as f:
-                content = await product_image.read()
-                f.write(content)
-            
-            result["product_image_url"] = f"/uploads/{datetime.now().strftime('%Y%m%d')}/{filename}"
-        
+        for field, upload in (("qr_code", qr_code), ("product_image", product_image)):
+            if upload is None:
+                continue
+            saved = await save_image_upload(upload, blob_store, "uploads", UPLOAD_MAX_BYTES)
+            result[f"{field}_url"] = saved["url"]
+            artifact_index.add(saved["path"])
         return result
-        
+
+    except UploadRejectedError as e:
+        logger.warning(f"拒绝上传: {str(e)}")
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         logger.error(f"文件上传失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"文件上传失败: {str(e)}")
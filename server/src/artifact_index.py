@@ -0,0 +1,337 @@
+import os
+import posixpath
+import logging
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional, Dict, Any, List, Mapping, Set
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 不对外提供的文件（任务存储、缓存等SQLite数据库，以及通过原文件按需返回的预压缩副本）
+EXCLUDED_SUFFIXES = (".db", ".db-wal", ".db-shm", ".db-journal", ".br", ".gz", ".tmp")
+
+# 生成文件所在的目录（相对于工作目录），只有这些目录中的文件可以通过 /api/files 访问
+ARTIFACT_ROOTS = [
+    "outputs", "templates", "magazine_cards", "server/src/magazine_cards", "src/magazine_cards",
+    "generated_images", "uploads", "minimaxi_videos", "videos"
+]
+
+# 兼容旧的文件路径：请求路径在这些目录下查找（按优先级排列），例如 magazine_cards/x.html 也能找到 server/src/magazine_cards/x.html
+PATH_PREFIXES = ["", "server/src/", "src/", "outputs/"]
+# 只按文件名查找的目录，例如任意路径 .../x.html 都能找到 templates/x.html
+NAME_DIRECTORIES = ["magazine_cards", "server/src/magazine_cards", "src/magazine_cards", "templates"]
+
+def file_etag(stat_result: os.stat_result) -> str:
+    """
+    根据文件大小和修改时间(纳秒)计算ETag，文件内容被改写时随之变化
+
+    Args:
+        stat_result: os.stat的结果
+
+    Returns:
+        带引号的ETag
+    """
+    return f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+def file_cache_headers(stat_result: os.stat_result) -> Dict[str, str]:
+    """
+    生成文件响应的缓存相关头，客户端每次使用前都用ETag/Last-Modified重新验证
+
+    Args:
+        stat_result: os.stat的结果
+
+    Returns:
+        包含ETag、Last-Modified和Cache-Control的响应头
+    """
+    return {
+        "ETag": file_etag(stat_result),
+        "Last-Modified": formatdate(stat_result.st_mtime, usegmt=True),
+        "Cache-Control": "no-cache"
+    }
+
+def is_not_modified(request_headers: Mapping[str, str], etag: str, mtime: float) -> bool:
+    """
+    判断条件请求是否可以返回304，If-None-Match优先于If-Modified-Since
+
+    Args:
+        request_headers: 请求头
+        etag: 文件当前的ETag
+        mtime: 文件当前的修改时间
+
+    Returns:
+        客户端缓存的版本是否仍然有效
+    """
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        # If-None-Match使用弱比较
+        return "*" in tags or etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        # Last-Modified只精确到秒
+        return int(mtime) <= since
+    return False
+
+class ArtifactIndex:
+    """
+    生成文件索引
+    记录各输出目录中的文件，把请求路径（规范路径、旧的带src/或server/src/前缀的路径、文件名）
+    通过字典直接映射到唯一的实际位置，不再逐个目录探测文件是否存在。
+    生成结果在任务完成时登记；后台线程定期检查目录的修改时间，只重新扫描有变化的目录，
+    以发现其他工作进程生成或手动放入的文件
+    """
+
+    def __init__(self, roots: Optional[List[str]] = None, refresh_interval: float = 2.0):
+        """
+        初始化索引
+
+        Args:
+            roots: 输出目录列表（相对于工作目录），只有这些目录中的文件可以通过索引访问，默认ARTIFACT_ROOTS
+            refresh_interval: 后台检查目录变化的间隔(秒)
+        """
+        self.roots = [self._normalize(root) for root in (roots or ARTIFACT_ROOTS)]
+        self.refresh_interval = refresh_interval
+        # 请求路径 -> {文件路径: 优先级}，数值越小优先级越高
+        self._paths: Dict[str, Dict[str, int]] = {}
+        # 文件名 -> {文件路径: 优先级}
+        self._names: Dict[str, Dict[str, int]] = {}
+        # 目录 -> (修改时间, 目录中的文件)
+        self._directories: Dict[str, tuple] = {}
+        self._lock = threading.RLock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.lookups = 0
+        self.hits = 0
+        self.probes = 0
+        self.scans = 0
+
+    @classmethod
+    def from_env(cls) -> "ArtifactIndex":
+        """根据环境变量创建索引"""
+        roots = [root.strip() for root in os.getenv("ARTIFACT_ROOTS", "").split(",") if root.strip()]
+        return cls(roots or None, refresh_interval=float(os.getenv("ARTIFACT_INDEX_INTERVAL", "2")))
+
+    @staticmethod
+    def _normalize(path: str) -> str:
+        """规范化为相对于工作目录、以/分隔的路径"""
+        if os.path.isabs(path):
+            path = os.path.relpath(path)
+        return posixpath.normpath(path.replace(os.sep, "/")).lstrip("/")
+
+    def _root_of(self, path: str) -> Optional[str]:
+        """返回路径所在的输出目录，不在任何输出目录中时返回None"""
+        for root in self.roots:
+            if path.startswith(root + "/"):
+                return root
+        return None
+
+    def _aliases(self, path: str) -> List[tuple]:
+        """计算文件的所有请求路径别名及优先级"""
+        aliases = []
+        for rank, prefix in enumerate(PATH_PREFIXES):
+            if path.startswith(prefix):
+                aliases.append((self._paths, path[len(prefix):], rank))
+        directory, name = posixpath.split(path)
+        if directory in NAME_DIRECTORIES:
+            aliases.append((self._names, name, len(PATH_PREFIXES) + NAME_DIRECTORIES.index(directory)))
+        return aliases
+
+    def _insert(self, path: str) -> None:
+        for table, key, rank in self._aliases(path):
+            table.setdefault(key, {})[path] = rank
+
+    def _remove(self, path: str) -> None:
+        for table, key, _ in self._aliases(path):
+            candidates = table.get(key)
+            if candidates is not None:
+                candidates.pop(path, None)
+                if not candidates:
+                    del table[key]
+
+    def add(self, path: str) -> bool:
+        """
+        登记一个生成的文件，不在输出目录中或不存在的路径被忽略
+
+        Args:
+            path: 文件路径（绝对路径或相对于工作目录的路径）
+
+        Returns:
+            是否已登记
+        """
+        if not path or len(path) > 1024 or "://" in path:
+            return False
+        path = self._normalize(path)
+        if path.startswith("..") or self._root_of(path) is None or path.endswith(EXCLUDED_SUFFIXES):
+            return False
+        # 隐藏文件和隐藏目录中的文件不对外提供
+        if any(part.startswith(".") for part in path.split("/")):
+            return False
+        if not os.path.isfile(path):
+            return False
+        with self._lock:
+            self._insert(path)
+        return True
+
+    def discard(self, path: str) -> None:
+        """
+        移除已不存在的文件
+
+        Args:
+            path: 文件路径
+        """
+        with self._lock:
+            self._remove(self._normalize(path))
+
+    def _best(self, candidates: Optional[Dict[str, int]]) -> Optional[str]:
+        if not candidates:
+            return None
+        return min(candidates.items(), key=lambda item: item[1])[0]
+
+    def resolve(self, request_path: str) -> Optional[str]:
+        """
+        把请求路径解析为文件的实际位置
+
+        Args:
+            request_path: /api/files/ 之后的路径，可以带前导斜杠或旧的src/前缀
+
+        Returns:
+            相对于工作目录的文件路径，找不到时返回None
+        """
+        self.lookups += 1
+        key = request_path.strip().lstrip("/")
+        # 前端旧的路径带有src/前缀
+        if key.startswith("src/"):
+            key = key[4:]
+        key = posixpath.normpath(key) if key else key
+        if not key or key == "." or key.startswith("..") or "/../" in f"/{key}/":
+            return None
+
+        with self._lock:
+            path = self._best(self._paths.get(key)) or self._best(self._names.get(posixpath.basename(key)))
+        if path is not None:
+            self.hits += 1
+            return path
+
+        # 索引尚未发现的文件（例如其他工作进程刚生成的），只检查规范位置
+        self.probes += 1
+        for prefix in PATH_PREFIXES[:3]:
+            if self.add(prefix + key):
+                return prefix + key
+        return None
+
+    def _scan_directory(self, directory: str, seen: Set[str]) -> None:
+        """检查一个目录，修改时间变化时重新列出其中的文件，并递归检查子目录"""
+        seen.add(directory)
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            self._drop_directory(directory)
+            return
+
+        previous = self._directories.get(directory)
+        if previous is not None and previous[0] == mtime:
+            files, subdirectories = previous[1], previous[2]
+        else:
+            files, subdirectories = set(), set()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        path = f"{directory}/{entry.name}"
+                        if entry.is_dir(follow_symlinks=False):
+                            # 隐藏目录（例如文件存储的 .blobs）不对外提供
+                            if not entry.name.startswith("."):
+                                subdirectories.add(path)
+                        elif entry.is_file() and not entry.name.endswith(EXCLUDED_SUFFIXES):
+                            files.add(path)
+            except OSError as e:
+                logger.warning(f"扫描目录失败 {directory}: {str(e)}")
+                return
+            old_files = previous[1] if previous else set()
+            with self._lock:
+                for path in old_files - files:
+                    self._remove(path)
+                for path in files - old_files:
+                    self._insert(path)
+            self._directories[directory] = (mtime, files, subdirectories)
+            self.scans += 1
+
+        for subdirectory in subdirectories:
+            self._scan_directory(subdirectory, seen)
+
+    def _drop_directory(self, directory: str) -> None:
+        """目录被删除时移除其中的文件"""
+        previous = self._directories.pop(directory, None)
+        if previous is None:
+            return
+        with self._lock:
+            for path in previous[1]:
+                self._remove(path)
+        for subdirectory in previous[2]:
+            self._drop_directory(subdirectory)
+
+    def refresh(self) -> None:
+        """检查所有输出目录的变化"""
+        seen: Set[str] = set()
+        for root in self.roots:
+            self._scan_directory(root, seen)
+        for directory in [d for d in self._directories if d not in seen]:
+            self._drop_directory(directory)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"刷新文件索引失败: {str(e)}")
+            self._stop.wait(self.refresh_interval)
+
+    def start(self) -> None:
+        """启动后台线程，首次扫描也在后台进行，不阻塞服务启动"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="artifact-index", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """停止后台线程"""
+        self._stop.set()
+
+    def stats(self) -> Dict[str, Any]:
+        """返回索引的文件数量和查找统计"""
+        with self._lock:
+            files = sum(len(entry[1]) for entry in self._directories.values())
+        return {
+            "files": files,
+            "directories": len(self._directories),
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "probes": self.probes,
+            "scans": self.scans,
+            "refresh_interval": self.refresh_interval
+        }
+
+# 单例实例
+_artifact_index = None
+
+def get_artifact_index() -> ArtifactIndex:
+    """
+    获取生成文件索引实例（单例模式）
+
+    Returns:
+        ArtifactIndex实例
+    """
+    global _artifact_index
+    if _artifact_index is None:
+        _artifact_index = ArtifactIndex.from_env()
+    return _artifact_index
@@ -0,0 +1,470 @@
+import os
+import time
+import errno
+import asyncio
+import stat
+import uuid
+import shutil
+import hashlib
+import logging
+import threading
+from typing import Optional, Dict, Any, List, AsyncIterator
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+# 清理时跳过最近变化过的文件，避免删除正在写入或尚未创建链接的内容
+GC_GRACE_SECONDS = 600
+# 文件系统不支持硬链接或链接数已达上限时改为复制
+LINK_FALLBACK_ERRNOS = {errno.EPERM, errno.EACCES, errno.ENOTSUP, errno.EOPNOTSUPP, errno.EMLINK, errno.EXDEV}
+
+class BlobStore:
+    """
+    按内容寻址的文件存储
+    文件内容按SHA-256保存一份（按哈希前缀分两级目录），生成的文件名、上传文件名等逻辑路径都是指向它的硬链接，
+    内容相同的下载、上传和复制不再占用额外的空间。已在内存中的内容（put_bytes）先计算摘要，已存在时不再写入；
+    流式写入在结束前无法得知摘要，仍先写入临时文件，提交时发现内容已存在再丢弃。
+    写入存储的blob被设置为只读，防止通过某个逻辑路径原地修改而影响其他路径（服务以非root用户运行时才有效）；
+    adopt纳入的文件与原文件共享inode，不修改其权限，更新已纳入存储的逻辑路径时应写入新文件再替换，不能原地写入。
+    文件系统不支持硬链接（或链接数已达上限）时改为复制，计入copied。
+    硬链接不能跨文件系统（包括Docker中分别挂载的卷），不在存储目录所在文件系统中的逻辑路径
+    使用该文件系统挂载点下的 .blobs 目录，每个卷内部各自去重
+    """
+
+    def __init__(self, root: str):
+        """
+        初始化存储
+
+        Args:
+            root: 默认存储目录，用于与工作目录在同一文件系统中的文件
+        """
+        self.root = root
+        self.stored = 0
+        self.deduplicated = 0
+        self.bytes_saved = 0
+        self.copied = 0
+        self._stats_lock = threading.Lock()
+        # 设备号 -> 该文件系统中的存储目录
+        self._roots: Dict[int, str] = {}
+        self._default_device = os.stat(os.path.dirname(os.path.abspath(root))).st_dev
+
+    @classmethod
+    def from_env(cls) -> "BlobStore":
+        """根据环境变量创建存储"""
+        return cls(os.getenv("BLOB_STORE_PATH", "blobs"))
+
+    def _count(self, name: str, value: int = 1) -> None:
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + value)
+
+    def root_for(self, path: str) -> str:
+        """
+        返回与路径在同一文件系统中的存储目录
+
+        Args:
+            path: 文件路径（文件可以尚不存在，所在目录不存在时会被创建）
+
+        Returns:
+            存储目录
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        device = os.stat(directory).st_dev
+        if device == self._default_device:
+            return self.root
+        root = self._roots.get(device)
+        if root is None:
+            # 向上找到该文件系统的挂载点
+            mount = directory
+            while True:
+                parent = os.path.dirname(mount)
+                if parent == mount or os.stat(parent).st_dev != device:
+                    break
+                mount = parent
+            root = os.path.join(mount, ".blobs")
+            self._roots[device] = root
+        return root
+
+    def discover(self, directories: List[str]) -> None:
+        """
+        预先登记目录所在文件系统的存储目录，使统计和清理包括它们
+
+        Args:
+            directories: 输出目录列表
+        """
+        for directory in directories:
+            try:
+                self.root_for(os.path.join(directory, "_"))
+            except OSError:
+                continue
+
+    @property
+    def roots(self) -> List[str]:
+        """所有已知的存储目录"""
+        return [self.root] + list(self._roots.values())
+
+    def path_for(self, digest: str, root: Optional[str] = None) -> str:
+        """
+        返回blob的存储路径
+
+        Args:
+            digest: SHA-256十六进制摘要
+            root: 存储目录，默认为默认存储目录
+
+        Returns:
+            blob文件路径，例如 blobs/ab/cd/abcd...
+        """
+        return os.path.join(root or self.root, digest[:2], digest[2:4], digest)
+
+    def find(self, digest: str) -> Optional[str]:
+        """
+        在所有已知的存储目录中查找blob
+
+        Args:
+            digest: SHA-256摘要
+
+        Returns:
+            blob路径，不存在时返回None
+        """
+        for root in self.roots:
+            path = self.path_for(digest, root)
+            if os.path.isfile(path):
+                return path
+        return None
+
+    def _temp_path(self, root: str) -> str:
+        """存储目录中的临时文件路径，与blob在同一文件系统，提交时可以直接改名"""
+        temp_dir = os.path.join(root, "tmp")
+        os.makedirs(temp_dir, exist_ok=True)
+        return os.path.join(temp_dir, uuid.uuid4().hex)
+
+    def _commit(self, temp_path: str, digest: str, size: int, root: str) -> str:
+        """把写好的临时文件移入存储，内容已存在时丢弃临时文件"""
+        target = self.path_for(digest, root)
+        if os.path.isfile(target):
+            os.remove(temp_path)
+            self._count("deduplicated")
+            self._count("bytes_saved", size)
+            return target
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.chmod(temp_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        os.replace(temp_path, target)
+        self._count("stored")
+        return target
+
+    def _link(self, target: str, dest_path: str) -> str:
+        """在dest_path原子地创建指向target的硬链接，已是同一文件时不做任何操作"""
+        try:
+            if os.path.samefile(target, dest_path):
+                return dest_path
+        except FileNotFoundError:
+            pass
+        directory = os.path.dirname(dest_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{dest_path}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            os.link(target, temp_path)
+        except OSError as e:
+            if e.errno not in LINK_FALLBACK_ERRNOS:
+                raise
+            shutil.copyfile(target, temp_path)
+            self._count("copied")
+        os.replace(temp_path, dest_path)
+        return dest_path
+
+    def writer(self, dest_path: Optional[str] = None, directory: Optional[str] = None) -> "BlobWriter":
+        """
+        创建写入器，边写入边计算哈希，关闭时存入存储并在dest_path创建链接
+
+        Args:
+            dest_path: 逻辑路径，为None时关闭后再按摘要决定路径（例如按内容命名的上传文件）
+            directory: dest_path为None时逻辑路径所在的目录
+
+        Returns:
+            BlobWriter，用法与 open(dest_path, "wb") 相同
+        """
+        return BlobWriter(self, dest_path, directory)
+
+    async def awrite_stream(self, chunks: AsyncIterator[bytes], dest_path: str) -> "BlobWriter":
+        """
+        把异步数据流（例如正在下载的响应）写入存储并在dest_path创建链接
+        写入、哈希计算和提交都在线程池中进行，不阻塞事件循环；数据先合并为1MB的块再写入，减少线程切换
+
+        Args:
+            chunks: 异步字节块迭代器
+            dest_path: 逻辑路径
+
+        Returns:
+            已关闭的写入器（包含digest、size和existed）
+        """
+        loop = asyncio.get_running_loop()
+        writer = self.writer(dest_path)
+        await loop.run_in_executor(None, writer.open)
+        buffer = bytearray()
+        try:
+            async for chunk in chunks:
+                buffer += chunk
+                if len(buffer) >= HASH_CHUNK_SIZE:
+                    data, buffer = buffer, bytearray()
+                    await loop.run_in_executor(None, writer.write, data)
+            if buffer:
+                await loop.run_in_executor(None, writer.write, buffer)
+        except BaseException:
+            await loop.run_in_executor(None, writer.abort)
+            raise
+        await loop.run_in_executor(None, writer.close)
+        return writer
+
+    def put_bytes(self, data: bytes, dest_path: str) -> str:
+        """
+        保存一段内容
+
+        Args:
+            data: 内容
+            dest_path: 逻辑路径
+
+        Returns:
+            SHA-256摘要
+        """
+        # 内容已在内存中，先计算摘要：存储中已有相同内容时只创建链接，不再写入
+        digest = hashlib.sha256(data).hexdigest()
+        target = self.path_for(digest, self.root_for(dest_path))
+        if os.path.isfile(target):
+            self._count("deduplicated")
+            self._count("bytes_saved", len(data))
+            self._link(target, dest_path)
+            return digest
+        with self.writer(dest_path) as writer:
+            writer.write(data)
+        return writer.digest
+
+    @staticmethod
+    def hash_file(path: str) -> str:
+        """计算文件的SHA-256摘要"""
+        sha256 = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                sha256.update(chunk)
+        return sha256.hexdigest()
+
+    def adopt(self, path: str) -> str:
+        """
+        把已写好的文件纳入存储：内容已存在时把该文件替换为指向已有blob的链接，
+        否则直接把该文件链接进存储，都不需要复制内容（文件系统不支持硬链接时复制一份）；
+        纳入的文件与原文件是同一个inode，保持原有权限
+
+        Args:
+            path: 文件路径
+
+        Returns:
+            SHA-256摘要
+        """
+        digest = self.hash_file(path)
+        target = self.path_for(digest, self.root_for(path))
+        if os.path.isfile(target):
+            if not os.path.samefile(path, target):
+                self._count("deduplicated")
+                self._count("bytes_saved", os.path.getsize(path))
+                self._link(target, path)
+            return digest
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.link(path, target)
+        except OSError as e:
+            if e.errno not in LINK_FALLBACK_ERRNOS:
+                raise
+            root = self.root_for(path)
+            temp_path = self._temp_path(root)
+            shutil.copyfile(path, temp_path)
+            self._count("copied")
+            self._commit(temp_path, digest, os.path.getsize(temp_path), root)
+            return digest
+        self._count("stored")
+        return digest
+
+    def link_file(self, source_path: str, dest_path: str) -> str:
+        """
+        让dest_path与source_path共享同一份内容，两者已是同一文件时不做任何读写；
+        不在同一文件系统时复制到目标文件系统的存储中，之后相同内容在该文件系统中不再复制
+
+        Args:
+            source_path: 源文件路径
+            dest_path: 逻辑路径
+
+        Returns:
+            dest_path
+        """
+        try:
+            if os.path.samefile(source_path, dest_path):
+                return dest_path
+        except FileNotFoundError:
+            pass
+
+        digest = self.adopt(source_path)
+        dest_root = self.root_for(dest_path)
+        target = self.path_for(digest, dest_root)
+        if not os.path.isfile(target):
+            temp_path = self._temp_path(dest_root)
+            shutil.copyfile(self.path_for(digest, self.root_for(source_path)), temp_path)
+            self._count("copied")
+            self._commit(temp_path, digest, os.path.getsize(temp_path), dest_root)
+        return self._link(target, dest_path)
+
+    def collect_garbage(self) -> Dict[str, int]:
+        """
+        删除没有逻辑路径引用（硬链接数为1）的blob和遗留的临时文件，最近变化过的文件除外
+
+        Returns:
+            删除的blob数量和字节数
+        """
+        removed = 0
+        freed = 0
+        cutoff = time.time() - GC_GRACE_SECONDS
+        for root in self.roots:
+            for directory, _, files in os.walk(root):
+                for name in files:
+                    path = os.path.join(directory, name)
+                    try:
+                        st = os.stat(path)
+                        if st.st_ctime > cutoff:
+                            continue
+                        if os.path.basename(directory) == "tmp" or st.st_nlink <= 1:
+                            os.remove(path)
+                            removed += 1
+                            freed += st.st_size
+                    except OSError:
+                        continue
+        if removed:
+            logger.info(f"已清理 {removed} 个未引用的blob，释放 {freed} 字节")
+        return {"removed": removed, "freed_bytes": freed}
+
+    def stats(self) -> Dict[str, Any]:
+        """返回blob数量、总大小和当前进程的去重统计"""
+        blobs = 0
+        total = 0
+        for root in self.roots:
+            for directory, _, files in os.walk(root):
+                if os.path.basename(directory) == "tmp":
+                    continue
+                for name in files:
+                    try:
+                        total += os.stat(os.path.join(directory, name)).st_size
+                        blobs += 1
+                    except OSError:
+                        continue
+        return {
+            "roots": self.roots,
+            "blobs": blobs,
+            "bytes": total,
+            "stored": self.stored,
+            "deduplicated": self.deduplicated,
+            "bytes_saved": self.bytes_saved,
+            "copied": self.copied
+        }
+
+class BlobWriter:
+    """
+    写入存储的文件对象
+    写入时同时计算SHA-256，关闭时提交到存储并在逻辑路径创建链接；写入过程中出错时丢弃临时文件
+    """
+
+    def __init__(self, store: BlobStore, dest_path: Optional[str] = None, directory: Optional[str] = None):
+        """
+        初始化写入器
+
+        Args:
+            store: 文件存储
+            dest_path: 逻辑路径，为None时关闭后由调用方按摘要决定路径并调用link
+            directory: dest_path为None时逻辑路径所在的目录，用于选择同一文件系统中的存储目录
+        """
+        self.store = store
+        self.dest_path = dest_path
+        self.directory = directory
+        self.size = 0
+        self.digest: Optional[str] = None
+        self.target: Optional[str] = None
+        # 关闭前存储中是否已有相同内容
+        self.existed = False
+        self._sha256 = hashlib.sha256()
+        self._root: Optional[str] = None
+        self._temp_path: Optional[str] = None
+        self._file = None
+
+    def open(self) -> "BlobWriter":
+        self._root = self.store.root_for(self.dest_path or os.path.join(self.directory or ".", "_"))
+        self._temp_path = self.store._temp_path(self._root)
+        self._file = open(self._temp_path, "wb")
+        return self
+
+    def write(self, data: bytes) -> int:
+        self._file.write(data)
+        self._sha256.update(data)
+        self.size += len(data)
+        return len(data)
+
+    def close(self) -> str:
+        """
+        提交内容并创建链接
+
+        Returns:
+            SHA-256摘要
+        """
+        self._file.close()
+        self.digest = self._sha256.hexdigest()
+        self.existed = os.path.isfile(self.store.path_for(self.digest, self._root))
+        self.target = self.store._commit(self._temp_path, self.digest, self.size, self._root)
+        if self.dest_path:
+            self.store._link(self.target, self.dest_path)
+        return self.digest
+
+    def link(self, dest_path: str) -> str:
+        """
+        关闭后在dest_path创建指向内容的链接
+
+        Args:
+            dest_path: 逻辑路径，应与创建写入器时指定的目录在同一文件系统
+
+        Returns:
+            dest_path
+        """
+        self.dest_path = dest_path
+        return self.store._link(self.target, dest_path)
+
+    def abort(self) -> None:
+        """丢弃已写入的内容"""
+        self._file.close()
+        try:
+            os.remove(self._temp_path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self) -> "BlobWriter":
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+# 单例实例
+_blob_store = None
+
+def get_blob_store() -> BlobStore:
+    """
+    获取按内容寻址的文件存储实例（单例模式）
+
+    Returns:
+        BlobStore实例
+    """
+    global _blob_store
+    if _blob_store is None:
+        _blob_store = BlobStore.from_env()
+    return _blob_store
@@ -0,0 +1,595 @@
+import os
+import io
+import csv
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import zipfile
+import logging
+import threading
+from enum import Enum
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Optional, Dict, Any, List, Callable, Iterator, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+class BulkJobStatus(str, Enum):
+    """批量任务状态"""
+    PENDING = "pending"      # 等待处理（或持有者进程已退出，等待其他进程接管）
+    RUNNING = "running"      # 处理中
+    COMPLETED = "completed"  # 所有行都已处理（包括处理失败的行）
+
+class BulkRowStatus(str, Enum):
+    """批量任务中单行的状态"""
+    PENDING = "pending"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+def parse_bulk_rows(filename: str, data: bytes, max_rows: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    解析上传的JSONL或CSV文件
+
+    Args:
+        filename: 文件名，根据扩展名判断格式（.csv为CSV，其他按JSONL解析）
+        data: 文件内容
+        max_rows: 最大行数
+
+    Returns:
+        行数据列表，每行至少包含非空的content字段
+
+    Raises:
+        ValueError: 文件格式错误、缺少content或超过最大行数
+    """
+    text = data.decode("utf-8-sig")
+    rows: List[Dict[str, Any]] = []
+
+    if filename.lower().endswith(".csv"):
+        for line_no, row in enumerate(csv.DictReader(io.StringIO(text)), start=2):
+            rows.append(_validate_row({k.strip(): v for k, v in row.items() if k}, line_no))
+    else:
+        for line_no, line in enumerate(text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"第{line_no}行不是有效的JSON: {str(e)}")
+            if not isinstance(row, dict):
+                raise ValueError(f"第{line_no}行必须是JSON对象")
+            rows.append(_validate_row(row, line_no))
+
+    if not rows:
+        raise ValueError("文件中没有数据行")
+    if max_rows and len(rows) > max_rows:
+        raise ValueError(f"行数 {len(rows)} 超过上限 {max_rows}")
+    return rows
+
+def _validate_row(row: Dict[str, Any], line_no: int) -> Dict[str, Any]:
+    content = row.get("content")
+    if not isinstance(content, str) or not content.strip():
+        raise ValueError(f"第{line_no}行缺少content")
+    return row
+
+class BulkJobStore:
+    """
+    批量任务存储（SQLite，WAL模式）
+    每行处理完成后立即写入结果作为检查点，进程崩溃后只需重新处理未完成的行；
+    任务由持有租约的进程处理，租约过期后其他进程可以接管
+    """
+
+    def __init__(self, db_path: str):
+        """
+        初始化存储
+
+        Args:
+            db_path: 数据库文件路径
+        """
+        self.db_path = db_path
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        # sqlite3连接不能跨线程共享，每个线程使用自己的连接
+        self._local = threading.local()
+
+        conn = self._get_conn()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS bulk_jobs (
+                job_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                options TEXT NOT NULL,
+                total INTEGER NOT NULL,
+                owner TEXT,
+                lease_expires REAL NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS bulk_rows (
+                job_id TEXT NOT NULL,
+                row_index INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                input TEXT NOT NULL,
+                output TEXT,
+                error TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (job_id, row_index)
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_bulk_jobs_status ON bulk_jobs (status, lease_expires)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_bulk_rows_status ON bulk_rows (job_id, status)")
+        conn.commit()
+
+    def _get_conn(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def create_job(self, rows: List[Dict[str, Any]], options: Dict[str, Any]) -> str:
+        """
+        创建批量任务
+
+        Args:
+            rows: 行数据
+            options: 任务级默认参数，行内缺少的字段使用这里的值
+
+        Returns:
+            任务ID
+        """
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        conn = self._get_conn()
+        with conn:
+            conn.execute(
+                "INSERT INTO bulk_jobs (job_id, status, options, total, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, BulkJobStatus.PENDING.value, json.dumps(options, ensure_ascii=False), len(rows), now, now)
+            )
+            conn.executemany(
+                "INSERT INTO bulk_rows (job_id, row_index, status, input, updated_at) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (job_id, index, BulkRowStatus.PENDING.value, json.dumps(row, ensure_ascii=False), now)
+                    for index, row in enumerate(rows)
+                ]
+            )
+        return job_id
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        读取任务及各状态的行数
+
+        Args:
+            job_id: 任务ID
+
+        Returns:
+            任务信息，不存在时返回None
+        """
+        conn = self._get_conn()
+        row = conn.execute(
+            "SELECT status, options, total, created_at, updated_at FROM bulk_jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        if not row:
+            return None
+        counts = {status.value: 0 for status in BulkRowStatus}
+        for status, count in conn.execute(
+            "SELECT status, COUNT(*) FROM bulk_rows WHERE job_id = ? GROUP BY status", (job_id,)
+        ):
+            counts[status] = count
+        return {
+            "job_id": job_id,
+            "status": row[0],
+            "options": json.loads(row[1]),
+            "total": row[2],
+            "rows": counts,
+            "created_at": row[3],
+            "updated_at": row[4]
+        }
+
+    def claim_job(self, job_id: str, owner: str, lease: float) -> bool:
+        """
+        获取或续期任务租约，任务未结束且租约已过期（或本来就属于owner）时成功
+
+        Args:
+            job_id: 任务ID
+            owner: 持有者标识
+            lease: 租约时长(秒)
+
+        Returns:
+            是否持有租约
+        """
+        now = time.time()
+        conn = self._get_conn()
+        cursor = conn.execute(
+            """
+            UPDATE bulk_jobs SET owner = ?, lease_expires = ?, status = ?, updated_at = ?
+            WHERE job_id = ? AND status != ? AND (owner IS NULL OR owner = ? OR lease_expires < ?)
+            """,
+            (owner, now + lease, BulkJobStatus.RUNNING.value, now,
+             job_id, BulkJobStatus.COMPLETED.value, owner, now)
+        )
+        conn.commit()
+        return cursor.rowcount > 0
+
+    def orphaned_jobs(self) -> List[str]:
+        """返回未结束且没有有效租约的任务ID（新建的任务或持有者进程已退出的任务）"""
+        conn = self._get_conn()
+        rows = conn.execute(
+            "SELECT job_id FROM bulk_jobs WHERE status != ? AND lease_expires < ? ORDER BY created_at",
+            (BulkJobStatus.COMPLETED.value, time.time())
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def pending_rows(self, job_id: str) -> List[Tuple[int, Dict[str, Any]]]:
+        """返回任务中尚未处理的行"""
+        conn = self._get_conn()
+        rows = conn.execute(
+            "SELECT row_index, input FROM bulk_rows WHERE job_id = ? AND status = ? ORDER BY row_index",
+            (job_id, BulkRowStatus.PENDING.value)
+        ).fetchall()
+        return [(row[0], json.loads(row[1])) for row in rows]
+
+    def finish_row(self, job_id: str, row_index: int, owner: str,
+                   output: Optional[Dict[str, Any]] = None, error: Optional[str] = None) -> bool:
+        """
+        记录一行的处理结果（检查点），只有仍持有任务租约时才写入
+
+        Args:
+            job_id: 任务ID
+            row_index: 行号（从0开始）
+            owner: 持有者标识
+            output: 处理结果
+            error: 失败原因，不为None时该行记为失败
+
+        Returns:
+            是否已写入，任务已被其他进程接管时返回False
+        """
+        status = BulkRowStatus.FAILED if error is not None else BulkRowStatus.COMPLETED
+        conn = self._get_conn()
+        cursor = conn.execute(
+            """
+            UPDATE bulk_rows SET status = ?, output = ?, error = ?, updated_at = ?
+            WHERE job_id = ? AND row_index = ?
+              AND EXISTS (SELECT 1 FROM bulk_jobs WHERE job_id = ? AND owner = ?)
+            """,
+            (status.value, json.dumps(output, ensure_ascii=False) if output is not None else None, error,
+             time.time(), job_id, row_index, job_id, owner)
+        )
+        conn.commit()
+        return cursor.rowcount > 0
+
+    def finish_job(self, job_id: str, owner: str) -> None:
+        """所有行处理完后把任务标记为已完成并释放租约"""
+        conn = self._get_conn()
+        conn.execute(
+            """
+            UPDATE bulk_jobs SET status = ?, owner = NULL, lease_expires = 0, updated_at = ?
+            WHERE job_id = ? AND owner = ?
+            """,
+            (BulkJobStatus.COMPLETED.value, time.time(), job_id, owner)
+        )
+        conn.commit()
+
+    def reset_failed_rows(self, job_id: str) -> int:
+        """
+        把失败的行重新标记为待处理，并重新打开任务，只对已完成的任务有效
+
+        Args:
+            job_id: 任务ID
+
+        Returns:
+            重置的行数
+        """
+        now = time.time()
+        conn = self._get_conn()
+        with conn:
+            job = conn.execute("SELECT status FROM bulk_jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if not job or job[0] != BulkJobStatus.COMPLETED.value:
+                return 0
+            reset = conn.execute(
+                "UPDATE bulk_rows SET status = ?, error = NULL, updated_at = ? WHERE job_id = ? AND status = ?",
+                (BulkRowStatus.PENDING.value, now, job_id, BulkRowStatus.FAILED.value)
+            ).rowcount
+            if reset:
+                conn.execute(
+                    "UPDATE bulk_jobs SET status = ?, updated_at = ? WHERE job_id = ? AND status = ?",
+                    (BulkJobStatus.PENDING.value, now, job_id, BulkJobStatus.COMPLETED.value)
+                )
+        return reset
+
+    def iter_rows(self, job_id: str, page_size: int = 200) -> Iterator[Dict[str, Any]]:
+        """
+        按行号顺序分页读取任务的所有行，用于流式导出结果
+
+        Args:
+            job_id: 任务ID
+            page_size: 每次查询的行数
+
+        Returns:
+            行结果迭代器
+        """
+        conn = self._get_conn()
+        last = -1
+        while True:
+            rows = conn.execute(
+                """
+                SELECT row_index, status, input, output, error FROM bulk_rows
+                WHERE job_id = ? AND row_index > ? ORDER BY row_index LIMIT ?
+                """,
+                (job_id, last, page_size)
+            ).fetchall()
+            if not rows:
+                return
+            for row_index, status, input_data, output, error in rows:
+                yield {
+                    "row": row_index,
+                    "status": status,
+                    "input": json.loads(input_data),
+                    "output": json.loads(output) if output else None,
+                    "error": error
+                }
+            last = rows[-1][0]
+
+class BulkJobRunner:
+    """
+    批量任务执行器
+    所有任务的行共用一个有界线程池；后台线程定期续期本进程持有的任务租约，
+    并接管没有有效租约的任务（包括其他进程崩溃后留下的任务），从检查点继续处理
+    """
+
+    def __init__(self,
+                 store: BulkJobStore,
+                 process_row: Callable[[Dict[str, Any], Dict[str, Any]], Dict[str, Any]],
+                 max_parallel: int = 4,
+                 lease: float = 60.0):
+        """
+        初始化执行器
+
+        Args:
+            store: 批量任务存储
+            process_row: 处理一行的函数，参数为(行数据, 任务级默认参数)，返回该行的结果
+            max_parallel: 同时处理的行数上限（所有任务合计）
+            lease: 任务租约时长(秒)，持有者进程退出后最迟经过该时长由其他进程接管
+        """
+        self.store = store
+        self.process_row = process_row
+        self.max_parallel = max_parallel
+        self.lease = lease
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self._pool = ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix="bulk-row")
+        self._running: Dict[str, threading.Thread] = {}
+        self._lock = threading.Lock()
+        self._lease_thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_env(cls, process_row: Callable[[Dict[str, Any], Dict[str, Any]], Dict[str, Any]]) -> "BulkJobRunner":
+        """根据环境变量创建执行器"""
+        return cls(
+            store=get_bulk_job_store(),
+            process_row=process_row,
+            max_parallel=int(os.getenv("BULK_JOB_MAX_PARALLEL", "4")),
+            lease=float(os.getenv("BULK_JOB_LEASE", "60"))
+        )
+
+    def start(self) -> None:
+        """启动租约线程，并立即接管未完成的任务"""
+        if self._lease_thread is not None and self._lease_thread.is_alive():
+            return
+        self._lease_thread = threading.Thread(target=self._lease_loop, name="bulk-job-lease", daemon=True)
+        self._lease_thread.start()
+        logger.info(f"批量任务执行器已启动，并发上限 {self.max_parallel}")
+
+    def submit(self, rows: List[Dict[str, Any]], options: Dict[str, Any]) -> str:
+        """
+        创建并开始处理批量任务
+
+        Args:
+            rows: 行数据
+            options: 任务级默认参数
+
+        Returns:
+            任务ID
+        """
+        job_id = self.store.create_job(rows, options)
+        self._start_job(job_id)
+        return job_id
+
+    def resume(self, job_id: str) -> bool:
+        """
+        立即尝试接管并继续处理任务
+
+        Returns:
+            本进程是否在处理该任务
+        """
+        return self._start_job(job_id)
+
+    def _start_job(self, job_id: str) -> bool:
+        with self._lock:
+            thread = self._running.get(job_id)
+            if thread is not None and thread.is_alive():
+                return True
+            if not self.store.claim_job(job_id, self.owner, self.lease):
+                return False
+            thread = threading.Thread(target=self._run_job, args=(job_id,), name=f"bulk-job-{job_id[:8]}", daemon=True)
+            self._running[job_id] = thread
+            thread.start()
+            return True
+
+    def _run_job(self, job_id: str) -> None:
+        """处理任务中所有未完成的行"""
+        try:
+            job = self.store.get_job(job_id)
+            rows = self.store.pending_rows(job_id)
+            logger.info(f"开始处理批量任务 {job_id}，待处理 {len(rows)}/{job['total']} 行")
+            # 任务被其他进程接管后不再处理剩余的行
+            lost = threading.Event()
+            futures = [
+                self._pool.submit(self._process, job_id, row_index, row, job["options"], lost)
+                for row_index, row in rows
+            ]
+            wait(futures)
+            # 有行的结果没能写入（例如数据库错误）时保持任务未完成，租约到期后重新处理这些行
+            remaining = len(self.store.pending_rows(job_id))
+            if remaining:
+                logger.warning(f"批量任务 {job_id} 还有 {remaining} 行未完成，租约到期后重新处理")
+                return
+            self.store.finish_job(job_id, self.owner)
+            logger.info(f"批量任务 {job_id} 处理完成")
+        except Exception as e:
+            # 租约到期后由本进程或其他进程重新接管
+            logger.error(f"批量任务 {job_id} 处理中断: {str(e)}")
+        finally:
+            with self._lock:
+                self._running.pop(job_id, None)
+
+    def _process(self, job_id: str, row_index: int, row: Dict[str, Any], options: Dict[str, Any],
+                 lost: threading.Event) -> None:
+        if lost.is_set():
+            return
+        try:
+            output = self.process_row(row, options)
+        except Exception as e:
+            logger.error(f"批量任务 {job_id} 第{row_index}行处理失败: {str(e)}")
+            output, error = None, str(e)
+        else:
+            error = None
+        try:
+            written = self.store.finish_row(job_id, row_index, self.owner, output=output, error=error)
+        except Exception as e:
+            logger.error(f"批量任务 {job_id} 第{row_index}行结果写入失败: {str(e)}")
+            return
+        if not written:
+            logger.warning(f"批量任务 {job_id} 已被其他进程接管，停止处理")
+            lost.set()
+
+    def _lease_loop(self) -> None:
+        """续期本进程持有的租约，并接管没有有效租约的任务"""
+        while True:
+            try:
+                with self._lock:
+                    running = list(self._running)
+                for job_id in running:
+                    self.store.claim_job(job_id, self.owner, self.lease)
+                for job_id in self.store.orphaned_jobs():
+                    if self._start_job(job_id):
+                        logger.info(f"接管批量任务 {job_id}")
+            except Exception as e:
+                logger.error(f"批量任务租约维护失败: {str(e)}")
+            time.sleep(self.lease / 3)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回执行器运行情况"""
+        with self._lock:
+            running = len(self._running)
+        return {"running_jobs": running, "max_parallel": self.max_parallel}
+
+class _ZipStreamBuffer(io.RawIOBase):
+    """只追加的缓冲区，zipfile写入的数据被逐段取出发送，不需要可回退的文件"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+def stream_results_jsonl(store: BulkJobStore, job_id: str) -> Iterator[bytes]:
+    """
+    以JSONL格式流式导出任务结果，每行一条记录
+
+    Args:
+        store: 批量任务存储
+        job_id: 任务ID
+
+    Returns:
+        字节块迭代器
+    """
+    for row in store.iter_rows(job_id):
+        yield (json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8")
+
+def stream_results_zip(store: BulkJobStore,
+                       job_id: str,
+                       attachments: Callable[[Dict[str, Any]], List[Tuple[str, str]]],
+                       chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """
+    以ZIP格式流式导出任务结果：results.jsonl加上各行生成的文件，边压缩边发送
+
+    Args:
+        store: 批量任务存储
+        job_id: 任务ID
+        attachments: 返回一行需要打包的文件列表[(压缩包内路径, 本地文件路径)]的函数
+        chunk_size: 读取文件的块大小
+
+    Returns:
+        字节块迭代器
+    """
+    buffer = _ZipStreamBuffer()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        with archive.open("results.jsonl", "w") as entry:
+            for row in store.iter_rows(job_id):
+                entry.write((json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8"))
+                data = buffer.drain()
+                if data:
+                    yield data
+
+        for row in store.iter_rows(job_id):
+            for arcname, path in attachments(row):
+                if not os.path.isfile(path):
+                    continue
+                with open(path, "rb") as source, archive.open(arcname, "w") as entry:
+                    while True:
+                        block = source.read(chunk_size)
+                        if not block:
+                            break
+                        entry.write(block)
+                        data = buffer.drain()
+                        if data:
+                            yield data
+    yield buffer.drain()
+
+# 单例实例
+_bulk_job_store = None
+
+def get_bulk_job_store() -> BulkJobStore:
+    """
+    获取批量任务存储实例（单例模式）
+
+    Returns:
+        BulkJobStore实例
+    """
+    global _bulk_job_store
+    if _bulk_job_store is None:
+        _bulk_job_store = BulkJobStore(os.getenv("BULK_JOB_PATH", os.path.join("data", "bulk_jobs.db")))
+    return _bulk_job_store
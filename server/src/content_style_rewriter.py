@@ -1,11 +1,13 @@
 from typing import Optional
-from langchain_openai import ChatOpenAI
-from langchain.prompts import ChatPromptTemplate
-from langchain.chains import LLMChain
 from pydantic import BaseModel, Field
 import os
 from dotenv import load_dotenv
 
+try:
+    from .llm_cache import get_llm_cache
+except ImportError:
+    from llm_cache import get_llm_cache
+
 load_dotenv()
 
 class ContentStyle(BaseModel):
@@ -14,19 +16,11 @@ class ContentStyle(BaseModel):
     structure: str = Field(description="文章结构说明")
     examples: list[str] = Field(description="内容风格示例")
 
-class ContentStyleRewriter:
-    def __init__(self):
-        self.llm = ChatOpenAI(
-            model="deepseek-chat",
-            openai_api_key=os.getenv("LLM_API_KEY"),
-            base_url=os.getenv("LLM_BASE_URL"),
-            temperature=0.7
-        )
-        
-        self.styles = {
-            "咪蒙体": ContentStyle(
-                name="咪蒙体",
-                description="""咪蒙体写作特点：
+# 内容风格，不依赖langchain，接口校验参数时不需要创建生成器
+CONTENT_STYLES = {
+    "咪蒙体": ContentStyle(
+        name="咪蒙体",
+        description="""咪蒙体写作特点：
                 1. 情感共鸣强烈，直击人心
                 2. 善用个人经历和故事性叙述
                 3. 语言犀利、直击痛点
@@ -35,15 +29,15 @@ class ContentStyleRewriter:
                 6. 多用感叹号，增强情感表达
                 7. 带有情感转折或反转
                 8. 结尾升华主题，引发思考""",
-                structure="""文章结构：
+        structure="""文章结构：
                 1. 开篇：用个人经历或故事引入
                 2. 转折：遇到问题或困境
                 3. 思考：对问题的深入思考
                 4. 解决：找到解决方案
                 5. 升华：总结人生道理
                 6. 结尾：引发读者共鸣和思考""",
-                examples=[
-                    """那是我人生最黑暗的时刻。
+        examples=[
+            """那是我人生最黑暗的时刻。
 
                     每天加班到凌晨，却依然看不到希望。同事们的冷眼，领导的质疑，让我一度怀疑自己是不是真的不行。
 
@@ -54,7 +48,7 @@ class ContentStyleRewriter:
                     现在回想起来，那些曾经让我痛苦的日子，反而成了我最宝贵的财富。
 
                     因为，正是那些经历，让我学会了如何在这个世界上，活出最好的自己。""",
-                    """"你不行。"
+            """"你不行。"
 
                     这是我听过最多的话。
 
@@ -66,11 +60,11 @@ class ContentStyleRewriter:
 
                     今天，我想告诉所有和我一样的人：
                     不要被别人的否定打败，因为你的未来，掌握在自己手中。"""
-                ]
-            ),
-            "公众号爆款文": ContentStyle(
-                name="公众号爆款文",
-                description="""公众号爆款文特点：
+        ]
+    ),
+    "公众号爆款文": ContentStyle(
+        name="公众号爆款文",
+        description="""公众号爆款文特点：
                 1. 标题吸引人，制造悬念
                 2. 开篇用数据或现象引入
                 3. 分点论述，层次分明
@@ -79,15 +73,15 @@ class ContentStyleRewriter:
                 6. 善用小标题
                 7. 结尾有行动指南
                 8. 互动性强，引导评论""",
-                structure="""文章结构：
+        structure="""文章结构：
                 1. 开篇：用数据或现象引入话题
                 2. 分析：深入分析现象背后的原因
                 3. 案例：列举具体案例
                 4. 方法：提供解决方案
                 5. 总结：总结核心观点
                 6. 互动：设置互动话题""",
-                examples=[
-                    """最近，一项调查显示：超过80%的年轻人都在为副业发愁。
+        examples=[
+            """最近，一项调查显示：超过80%的年轻人都在为副业发愁。
 
                     为什么？
                     因为工资不够花？
@@ -121,7 +115,7 @@ class ContentStyleRewriter:
                     副业不是终点，而是新生活的起点。
 
                     你觉得哪个副业方向最适合你？欢迎在评论区留言讨论。""",
-                    """"月入10万，真的很难吗？"
+            """"月入10万，真的很难吗？"
 
                     最近，我收到很多读者的私信，都在问这个问题。
 
@@ -153,9 +147,25 @@ class ContentStyleRewriter:
                     收入提升是一个渐进的过程，需要时间和耐心。
 
                     你觉得提升收入最大的障碍是什么？欢迎在评论区分享你的想法。"""
-                ]
-            )
-        }
+        ]
+    )
+}
+
+class ContentStyleRewriter:
+    def __init__(self):
+        from langchain_openai import ChatOpenAI
+        from langchain.prompts import ChatPromptTemplate
+        from langchain.chains import LLMChain
+
+        self.llm = ChatOpenAI(
+            model="deepseek-chat",
+            openai_api_key=os.getenv("LLM_API_KEY"),
+            base_url=os.getenv("LLM_BASE_URL"),
+            temperature=0.7
+        )
+        self.cache = get_llm_cache()
+        
+        self.styles = CONTENT_STYLES
         
         self.content_prompt = ChatPromptTemplate.from_messages([
             ("system", """你是一个专业的文章改写专家。请根据给定的风格和内容，重写文章。
@@ -178,19 +188,19 @@ class ContentStyleRewriter:
             prompt=self.content_prompt
         )
     
-    def rewrite_content(self, content: str, style: str) -> str:
-        """根据指定风格重写文章内容"""
+    def rewrite_content(self, content: str, style: str, use_cache: bool = True) -> str:
+        """根据指定风格重写文章内容，use_cache为False时跳过LLM响应缓存重新生成"""
         if style not in self.styles:
             raise ValueError(f"不支持的内容风格：{style}。支持的风格有：{', '.join(self.styles.keys())}")
         
         style_info = self.styles[style]
-        result = self.content_chain.invoke({
+        result = self.cache.invoke("content_style", self.content_chain, {
             "style": style,
             "style_description": style_info.description,
             "style_structure": style_info.structure,
             "style_examples": "\n\n".join(style_info.examples),
             "content": content
-        })
+        }, use_cache=use_cache)
         
         return result["text"].strip()
 
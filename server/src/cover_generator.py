@@ -1,13 +1,24 @@
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Callable, Iterator, Tuple
 import os
+import uuid
 from datetime import datetime
-from langchain_openai import ChatOpenAI
-from langchain.prompts import ChatPromptTemplate
-from langchain.chains import LLMChain
+from typing import TYPE_CHECKING
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 from enum import Enum
 
+try:
+    from .llm_cache import get_llm_cache
+    from .progressive_file import ProgressiveFileWriter
+    from .job_executor import map_sequentially
+except ImportError:
+    from llm_cache import get_llm_cache
+    from progressive_file import ProgressiveFileWriter
+    from job_executor import map_sequentially
+
+if TYPE_CHECKING:
+    from langchain.chains import LLMChain
+
 load_dotenv()
 
 class CoverStyle(str, Enum):
@@ -29,13 +40,25 @@ class CoverDesign(BaseModel):
     keywords: list[str] = Field(description="关键词列表")
 
 class CoverGenerator:
-    def __init__(self):
+    def __init__(self, map_fn: Optional[Callable] = None):
+        """
+        初始化封面生成器
+
+        Args:
+            map_fn: 多风格生成时并发调用模型的函数，签名与JobExecutor.map（已指定作业类型）相同，默认依次生成
+        """
+        from langchain_openai import ChatOpenAI
+        from langchain.prompts import ChatPromptTemplate
+        from langchain.chains import LLMChain
+
         self.llm = ChatOpenAI(
             model="deepseek-chat",
             openai_api_key=os.getenv("LLM_API_KEY"),
             base_url=os.getenv("LLM_BASE_URL"),
             temperature=0.7
         )
+        self.cache = get_llm_cache()
+        self.map_fn = map_fn or map_sequentially
         
         # 预设风格
         self.styles = {
@@ -493,61 +516,117 @@ class CoverGenerator:
 - **简约线条边框**：适当使用线条框架划分内容区域，结构清晰
 """
 
-    def generate_wechat_cover(self, title: str, emoji_url: Optional[str] = None, style: str = "default") -> str:
-        """生成微信公众号封面HTML"""
+    def _write_cover(self, name: str, chain: "LLMChain", inputs: Dict, filename: str, use_cache: bool, on_stream_start: Optional[Callable[[str], None]]) -> None:
+        """调用LLM生成封面HTML并写入文件，传入on_stream_start时流式生成，边生成边写入"""
+        if on_stream_start is None:
+            result = self.cache.invoke(name, chain, inputs, use_cache=use_cache)
+            with open(filename, "w", encoding="utf-8") as f:
+                f.write(result["text"])
+            return
+
+        with ProgressiveFileWriter(filename) as writer:
+            on_stream_start(filename)
+            for text in self.cache.stream(name, chain, inputs, use_cache=use_cache):
+                writer.write(text)
+
+    def generate_wechat_cover(self, title: str, emoji_url: Optional[str] = None, style: str = "default", use_cache: bool = True,
+                              on_stream_start: Optional[Callable[[str], None]] = None) -> str:
+        """
+        生成微信公众号封面HTML
+
+        Args:
+            title: 文章标题
+            emoji_url: 表情图片URL
+            style: 封面风格
+            use_cache: 是否使用LLM响应缓存，为False时重新生成
+            on_stream_start: 流式生成时的回调，文件创建后以文件路径调用，之后HTML逐段写入该文件
+
+        Returns:
+            HTML文件路径
+        """
         # 获取风格提示词
         style_instructions = ""
         if style and style != "default" and style in [s.value for s in CoverStyle]:
             style_enum = CoverStyle(style)
             style_instructions = self.styles.get(style_enum, "")
         
-        # 使用LLM生成设计
-        result = self.wechat_chain.invoke({
-            "title": title,
-            "emoji_url": emoji_url,
-            "style": style,
-            "style_instructions": style_instructions
-        })
-        
         # 创建 templates 目录（如果不存在）
         os.makedirs("templates", exist_ok=True)
         
-        # 保存HTML文件
+        # 使用LLM生成设计并保存HTML文件，文件名带随机后缀，同一秒内的并发生成不会互相覆盖
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"templates/wechat_cover_{timestamp}_{style}.html"
-        with open(filename, "w", encoding="utf-8") as f:
-            f.write(result["text"])
+        filename = f"templates/wechat_cover_{timestamp}_{style}_{uuid.uuid4().hex[:8]}.html"
+        self._write_cover("cover.wechat", self.wechat_chain, {
+            "title": title,
+            "emoji_url": emoji_url,
+            "style": style,
+            "style_instructions": style_instructions
+        }, filename, use_cache, on_stream_start)
         
         return filename
     
-    def generate_xiaohongshu_cover(self, content: str, account_name: str, slogan: Optional[str] = None, style: str = "default") -> str:
-        """生成小红书封面HTML"""
+    def generate_xiaohongshu_cover(self, content: str, account_name: str, slogan: Optional[str] = None, style: str = "default",
+                                   use_cache: bool = True, on_stream_start: Optional[Callable[[str], None]] = None) -> str:
+        """
+        生成小红书封面HTML
+
+        Args:
+            content: 封面内容
+            account_name: 账号名称
+            slogan: 口号
+            style: 封面风格
+            use_cache: 是否使用LLM响应缓存，为False时重新生成
+            on_stream_start: 流式生成时的回调，文件创建后以文件路径调用，之后HTML逐段写入该文件
+
+        Returns:
+            HTML文件路径
+        """
         # 获取风格提示词
         style_instructions = ""
         if style and style != "default" and style in [s.value for s in CoverStyle]:
             style_enum = CoverStyle(style)
             style_instructions = self.styles.get(style_enum, "")
         
-        # 使用LLM生成设计
-        result = self.xhs_chain.invoke({
+        # 创建 templates 目录（如果不存在）
+        os.makedirs("templates", exist_ok=True)
+        
+        # 使用LLM生成设计并保存HTML文件，文件名带随机后缀，同一秒内的并发生成不会互相覆盖
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = f"templates/xiaohongshu_cover_{timestamp}_{style}_{uuid.uuid4().hex[:8]}.html"
+        self._write_cover("cover.xiaohongshu", self.xhs_chain, {
             "content": content,
             "account_name": account_name,
             "slogan": slogan,
             "style": style,
             "style_instructions": style_instructions
-        })
-        
-        # 创建 templates 目录（如果不存在）
-        os.makedirs("templates", exist_ok=True)
-        
-        # 保存HTML文件
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"templates/xiaohongshu_cover_{timestamp}_{style}.html"
-        with open(filename, "w", encoding="utf-8") as f:
-            f.write(result["text"])
+        }, filename, use_cache, on_stream_start)
         
         return filename
 
+    def generate_xiaohongshu_cover_variants(self, content: str, account_name: str, slogan: Optional[str] = None,
+                                            styles: Optional[List[str]] = None, max_parallel: int = 4,
+                                            use_cache: bool = True) -> Iterator[Tuple[str, Optional[str], Optional[Exception]]]:
+        """
+        并发生成多种风格的小红书封面，按完成先后逐个返回
+
+        Args:
+            content: 封面内容
+            account_name: 账号名称
+            slogan: 口号
+            styles: 风格列表，默认为全部风格
+            max_parallel: 同时进行的生成数量上限，实际并发还受map_fn可用的名额限制
+            use_cache: 是否使用LLM响应缓存
+
+        Returns:
+            (风格, HTML文件路径, 异常) 的迭代器，生成失败时HTML文件路径为None
+        """
+        styles = styles or [s.value for s in CoverStyle]
+        yield from self.map_fn(
+            lambda style: self.generate_xiaohongshu_cover(content, account_name, slogan, style, use_cache),
+            styles,
+            max_parallel
+        )
+
 def main():
     generator = CoverGenerator()
     
@@ -0,0 +1,165 @@
+"""
+本地模拟的海螺(MiniMaxi)和Kling接口，用于在没有真实API密钥时调试异步任务、轮询和回调通知。
+
+启动模拟服务:
+    python -m src.fake_provider --port 9100
+
+再让API服务指向它:
+    MINIMAXI_BASE_URL=http://127.0.0.1:9100/v1
+    KLING_BASE_URL=http://127.0.0.1:9100
+    WEBHOOK_BASE_URL=http://127.0.0.1:8000
+    WEBHOOK_SECRET=dev-secret
+"""
+import os
+import io
+import time
+import uuid
+import asyncio
+import hashlib
+import logging
+import argparse
+from datetime import datetime
+from typing import Dict, Any
+
+import requests
+from fastapi import FastAPI, HTTPException, Request, Body
+from fastapi.responses import Response
+from PIL import Image
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 任务从提交到完成的模拟耗时(秒)
+FAKE_PROVIDER_DELAY = float(os.getenv("FAKE_PROVIDER_DELAY", "3"))
+
+app = FastAPI(title="模拟海螺/Kling接口", version="1.0.0")
+
+# 任务ID -> 任务信息
+tasks: Dict[str, Dict[str, Any]] = {}
+
+def _status(task: Dict[str, Any]) -> str:
+    """根据提交后经过的时间计算任务状态"""
+    elapsed = time.time() - task["submitted_at"]
+    if elapsed >= FAKE_PROVIDER_DELAY:
+        return "completed"
+    if elapsed >= FAKE_PROVIDER_DELAY / 2:
+        return "processing"
+    return "pending"
+
+def _result(task: Dict[str, Any]) -> Dict[str, Any]:
+    """按各提供方的格式生成任务查询结果"""
+    status = _status(task)
+    base = task["file_base"]
+    if task["provider"] == "kling":
+        return {
+            "task_id": task["task_id"],
+            "status": status,
+            "video_url": f"{base}/files/{task['task_id']}.mp4" if status == "completed" else None,
+            "created_at": task["created_at"],
+            "completed_at": datetime.now().isoformat() if status == "completed" else None
+        }
+
+    result = {"task_id": task["task_id"], "status": "success" if status == "completed" else status}
+    if status == "completed":
+        if task["kind"] == "image":
+            result["images"] = [
+                {"url": f"{base}/files/{task['task_id']}_{i}.png"} for i in range(task["num_images"])
+            ]
+        else:
+            result["video_url"] = f"{base}/files/{task['task_id']}.mp4"
+    return result
+
+async def _send_callback(task_id: str) -> None:
+    """任务完成后向回调URL推送结果"""
+    await asyncio.sleep(FAKE_PROVIDER_DELAY)
+    task = tasks.get(task_id)
+    if not task or not task.get("callback_url"):
+        return
+    try:
+        response = await asyncio.get_running_loop().run_in_executor(
+            None,
+            lambda: requests.post(task["callback_url"], json=_result(task), timeout=10)
+        )
+        logger.info(f"回调通知 {task_id}: {response.status_code} {response.text}")
+    except requests.RequestException as e:
+        logger.error(f"回调通知 {task_id} 失败: {str(e)}")
+
+def _create_task(request: Request, provider: str, kind: str, payload: Dict[str, Any], callback_key: str) -> Dict[str, Any]:
+    """登记一个模拟任务，并在配置了回调URL时安排完成通知"""
+    task_id = uuid.uuid4().hex
+    tasks[task_id] = {
+        "task_id": task_id,
+        "provider": provider,
+        "kind": kind,
+        "num_images": int(payload.get("n", 1)),
+        "callback_url": payload.get(callback_key),
+        "submitted_at": time.time(),
+        "created_at": datetime.now().isoformat(),
+        "file_base": str(request.base_url).rstrip("/")
+    }
+    asyncio.get_running_loop().create_task(_send_callback(task_id))
+    logger.info(f"创建{provider} {kind}任务 {task_id}, 回调: {payload.get(callback_key)}")
+    return tasks[task_id]
+
+def _get_task(task_id: str) -> Dict[str, Any]:
+    if task_id not in tasks:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return tasks[task_id]
+
+# 海螺接口
+@app.post("/v1/images/generation")
+async def minimaxi_generate_image(request: Request, payload: Dict[str, Any] = Body(...)):
+    task = _create_task(request, "minimaxi", "image", payload, "webhook_url")
+    return {"task_id": task["task_id"]}
+
+@app.get("/v1/images/generation/{task_id}")
+async def minimaxi_query_image(task_id: str):
+    return _result(_get_task(task_id))
+
+@app.post("/v1/videos/generation")
+async def minimaxi_generate_video(request: Request, payload: Dict[str, Any] = Body(...)):
+    task = _create_task(request, "minimaxi", "video", payload, "webhook_url")
+    return {"task_id": task["task_id"]}
+
+@app.get("/v1/videos/generation/{task_id}")
+async def minimaxi_query_video(task_id: str):
+    return _result(_get_task(task_id))
+
+# Kling接口
+@app.post("/v1/text-to-video")
+async def kling_text_to_video(request: Request, payload: Dict[str, Any] = Body(...)):
+    task = _create_task(request, "kling", "video", payload, "callback_url")
+    return {"task_id": task["task_id"], "created_at": task["created_at"]}
+
+@app.post("/v1/image-to-video")
+async def kling_image_to_video(request: Request, payload: Dict[str, Any] = Body(...)):
+    task = _create_task(request, "kling", "video", payload, "callback_url")
+    return {"task_id": task["task_id"], "created_at": task["created_at"]}
+
+@app.get("/v1/tasks/{task_id}")
+async def kling_task_status(task_id: str):
+    return _result(_get_task(task_id))
+
+# 生成结果文件
+@app.get("/files/{file_name}")
+async def get_file(file_name: str):
+    """返回模拟的图像或视频文件"""
+    if file_name.endswith(".png"):
+        color = tuple(hashlib.md5(file_name.encode("utf-8")).digest()[:3])
+        buffer = io.BytesIO()
+        Image.new("RGB", (256, 256), color).save(buffer, format="PNG")
+        return Response(content=buffer.getvalue(), media_type="image/png")
+    if file_name.endswith(".mp4"):
+        return Response(content=b"\x00\x00\x00\x18ftypmp42fake-video", media_type="video/mp4")
+    raise HTTPException(status_code=404, detail="File not found")
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="启动模拟的海螺/Kling接口")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=9100, help="监听端口")
+    args = parser.parse_args()
+
+    uvicorn.run(app, host=args.host, port=args.port)
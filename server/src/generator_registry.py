@@ -0,0 +1,160 @@
+import time
+import logging
+import threading
+from typing import Optional, Dict, Any, Callable, List
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+class GeneratorUnavailableError(RuntimeError):
+    """生成器无法创建，通常是缺少API密钥等配置"""
+
+    def __init__(self, name: str, error: str):
+        super().__init__(f"{name} 不可用: {error}")
+        self.name = name
+        self.error = error
+
+class GeneratorRegistry:
+    """
+    生成器注册表
+    启动时只登记创建函数，第一次使用时才导入依赖并创建生成器，
+    服务启动不再等待所有生成器初始化，某个提供方缺少配置也不影响其他功能。
+    LLM类生成器在构造函数中才导入langchain（导入约需1.5秒），因此也不会拖慢服务启动
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._providers: Dict[str, str] = {}
+        self._instances: Dict[str, Any] = {}
+        self._errors: Dict[str, str] = {}
+        self._load_times: Dict[str, float] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+
+    def register(self, name: str, factory: Callable[[], Any], provider: Optional[str] = None) -> "LazyGenerator":
+        """
+        登记生成器
+
+        Args:
+            name: 生成器名称
+            factory: 创建生成器的函数
+            provider: 所属提供方，用于按提供方汇总就绪状态，默认与名称相同
+
+        Returns:
+            生成器代理，访问其属性时自动创建生成器
+        """
+        self._factories[name] = factory
+        self._providers[name] = provider or name
+        self._locks[name] = threading.Lock()
+        return LazyGenerator(self, name)
+
+    def get(self, name: str) -> Any:
+        """
+        获取生成器，尚未创建时立即创建
+
+        Args:
+            name: 生成器名称
+
+        Returns:
+            生成器实例
+
+        Raises:
+            GeneratorUnavailableError: 生成器创建失败
+        """
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+
+        # 每个生成器单独加锁，并发的首次请求只创建一次，也不会阻塞其他生成器
+        with self._locks[name]:
+            instance = self._instances.get(name)
+            if instance is not None:
+                return instance
+            started = time.monotonic()
+            try:
+                instance = self._factories[name]()
+            except Exception as e:
+                # 不缓存失败，修正配置后下一次请求会重新尝试
+                self._errors[name] = str(e)
+                logger.error(f"创建生成器 {name} 失败: {str(e)}")
+                raise GeneratorUnavailableError(name, str(e)) from e
+            self._load_times[name] = time.monotonic() - started
+            self._errors.pop(name, None)
+            self._instances[name] = instance
+            logger.info(f"生成器 {name} 已创建，耗时 {self._load_times[name]:.2f} 秒")
+            return instance
+
+    def preload(self, names: Optional[List[str]] = None) -> None:
+        """
+        预先创建生成器，失败只记录状态
+
+        Args:
+            names: 生成器名称列表，默认全部
+        """
+        for name in names or list(self._factories):
+            if name not in self._factories:
+                logger.warning(f"未知的生成器: {name}")
+                continue
+            try:
+                self.get(name)
+            except GeneratorUnavailableError:
+                pass
+
+    def readiness(self) -> Dict[str, Any]:
+        """
+        返回各生成器和提供方的就绪状态
+
+        Returns:
+            generators为每个生成器的状态（ready已创建、idle尚未使用、unavailable创建失败），
+            providers为每个提供方的汇总状态（任一生成器不可用即为unavailable）
+        """
+        generators = {}
+        providers: Dict[str, str] = {}
+        for name in self._factories:
+            if name in self._instances:
+                status = {"status": "ready", "load_time": round(self._load_times[name], 3)}
+            elif name in self._errors:
+                status = {"status": "unavailable", "error": self._errors[name]}
+            else:
+                status = {"status": "idle"}
+            generators[name] = status
+
+            provider = self._providers[name]
+            if status["status"] == "unavailable" or providers.get(provider) == "unavailable":
+                providers[provider] = "unavailable"
+            elif status["status"] == "ready" or providers.get(provider) == "ready":
+                providers[provider] = "ready"
+            else:
+                providers[provider] = "idle"
+        return {"generators": generators, "providers": providers}
+
+class LazyGenerator:
+    """生成器代理，第一次访问属性时通过注册表创建生成器，之后直接转发"""
+
+    def __init__(self, registry: GeneratorRegistry, name: str):
+        object.__setattr__(self, "_registry", registry)
+        object.__setattr__(self, "_name", name)
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._registry.get(self._name), attr)
+
+    def __setattr__(self, attr: str, value: Any) -> None:
+        setattr(self._registry.get(self._name), attr, value)
+
+    def __repr__(self) -> str:
+        return f"<LazyGenerator {self._name}>"
+
+# 单例实例
+_generator_registry = None
+
+def get_generator_registry() -> GeneratorRegistry:
+    """
+    获取生成器注册表实例（单例模式）
+
+    Returns:
+        GeneratorRegistry实例
+    """
+    global _generator_registry
+    if _generator_registry is None:
+        _generator_registry = GeneratorRegistry()
+    return _generator_registry
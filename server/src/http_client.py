@@ -0,0 +1,140 @@
+import os
+import asyncio
+import logging
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from typing import Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+class PooledSession(requests.Session):
+    """
+    带连接池和默认超时的HTTP会话
+    所有提供方客户端共用一个会话，提交、轮询和下载复用已建立的TCP/TLS连接（keep-alive），
+    未显式指定timeout的请求使用默认的连接/读取超时，避免卡住的连接永久占用工作线程
+    """
+
+    def __init__(self,
+                 pool_size: int = 32,
+                 pool_hosts: int = 10,
+                 timeout: Tuple[float, float] = (5.0, 60.0),
+                 keep_alive: bool = True):
+        """
+        初始化会话
+
+        Args:
+            pool_size: 每个主机保持的最大连接数
+            pool_hosts: 缓存连接池的主机数量
+            timeout: 默认的(连接超时, 读取超时)，单位为秒
+            keep_alive: 是否复用连接，关闭时每个请求结束后断开连接
+        """
+        super().__init__()
+        self.timeout = timeout
+        adapter = HTTPAdapter(pool_connections=pool_hosts, pool_maxsize=pool_size)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+        if not keep_alive:
+            self.headers["Connection"] = "close"
+
+    def request(self, method, url, **kwargs):
+        """发送请求，未指定timeout时使用默认超时"""
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return super().request(method, url, **kwargs)
+
+def _keep_alive() -> bool:
+    """是否复用连接，由HTTP_KEEP_ALIVE环境变量控制"""
+    return os.getenv("HTTP_KEEP_ALIVE", "true").lower() in ("1", "true", "yes")
+
+def create_http_session() -> PooledSession:
+    """
+    根据环境变量创建会话
+
+    环境变量:
+        HTTP_POOL_SIZE: 每个主机的最大连接数，默认32
+        HTTP_KEEP_ALIVE: 是否复用连接，默认true
+        HTTP_CONNECT_TIMEOUT: 连接超时(秒)，默认5
+        HTTP_READ_TIMEOUT: 读取超时(秒)，默认60
+
+    Returns:
+        PooledSession实例
+    """
+    return PooledSession(
+        pool_size=int(os.getenv("HTTP_POOL_SIZE", "32")),
+        timeout=(
+            float(os.getenv("HTTP_CONNECT_TIMEOUT", "5")),
+            float(os.getenv("HTTP_READ_TIMEOUT", "60"))
+        ),
+        keep_alive=_keep_alive()
+    )
+
+# 单例实例
+_http_session: Optional[PooledSession] = None
+
+def get_http_session() -> PooledSession:
+    """
+    获取共享的HTTP会话（单例模式）
+
+    Returns:
+        PooledSession实例
+    """
+    global _http_session
+    if _http_session is None:
+        _http_session = create_http_session()
+    return _http_session
+
+def create_async_http_client() -> httpx.AsyncClient:
+    """
+    根据环境变量创建异步HTTP客户端，超时配置与同步会话相同
+
+    环境变量:
+        HTTP_ASYNC_MAX_CONNECTIONS: 最大并发连接数，默认100，超出的请求等待空闲连接
+        HTTP_POOL_SIZE: 保持的空闲keep-alive连接数，默认32
+
+    Returns:
+        httpx.AsyncClient实例
+    """
+    pool_size = int(os.getenv("HTTP_POOL_SIZE", "32"))
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(
+            float(os.getenv("HTTP_READ_TIMEOUT", "60")),
+            connect=float(os.getenv("HTTP_CONNECT_TIMEOUT", "5")),
+            pool=None
+        ),
+        limits=httpx.Limits(
+            max_connections=int(os.getenv("HTTP_ASYNC_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=pool_size if _keep_alive() else 0
+        )
+    )
+
+# 异步客户端绑定创建它的事件循环
+_async_http_client: Optional[httpx.AsyncClient] = None
+_async_http_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """
+    获取当前事件循环共享的异步HTTP客户端，必须在事件循环中调用
+
+    Returns:
+        httpx.AsyncClient实例
+    """
+    global _async_http_client, _async_http_client_loop
+    loop = asyncio.get_running_loop()
+    if _async_http_client is None or _async_http_client.is_closed or _async_http_client_loop is not loop:
+        _async_http_client = create_async_http_client()
+        _async_http_client_loop = loop
+    return _async_http_client
+
+async def close_async_http_client() -> None:
+    """关闭共享的异步HTTP客户端，释放连接"""
+    global _async_http_client, _async_http_client_loop
+    if _async_http_client is not None and not _async_http_client.is_closed:
+        await _async_http_client.aclose()
+    _async_http_client = None
+    _async_http_client_loop = None
@@ -0,0 +1,377 @@
+import os
+import time
+import uuid
+import asyncio
+import mimetypes
+import hashlib
+import logging
+import warnings
+import threading
+import multiprocessing
+from enum import Enum
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Dict, Any, List, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 允许的输出宽度，请求的宽度向上取到最近的一档，避免任意宽度产生大量缓存文件
+WIDTH_STEPS = [64, 128, 160, 240, 320, 480, 640, 960, 1280, 1600, 2048]
+DEFAULT_QUALITY = 80
+
+class VariantFormat(str, Enum):
+    AUTO = "auto"  # 按Accept请求头选择avif/webp，都不支持时使用jpeg
+    WEBP = "webp"
+    AVIF = "avif"
+    JPEG = "jpeg"
+    PNG = "png"
+
+class ImageTooLargeError(ValueError):
+    """原图像素数超过PIL的解压炸弹保护上限"""
+
+class VariantWorkerError(RuntimeError):
+    """编码进程异常退出（例如被系统终止），进程池会在下一次请求时重新创建"""
+
+mimetypes.add_type("image/webp", ".webp")
+mimetypes.add_type("image/avif", ".avif")
+
+# 输出格式 -> (PIL格式名, 扩展名)
+_PIL_FORMATS = {
+    VariantFormat.WEBP: ("WEBP", ".webp"),
+    VariantFormat.AVIF: ("AVIF", ".avif"),
+    VariantFormat.JPEG: ("JPEG", ".jpg"),
+    VariantFormat.PNG: ("PNG", ".png"),
+}
+
+def _load_avif_plugin() -> None:
+    """AVIF需要pillow-avif-plugin，未安装时不提供"""
+    try:
+        import pillow_avif  # noqa: F401
+    except ImportError:
+        pass
+
+def supported_formats() -> List[VariantFormat]:
+    """当前环境中PIL能够编码的输出格式"""
+    from PIL import Image
+    _load_avif_plugin()
+    Image.init()
+    return [fmt for fmt, (pil_format, _) in _PIL_FORMATS.items() if pil_format in Image.SAVE]
+
+def snap_width(width: int) -> int:
+    """把请求的宽度向上取到允许的档位"""
+    for step in WIDTH_STEPS:
+        if width <= step:
+            return step
+    return WIDTH_STEPS[-1]
+
+def render_variant(source_path: str, target_path: str, width: int, fmt: str, quality: int) -> Tuple[int, int, int]:
+    """
+    生成缩放和转码后的图片（在进程池中运行）
+
+    Args:
+        source_path: 原图路径
+        target_path: 输出路径
+        width: 最大宽度，原图更窄时不放大
+        fmt: 输出格式
+        quality: 有损格式的质量(1-100)
+
+    Returns:
+        (输出宽度, 输出高度, 输出字节数)
+
+    Raises:
+        ImageTooLargeError: 原图像素数超过上限
+        ValueError: 原图不是能识别的图片或已损坏
+    """
+    from PIL import Image, ImageOps, UnidentifiedImageError
+    _load_avif_plugin()
+
+    fmt = VariantFormat(fmt)
+    pil_format, _ = _PIL_FORMATS[fmt]
+    # 异常需要传回服务进程，都转换为可以序列化的ValueError及其子类
+    try:
+        with warnings.catch_warnings():
+            # 超过MAX_IMAGE_PIXELS默认只是警告，解码会占用大量内存，同样拒绝
+            warnings.simplefilter("error", Image.DecompressionBombWarning)
+            source = Image.open(source_path)
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning) as e:
+        raise ImageTooLargeError(f"图片尺寸过大: {os.path.basename(source_path)}") from e
+    except (UnidentifiedImageError, OSError) as e:
+        raise ValueError(f"无法识别的图片: {os.path.basename(source_path)}") from e
+    with source as image:
+        try:
+            image.load()
+        except OSError as e:
+            raise ValueError(f"图片已损坏: {os.path.basename(source_path)}") from e
+        image = ImageOps.exif_transpose(image)
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            # reducing_gap先用整数倍缩小再精确缩放，大图缩略时快很多
+            image = image.resize((width, height), Image.LANCZOS, reducing_gap=3.0)
+
+        has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+        if fmt == VariantFormat.JPEG:
+            if has_alpha:
+                # JPEG不支持透明，铺白色背景
+                background = Image.new("RGB", image.size, (255, 255, 255))
+                background.paste(image.convert("RGBA"), mask=image.convert("RGBA").getchannel("A"))
+                image = background
+            else:
+                image = image.convert("RGB")
+        elif image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if has_alpha else "RGB")
+
+        options: Dict[str, Any] = {}
+        if fmt == VariantFormat.PNG:
+            options["optimize"] = True
+        else:
+            options["quality"] = quality
+            if fmt == VariantFormat.JPEG:
+                options.update(optimize=True, progressive=True)
+            elif fmt == VariantFormat.WEBP:
+                options["method"] = 4
+
+        # 先写临时文件再改名，并发读取不会读到写了一半的文件；保存失败时删除临时文件
+        temp_path = f"{target_path}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            image.save(temp_path, pil_format, **options)
+            os.replace(temp_path, target_path)
+        finally:
+            try:
+                os.remove(temp_path)
+            except FileNotFoundError:
+                pass
+        return image.width, image.height, os.path.getsize(target_path)
+
+class ImageVariantCache:
+    """
+    派生图片（缩略图、WebP/AVIF版本、响应式尺寸）
+    按需生成并缓存在磁盘上，缓存键包括原图路径、大小、修改时间和输出参数，原图改变后自动重新生成。
+    编码在进程池中进行，不占用事件循环和GIL；同一派生图片的并发请求只生成一次。
+    缓存总大小超出上限时删除最久未使用的文件
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 500 * 1024 * 1024, workers: int = 2):
+        """
+        初始化缓存
+
+        Args:
+            cache_dir: 缓存目录，默认放在不对外提供的data目录中，只能通过 /api/images 访问
+            max_bytes: 缓存的最大总字节数，0表示不限制
+            workers: 编码进程数
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self.hits = 0
+        self.renders = 0
+        self.evicted_count = 0
+        self.pool_restarts = 0
+        self._bytes: Optional[int] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        self._evict_lock = threading.Lock()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._formats: Optional[List[VariantFormat]] = None
+
+    @classmethod
+    def from_env(cls) -> "ImageVariantCache":
+        """根据环境变量创建缓存"""
+        return cls(
+            cache_dir=os.getenv("IMAGE_VARIANT_CACHE_PATH", os.path.join("data", "image_variants")),
+            max_bytes=int(os.getenv("IMAGE_VARIANT_CACHE_MAX_BYTES", str(500 * 1024 * 1024))),
+            workers=int(os.getenv("IMAGE_VARIANT_WORKERS", str(min(4, os.cpu_count() or 1))))
+        )
+
+    @property
+    def formats(self) -> List[VariantFormat]:
+        """支持的输出格式"""
+        if self._formats is None:
+            self._formats = supported_formats()
+        return self._formats
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """第一次使用时才创建进程池，不影响服务启动"""
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    # 服务进程中已有多个线程，使用spawn避免fork后子进程继承被占用的锁
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def _discard_pool(self, pool: ProcessPoolExecutor) -> None:
+        """丢弃已损坏的进程池，下一次请求时重新创建"""
+        with self._pool_lock:
+            if self._pool is pool:
+                self._pool = None
+                self.pool_restarts += 1
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self) -> None:
+        """关闭进程池"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def choose_format(self, fmt: VariantFormat, accept: Optional[str]) -> VariantFormat:
+        """
+        确定输出格式
+
+        Args:
+            fmt: 请求的格式，auto时按Accept请求头选择
+            accept: Accept请求头
+
+        Returns:
+            输出格式
+
+        Raises:
+            ValueError: 请求的格式在当前环境中不支持
+        """
+        if fmt != VariantFormat.AUTO:
+            if fmt not in self.formats:
+                raise ValueError(f"不支持的输出格式: {fmt.value}，可用: {', '.join(f.value for f in self.formats)}")
+            return fmt
+        accept = accept or ""
+        for candidate in (VariantFormat.AVIF, VariantFormat.WEBP):
+            if f"image/{candidate.value}" in accept and candidate in self.formats:
+                return candidate
+        return VariantFormat.JPEG
+
+    def variant_path(self, source_path: str, source_stat: os.stat_result, width: int,
+                     fmt: VariantFormat, quality: int) -> str:
+        """返回派生图片的缓存路径"""
+        key = f"{os.path.abspath(source_path)}|{source_stat.st_size}|{source_stat.st_mtime_ns}|{width}|{fmt.value}|{quality}"
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], digest + _PIL_FORMATS[fmt][1])
+
+    async def get(self, source_path: str, width: int, fmt: VariantFormat, quality: int = DEFAULT_QUALITY) -> str:
+        """
+        获取派生图片，不存在时在进程池中生成
+
+        Args:
+            source_path: 原图路径
+            width: 宽度（会被取到允许的档位）
+            fmt: 输出格式（不能是auto）
+            quality: 有损格式的质量
+
+        Returns:
+            派生图片的路径
+
+        Raises:
+            ImageTooLargeError: 原图像素数超过上限
+            ValueError: 原图不是能识别的图片或已损坏
+            VariantWorkerError: 编码进程异常退出
+        """
+        source_stat = os.stat(source_path)
+        target = self.variant_path(source_path, source_stat, snap_width(width), fmt, quality)
+        try:
+            target_stat = os.stat(target)
+        except FileNotFoundError:
+            target_stat = None
+        if target_stat is not None:
+            self.hits += 1
+            # 只更新访问时间，淘汰时保留常用的缩略图；修改时间不变，ETag保持不变
+            os.utime(target, ns=(time.time_ns(), target_stat.st_mtime_ns))
+            return target
+
+        future = self._inflight.get(target)
+        if future is None:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            loop = asyncio.get_running_loop()
+            future = asyncio.ensure_future(self._render(loop, source_path, target, snap_width(width), fmt, quality))
+            self._inflight[target] = future
+            future.add_done_callback(lambda _: self._inflight.pop(target, None))
+        await asyncio.shield(future)
+        return target
+
+    async def _render(self, loop: asyncio.AbstractEventLoop, source_path: str, target: str,
+                      width: int, fmt: VariantFormat, quality: int) -> None:
+        pool = self._get_pool()
+        try:
+            out_width, out_height, size = await loop.run_in_executor(
+                pool, render_variant, source_path, target, width, fmt.value, quality
+            )
+        except BrokenProcessPool as e:
+            # 编码进程异常退出后整个进程池不再可用
+            logger.error(f"派生图片编码进程异常退出: {source_path}")
+            self._discard_pool(pool)
+            raise VariantWorkerError("图片编码进程异常退出，请稍后重试") from e
+        self.renders += 1
+        logger.info(f"已生成派生图片: {source_path} -> {out_width}x{out_height} {fmt.value} ({size} 字节)")
+        await loop.run_in_executor(None, self._track, size, target)
+
+    def _track(self, size: int, keep: str) -> None:
+        """累计缓存大小，超出上限时淘汰（不删除刚生成、即将返回的文件）"""
+        if not self.max_bytes:
+            return
+        with self._evict_lock:
+            if self._bytes is None:
+                self._bytes = sum(size for _, size, _ in self._entries())
+            else:
+                self._bytes += size
+            if self._bytes > self.max_bytes:
+                self._evict(keep)
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        """列出缓存文件 (访问时间, 大小, 路径)"""
+        entries = []
+        for directory, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(directory, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((max(st.st_atime, st.st_mtime), st.st_size, path))
+        return entries
+
+    def _evict(self, keep: str) -> None:
+        """删除最久未使用的文件，直到总大小降到上限的90%"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        limit = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if total <= limit:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.evicted_count += 1
+        self._bytes = total
+
+    def stats(self) -> Dict[str, Any]:
+        """返回缓存命中和生成统计"""
+        return {
+            "hits": self.hits,
+            "renders": self.renders,
+            "evicted_count": self.evicted_count,
+            "pool_restarts": self.pool_restarts,
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "workers": self.workers,
+            "pool_started": self._pool is not None
+        }
+
+# 单例实例
+_image_variant_cache = None
+
+def get_image_variant_cache() -> ImageVariantCache:
+    """
+    获取派生图片缓存实例（单例模式）
+
+    Returns:
+        ImageVariantCache实例
+    """
+    global _image_variant_cache
+    if _image_variant_cache is None:
+        _image_variant_cache = ImageVariantCache.from_env()
+    return _image_variant_cache
@@ -0,0 +1,387 @@
+import os
+import math
+import time
+import asyncio
+import queue
+import inspect
+import logging
+import threading
+from enum import Enum
+from contextlib import asynccontextmanager, contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, List, Callable, Any, Set, Sequence, Iterator, Tuple, AsyncIterator
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+class JobKind(str, Enum):
+    """作业类型枚举，不同类型使用独立的并发上限和排队队列"""
+    LLM = "llm"        # 大语言模型调用（封面、卡片、改写）
+    IMAGE = "image"    # 图像生成
+    VIDEO = "video"    # 视频生成
+
+# 各类型默认的并发上限、最大排队数和预估耗时(秒)
+DEFAULT_CONCURRENCY = {JobKind.LLM: 8, JobKind.IMAGE: 4, JobKind.VIDEO: 4}
+DEFAULT_MAX_QUEUE = {JobKind.LLM: 100, JobKind.IMAGE: 50, JobKind.VIDEO: 50}
+DEFAULT_DURATION = {JobKind.LLM: 30.0, JobKind.IMAGE: 30.0, JobKind.VIDEO: 120.0}
+
+class QueueFullError(Exception):
+    """作业队列已满"""
+
+    def __init__(self, kind: JobKind, retry_after: int):
+        self.kind = kind
+        self.retry_after = retry_after
+        super().__init__(f"{kind.value}作业队列已满，请{retry_after}秒后重试")
+
+def map_sequentially(fn: Callable[[Any], Any], items: Sequence[Any],
+                     max_parallel: Optional[int] = None) -> Iterator[Tuple[Any, Any, Optional[Exception]]]:
+    """
+    依次对每一项调用fn，返回值与JobExecutor.map相同，用于不在作业执行器中运行时（例如命令行）
+
+    Args:
+        fn: 处理一项的函数
+        items: 待处理的项
+        max_parallel: 忽略
+
+    Returns:
+        (项, 结果, 异常) 的迭代器，处理失败时结果为None
+    """
+    for item in items:
+        try:
+            yield item, fn(item), None
+        except Exception as e:
+            yield item, None, e
+
+class JobExecutor:
+    """
+    按作业类型隔离的执行器
+    每种类型有独立的并发上限和排队上限，同步函数在该类型专属的线程池中运行，
+    协程函数直接在事件循环上运行，排队超过上限时拒绝新作业。
+    作业内部的并发调用（map、slot）只借用该类型的空闲名额，同样计入并发上限；
+    执行器之外的线程（例如批量任务的行处理线程）通过hold排队占用名额
+    """
+
+    def __init__(self,
+                 concurrency: Optional[Dict[JobKind, int]] = None,
+                 max_queue: Optional[Dict[JobKind, int]] = None,
+                 on_queue_change: Optional[Callable[[Dict[str, Optional[int]]], None]] = None):
+        """
+        初始化作业执行器
+
+        Args:
+            concurrency: 各类型的并发上限
+            max_queue: 各类型的最大排队数
+            on_queue_change: 排队位置变化时的回调，参数为{任务ID: 排队位置}，位置为None表示已开始执行
+        """
+        self.concurrency = {**DEFAULT_CONCURRENCY, **(concurrency or {})}
+        self.max_queue = {**DEFAULT_MAX_QUEUE, **(max_queue or {})}
+        self.on_queue_change = on_queue_change
+
+        self._pools = {
+            kind: ThreadPoolExecutor(max_workers=self.concurrency[kind], thread_name_prefix=f"job-{kind.value}")
+            for kind in JobKind
+        }
+        self._semaphores: Dict[JobKind, asyncio.Semaphore] = {}
+        self._pending: Dict[JobKind, List[str]] = {kind: [] for kind in JobKind}
+        self._running: Dict[JobKind, int] = {kind: 0 for kind in JobKind}
+        # 作业内部并发调用借用的名额数和执行器之外的线程占用的名额数（已计入_running）
+        self._borrowed: Dict[JobKind, int] = {kind: 0 for kind in JobKind}
+        # 各类型作业耗时的指数移动平均，用于估算Retry-After
+        self._avg_duration: Dict[JobKind, float] = dict(DEFAULT_DURATION)
+        # 已上报过排队位置的任务
+        self._reported: Set[str] = set()
+        # 保存作业协程的引用，防止被垃圾回收
+        self._jobs: Set[asyncio.Task] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @classmethod
+    def from_env(cls, on_queue_change: Optional[Callable[[Dict[str, Optional[int]]], None]] = None) -> "JobExecutor":
+        """
+        根据环境变量创建执行器，例如 JOB_CONCURRENCY_VIDEO=2、JOB_MAX_QUEUE_VIDEO=20
+
+        Args:
+            on_queue_change: 排队位置变化时的回调
+
+        Returns:
+            JobExecutor实例
+        """
+        concurrency = {}
+        max_queue = {}
+        for kind in JobKind:
+            name = kind.value.upper()
+            if os.getenv(f"JOB_CONCURRENCY_{name}"):
+                concurrency[kind] = int(os.getenv(f"JOB_CONCURRENCY_{name}"))
+            if os.getenv(f"JOB_MAX_QUEUE_{name}"):
+                max_queue[kind] = int(os.getenv(f"JOB_MAX_QUEUE_{name}"))
+        return cls(concurrency=concurrency, max_queue=max_queue, on_queue_change=on_queue_change)
+
+    def _get_semaphore(self, kind: JobKind) -> asyncio.Semaphore:
+        """获取该类型的信号量，在事件循环中首次使用时创建"""
+        if kind not in self._semaphores:
+            self._semaphores[kind] = asyncio.Semaphore(self.concurrency[kind])
+        return self._semaphores[kind]
+
+    def bind_loop(self) -> None:
+        """记录事件循环，在事件循环中调用（例如服务启动时），此后执行器之外的线程也可以通过hold占用名额"""
+        self._loop = asyncio.get_running_loop()
+
+    def _notify(self, positions: Dict[str, Optional[int]]) -> None:
+        """通知排队位置变化"""
+        for task_id, position in positions.items():
+            if position:
+                self._reported.add(task_id)
+            else:
+                self._reported.discard(task_id)
+        if not self.on_queue_change or not positions:
+            return
+        try:
+            self.on_queue_change(positions)
+        except Exception as e:
+            logger.error(f"更新排队位置失败: {str(e)}")
+
+    def _position(self, kind: JobKind, index: int) -> int:
+        """根据在等待列表中的下标计算排队位置，0表示有空闲并发名额、即将执行"""
+        free_slots = self.concurrency[kind] - self._running[kind]
+        return max(0, index + 1 - free_slots)
+
+    def _queued(self, kind: JobKind) -> int:
+        """正在排队（没有空闲并发名额）的作业数量"""
+        free_slots = self.concurrency[kind] - self._running[kind]
+        return max(0, len(self._pending[kind]) - free_slots)
+
+    def retry_after(self, kind: JobKind) -> int:
+        """估算该类型队列空出位置所需的时间(秒)"""
+        waves = math.ceil(max(1, self._queued(kind)) / self.concurrency[kind])
+        return max(1, int(waves * self._avg_duration[kind]))
+
+    def queue_position(self, task_id: str) -> Optional[int]:
+        """
+        查询任务在当前进程中的排队位置
+
+        Args:
+            task_id: 任务ID
+
+        Returns:
+            从1开始的排队位置，未在排队时返回None
+        """
+        for kind, pending in self._pending.items():
+            if task_id in pending:
+                return self._position(kind, pending.index(task_id)) or None
+        return None
+
+    def submit(self, kind: JobKind, task_id: str, fn: Callable[[], Any]) -> int:
+        """
+        提交作业，必须在事件循环中调用
+
+        Args:
+            kind: 作业类型
+            task_id: 关联的任务ID
+            fn: 作业函数，可以是普通函数或协程函数
+
+        Returns:
+            提交时的排队位置，0表示立即执行
+
+        Raises:
+            QueueFullError: 排队数已达上限
+        """
+        self._loop = asyncio.get_running_loop()
+        semaphore = self._get_semaphore(kind)
+        pending = self._pending[kind]
+        position = self._position(kind, len(pending))
+        if position > self.max_queue[kind]:
+            raise QueueFullError(kind, self.retry_after(kind))
+
+        pending.append(task_id)
+        if position:
+            self._reported.add(task_id)
+
+        job = self._loop.create_task(self._run(kind, task_id, fn, semaphore))
+        self._jobs.add(job)
+        job.add_done_callback(self._jobs.discard)
+        return position
+
+    async def _run(self, kind: JobKind, task_id: str, fn: Callable[[], Any], semaphore: asyncio.Semaphore) -> None:
+        """在并发上限内执行作业"""
+        async with semaphore:
+            pending = self._pending[kind]
+            pending.remove(task_id)
+            self._running[kind] += 1
+            # 开始执行的任务清除排队位置，其余排队任务前移
+            positions = {task_id: None} if task_id in self._reported else {}
+            for index, pending_id in enumerate(pending):
+                position = self._position(kind, index)
+                if position:
+                    positions[pending_id] = position
+            self._notify(positions)
+
+            start_time = time.monotonic()
+            try:
+                if inspect.iscoroutinefunction(fn):
+                    await fn()
+                else:
+                    await asyncio.get_running_loop().run_in_executor(self._pools[kind], fn)
+            except Exception as e:
+                logger.error(f"{kind.value}作业 {task_id} 执行异常: {str(e)}")
+            finally:
+                self._running[kind] -= 1
+                duration = time.monotonic() - start_time
+                self._avg_duration[kind] = 0.8 * self._avg_duration[kind] + 0.2 * duration
+
+    async def _borrow(self, kind: JobKind) -> bool:
+        """有空闲名额且没有排队的作业时借用一个名额，不等待"""
+        semaphore = self._get_semaphore(kind)
+        if semaphore.locked():
+            return False
+        # 信号量未被占满时acquire立即返回，不会让出事件循环
+        await semaphore.acquire()
+        self._running[kind] += 1
+        self._borrowed[kind] += 1
+        return True
+
+    def _give_back(self, kind: JobKind) -> None:
+        """归还借用的名额，在事件循环中调用"""
+        self._borrowed[kind] -= 1
+        self._running[kind] -= 1
+        self._get_semaphore(kind).release()
+
+    def _borrow_threadsafe(self, kind: JobKind) -> bool:
+        """在作业线程中借用名额，没有事件循环或在事件循环线程中调用时不借用"""
+        if self._loop is None or self._loop.is_closed():
+            return False
+        try:
+            asyncio.get_running_loop()
+            return False
+        except RuntimeError:
+            pass
+        return asyncio.run_coroutine_threadsafe(self._borrow(kind), self._loop).result()
+
+    async def _acquire(self, kind: JobKind) -> None:
+        """等待并占用一个名额，与排队的作业按先后顺序竞争"""
+        await self._get_semaphore(kind).acquire()
+        self._running[kind] += 1
+        self._borrowed[kind] += 1
+
+    @contextmanager
+    def hold(self, kind: JobKind) -> Iterator[None]:
+        """
+        在执行器之外的线程中等待并占用该类型的一个名额，退出时归还，不能在事件循环线程中调用
+
+        Args:
+            kind: 作业类型
+
+        Raises:
+            RuntimeError: 执行器还没有绑定事件循环或事件循环已关闭
+        """
+        if self._loop is None or self._loop.is_closed():
+            raise RuntimeError("作业执行器尚未绑定事件循环")
+        asyncio.run_coroutine_threadsafe(self._acquire(kind), self._loop).result()
+        try:
+            yield
+        finally:
+            self._loop.call_soon_threadsafe(self._give_back, kind)
+
+    def map(self, kind: JobKind, fn: Callable[[Any], Any], items: Sequence[Any],
+            max_parallel: Optional[int] = None) -> Iterator[Tuple[Any, Any, Optional[Exception]]]:
+        """
+        在作业线程中并发地对每一项调用fn，按完成先后返回结果
+        调用方所在的线程已占用该类型的一个名额，由它自己依次处理各项；该类型有空闲名额时再借用名额，
+        在该类型的线程池中同时处理其余各项。没有空闲名额时退化为依次处理，不会因互相等待名额而死锁
+
+        Args:
+            kind: 作业类型
+            fn: 处理一项的函数
+            items: 待处理的项
+            max_parallel: 同时处理的数量上限（包括调用方线程），默认不限
+
+        Returns:
+            (项, 结果, 异常) 的迭代器，处理失败时结果为None
+        """
+        remaining = list(items)
+        total = len(remaining)
+        limit = min(max_parallel or total, total)
+        lock = threading.Lock()
+        results: "queue.Queue[Tuple[Any, Any, Optional[Exception]]]" = queue.Queue()
+
+        def take() -> Tuple[bool, Any]:
+            with lock:
+                if not remaining:
+                    return False, None
+                return True, remaining.pop(0)
+
+        def process(item: Any) -> None:
+            try:
+                results.put((item, fn(item), None))
+            except Exception as e:
+                results.put((item, None, e))
+
+        def helper() -> None:
+            try:
+                while True:
+                    found, item = take()
+                    if not found:
+                        return
+                    process(item)
+            finally:
+                self._loop.call_soon_threadsafe(self._give_back, kind)
+
+        helpers = 0
+        done = 0
+        while done < total:
+            # 每处理完一项重新尝试借用，其他作业释放的名额也能被利用
+            while helpers < limit - 1 and remaining and self._borrow_threadsafe(kind):
+                helpers += 1
+                self._pools[kind].submit(helper)
+            found, item = take()
+            if found:
+                process(item)
+            # 其余各项都已被取走时等待借用的线程完成
+            block = not found
+            while done < total:
+                try:
+                    result = results.get(block=block)
+                except queue.Empty:
+                    break
+                block = False
+                done += 1
+                yield result
+
+    @asynccontextmanager
+    async def slot(self, kind: JobKind, own: asyncio.Semaphore) -> AsyncIterator[None]:
+        """
+        在协程作业内部为一次调用取得名额
+        优先使用作业自身已占用的名额（own，容量为1），它正被作业内的其他调用使用时借用该类型的空闲名额，
+        都没有时等待作业自身的名额
+
+        Args:
+            kind: 作业类型
+            own: 代表作业自身名额的信号量，同一作业内的调用共用
+        """
+        borrowed = False
+        if own.locked():
+            borrowed = await self._borrow(kind)
+        if not borrowed:
+            await own.acquire()
+        try:
+            yield
+        finally:
+            if borrowed:
+                self._give_back(kind)
+            else:
+                own.release()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """返回各类型的运行和排队情况"""
+        return {
+            kind.value: {
+                "running": self._running[kind],
+                "borrowed": self._borrowed[kind],
+                "queued": self._queued(kind),
+                "concurrency": self.concurrency[kind],
+                "max_queue": self.max_queue[kind]
+            }
+            for kind in JobKind
+        }
@@ -1,14 +1,23 @@
 import os
 import json
+import asyncio
 import base64
 import requests
 from typing import Optional, Dict, List, Union
 from enum import Enum
 from dotenv import load_dotenv
 from io import BytesIO
+import httpx
 from PIL import Image
 import logging
 
+try:
+    from .http_client import get_http_session, get_async_http_client
+    from .blob_store import get_blob_store
+except ImportError:
+    from http_client import get_http_session, get_async_http_client
+    from blob_store import get_blob_store
+
 load_dotenv()
 
 # 配置日志
@@ -41,6 +50,7 @@ class ImageGenerator:
     def __init__(self):
         """初始化图像生成器"""
         self.api_key = os.getenv("KLING_API_KEY") 
+        self.session = get_http_session()
         self.base_url = "https://api.klingai.com/v1/images"
         
         if not self.api_key:
@@ -50,45 +60,22 @@ class ImageGenerator:
         self.output_dir = "generated_images"
         os.makedirs(self.output_dir, exist_ok=True)
     
-    def generate_image(self, 
-                      prompt: str, 
-                      negative_prompt: Optional[str] = None,
-                      ratio: Union[str, ImageRatio] = ImageRatio.SQUARE,
-                      style: Union[str, ImageStyle] = ImageStyle.NONE,
-                      steps: int = 25,
-                      seed: Optional[int] = None,
-                      model: str = "kling-xi",
-                      guidance_scale: float = 7.0,
-                      lora_id: Optional[str] = None,
-                      lora_strength: Optional[float] = None,
-                      controlnet_id: Optional[str] = None,
-                      controlnet_image: Optional[str] = None,
-                      controlnet_strength: Optional[float] = None,
-                      return_format: str = "url",
-                      save_to_file: bool = True) -> Dict:
-        """
-        生成图像
-        
-        Args:
-            prompt: 图像生成的提示词
-            negative_prompt: 负面提示词，指定不想出现的内容
-            ratio: 图像比例，可以是ImageRatio枚举值或字符串
-            style: 图像风格，可以是ImageStyle枚举值或字符串
-            steps: 生成步数，影响质量和生成时间
-            seed: 随机种子，相同种子可复现结果
-            model: 使用的模型名称
-            guidance_scale: 引导比例，控制对提示词的遵循程度
-            lora_id: LoRA模型ID
-            lora_strength: LoRA模型强度
-            controlnet_id: ControlNet模型ID
-            controlnet_image: ControlNet参考图像
-            controlnet_strength: ControlNet强度
-            return_format: 返回格式，可选"url"或"b64_json"
-            save_to_file: 是否保存图像到文件
-            
-        Returns:
-            包含生成图像信息的字典
-        """
+    def _build_generation_payload(self, 
+                                 prompt: str, 
+                                 negative_prompt: Optional[str] = None,
+                                 ratio: Union[str, ImageRatio] = ImageRatio.SQUARE,
+                                 style: Union[str, ImageStyle] = ImageStyle.NONE,
+                                 steps: int = 25,
+                                 seed: Optional[int] = None,
+                                 model: str = "kling-xi",
+                                 guidance_scale: float = 7.0,
+                                 lora_id: Optional[str] = None,
+                                 lora_strength: Optional[float] = None,
+                                 controlnet_id: Optional[str] = None,
+                                 controlnet_image: Optional[str] = None,
+                                 controlnet_strength: Optional[float] = None,
+                                 return_format: str = "url") -> Dict:
+        """构建图像生成请求参数，参数与generate_image相同"""
         # 转换枚举为字符串
         if isinstance(ratio, ImageRatio):
             ratio = ratio.value
@@ -129,6 +116,52 @@ class ImageGenerator:
                 "strength": controlnet_strength or 0.7
             }
         
+        return payload
+    
+    def generate_image(self, 
+                      prompt: str, 
+                      negative_prompt: Optional[str] = None,
+                      ratio: Union[str, ImageRatio] = ImageRatio.SQUARE,
+                      style: Union[str, ImageStyle] = ImageStyle.NONE,
+                      steps: int = 25,
+                      seed: Optional[int] = None,
+                      model: str = "kling-xi",
+                      guidance_scale: float = 7.0,
+                      lora_id: Optional[str] = None,
+                      lora_strength: Optional[float] = None,
+                      controlnet_id: Optional[str] = None,
+                      controlnet_image: Optional[str] = None,
+                      controlnet_strength: Optional[float] = None,
+                      return_format: str = "url",
+                      save_to_file: bool = True) -> Dict:
+        """
+        生成图像
+        
+        Args:
+            prompt: 图像生成的提示词
+            negative_prompt: 负面提示词，指定不想出现的内容
+            ratio: 图像比例，可以是ImageRatio枚举值或字符串
+            style: 图像风格，可以是ImageStyle枚举值或字符串
+            steps: 生成步数，影响质量和生成时间
+            seed: 随机种子，相同种子可复现结果
+            model: 使用的模型名称
+            guidance_scale: 引导比例，控制对提示词的遵循程度
+            lora_id: LoRA模型ID
+            lora_strength: LoRA模型强度
+            controlnet_id: ControlNet模型ID
+            controlnet_image: ControlNet参考图像
+            controlnet_strength: ControlNet强度
+            return_format: 返回格式，可选"url"或"b64_json"
+            save_to_file: 是否保存图像到文件
+            
+        Returns:
+            包含生成图像信息的字典
+        """
+        payload = self._build_generation_payload(
+            prompt, negative_prompt, ratio, style, steps, seed, model, guidance_scale,
+            lora_id, lora_strength, controlnet_id, controlnet_image, controlnet_strength, return_format
+        )
+        
         # API请求头
         headers = {
             "Content-Type": "application/json",
@@ -138,7 +171,7 @@ class ImageGenerator:
         try:
             # 发送请求
             logger.info(f"发送图像生成请求: {prompt[:50]}...")
-            response = requests.post(self.base_url, headers=headers, json=payload)
+            response = self.session.post(self.base_url, headers=headers, json=payload)
             response.raise_for_status()
             result = response.json()
             
@@ -160,16 +193,15 @@ class ImageGenerator:
     def _save_image_from_url(self, url: str, prompt: str) -> str:
         """从URL下载并保存图像"""
         try:
-            response = requests.get(url)
+            response = self.session.get(url)
             response.raise_for_status()
             
             # 生成文件名
             filename = self._generate_filename(prompt)
             filepath = os.path.join(self.output_dir, filename)
             
-            # 保存图像
-            with open(filepath, 'wb') as f:
-                f.write(response.content)
+            # 保存图像，内容相同的图像只保存一份
+            get_blob_store().put_bytes(response.content, filepath)
                 
             logger.info(f"图像已保存: {filepath}")
             return filepath
@@ -188,9 +220,8 @@ class ImageGenerator:
             filename = self._generate_filename(prompt)
             filepath = os.path.join(self.output_dir, filename)
             
-            # 保存图像
-            with open(filepath, 'wb') as f:
-                f.write(image_data)
+            # 保存图像，内容相同的图像只保存一份
+            get_blob_store().put_bytes(image_data, filepath)
                 
             logger.info(f"图像已保存: {filepath}")
             return filepath
@@ -239,7 +270,7 @@ class ImageGenerator:
         try:
             # 发送请求
             logger.info(f"发送图像放大请求，倍数: {scale}")
-            response = requests.post(f"{self.base_url}/upscale", headers=headers, json=payload)
+            response = self.session.post(f"{self.base_url}/upscale", headers=headers, json=payload)
             response.raise_for_status()
             result = response.json()
             
@@ -256,6 +287,74 @@ class ImageGenerator:
                 logger.error(f"响应内容: {e.response.text}")
             return {"error": str(e)}
 
+    # 异步接口：与同步接口行为相同，共用一个异步连接池，可直接在事件循环中调用
+
+    async def agenerate_image(self, prompt: str, save_to_file: bool = True, **kwargs) -> Dict:
+        """
+        异步生成图像
+        
+        Args:
+            prompt: 图像生成的提示词
+            save_to_file: 是否保存图像到文件
+            **kwargs: 其他参数与generate_image相同
+            
+        Returns:
+            包含生成图像信息的字典，保存成功时包含local_path
+        """
+        payload = self._build_generation_payload(prompt, **kwargs)
+        
+        # API请求头
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}"
+        }
+        
+        try:
+            logger.info(f"发送图像生成请求: {prompt[:50]}...")
+            response = await get_async_http_client().post(self.base_url, headers=headers, json=payload)
+            response.raise_for_status()
+            result = response.json()
+            
+            # 保存图像到文件
+            local_path = ""
+            if save_to_file and "url" in result:
+                local_path = await self._asave_image_from_url(result["url"], prompt)
+            elif save_to_file and "b64_json" in result:
+                local_path = self._save_image_from_b64(result["b64_json"], prompt)
+            if local_path:
+                result["local_path"] = local_path
+                
+            return result
+        
+        except httpx.HTTPError as e:
+            logger.error(f"API请求失败: {str(e)}")
+            if isinstance(e, httpx.HTTPStatusError):
+                logger.error(f"响应状态码: {e.response.status_code}")
+                logger.error(f"响应内容: {e.response.text}")
+            return {"error": str(e)}
+    
+    async def _asave_image_from_url(self, url: str, prompt: str) -> str:
+        """异步从URL下载并保存图像"""
+        try:
+            response = await get_async_http_client().get(url)
+            response.raise_for_status()
+            
+            # 生成文件名
+            filename = self._generate_filename(prompt)
+            filepath = os.path.join(self.output_dir, filename)
+            
+            # 保存图像，内容相同的图像只保存一份；写入和哈希计算在线程池中进行，不阻塞事件循环
+            await asyncio.get_running_loop().run_in_executor(
+                None, get_blob_store().put_bytes, response.content, filepath
+            )
+                
+            logger.info(f"图像已保存: {filepath}")
+            return filepath
+        
+        except Exception as e:
+            logger.error(f"保存图像失败: {str(e)}")
+            return ""
+
 def main():
     """示例使用方法"""
     generator = ImageGenerator()
@@ -2,13 +2,27 @@ from typing import Optional, Dict, List, Union
 import os
 import requests
 import time
+import asyncio
+import httpx
+import logging
 from datetime import datetime
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 from enum import Enum
 
+try:
+    from .http_client import get_http_session, get_async_http_client
+    from .blob_store import get_blob_store
+except ImportError:
+    from http_client import get_http_session, get_async_http_client
+    from blob_store import get_blob_store
+
 load_dotenv()
 
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
 class VideoGenerationStatus(str, Enum):
     PENDING = "pending"
     PROCESSING = "processing"
@@ -30,7 +44,8 @@ class VideoGenerationResult(BaseModel):
 class VideoGenerator:
     def __init__(self):
         self.api_key = os.getenv("KLING_API_KEY")
-        self.base_url = "https://api.klingai.com"
+        self.session = get_http_session()
+        self.base_url = os.getenv("KLING_BASE_URL", "https://api.klingai.com")
         self.text_to_video_endpoint = "/v1/text-to-video"
         self.image_to_video_endpoint = "/v1/image-to-video"
         self.task_status_endpoint = "/v1/tasks/{task_id}"
@@ -62,6 +77,64 @@ class VideoGenerator:
             "Content-Type": "application/json"
         }
     
+    def _to_generation_request(self, result: Dict) -> VideoGenerationRequest:
+        """把提交接口的响应转换为视频生成请求信息"""
+        return VideoGenerationRequest(
+            task_id=result["task_id"],
+            status=VideoGenerationStatus.PENDING,
+            created_at=result.get("created_at", datetime.now().isoformat())
+        )
+    
+    def _to_generation_result(self, result: Dict) -> VideoGenerationResult:
+        """把任务状态接口的响应转换为视频生成结果"""
+        return VideoGenerationResult(
+            task_id=result["task_id"],
+            status=result["status"],
+            video_url=result.get("video_url"),
+            created_at=result.get("created_at", ""),
+            completed_at=result.get("completed_at")
+        )
+    
+    def _build_text_to_video_payload(self, 
+                                    prompt: str, 
+                                    negative_prompt: Optional[str] = None,
+                                    duration: int = 3,
+                                    width: int = 512,
+                                    height: int = 512,
+                                    fps: int = 24,
+                                    guidance_scale: float = 7.0,
+                                    num_inference_steps: int = 50,
+                                    seed: Optional[int] = None,
+                                    model: str = "kling-svd",
+                                    style: Optional[str] = None,
+                                    output_format: str = "mp4",
+                                    quality: str = "medium",
+                                    callback_url: Optional[str] = None) -> Dict:
+        """构建文本到视频请求参数，参数与generate_video_from_text相同"""
+        payload = {
+            "prompt": prompt,
+            "negative_prompt": negative_prompt,
+            "duration": duration,
+            "width": width,
+            "height": height,
+            "fps": fps,
+            "guidance_scale": guidance_scale,
+            "num_inference_steps": num_inference_steps,
+            "seed": seed,
+            "model": model,
+            "output_format": output_format,
+            "quality": quality,
+            "callback_url": callback_url
+        }
+        
+        if style:
+            payload["style"] = style
+            
+        # 移除None值
+        payload = {k: v for k, v in payload.items() if v is not None}
+        
+        return payload
+    
     def generate_video_from_text(self, 
                                 prompt: str, 
                                 negative_prompt: Optional[str] = None,
@@ -75,7 +148,8 @@ class VideoGenerator:
                                 model: str = "kling-svd",
                                 style: Optional[str] = None,
                                 output_format: str = "mp4",
-                                quality: str = "medium") -> VideoGenerationRequest:
+                                quality: str = "medium",
+                                callback_url: Optional[str] = None) -> VideoGenerationRequest:
         """
         根据文本提示词生成视频
         
@@ -93,44 +167,60 @@ class VideoGenerator:
             style: 视频风格
             output_format: 输出视频格式，默认为"mp4"
             quality: 视频质量，可选值为"low"、"medium"、"high"，默认为"medium"
+            callback_url: 任务结束时的回调通知URL（可选）
             
         Returns:
             视频生成请求信息，包含任务ID
         """
+        payload = self._build_text_to_video_payload(
+            prompt, negative_prompt, duration, width, height, fps, guidance_scale, num_inference_steps,
+            seed, model, style, output_format, quality, callback_url
+        )
+        
+        response = self.session.post(
+            f"{self.base_url}{self.text_to_video_endpoint}",
+            headers=self._get_headers(),
+            json=payload
+        )
+        response.raise_for_status()
+        
+        return self._to_generation_request(response.json())
+    
+    def _build_image_to_video_payload(self,
+                                     image_url: str,
+                                     prompt: Optional[str] = None,
+                                     negative_prompt: Optional[str] = None,
+                                     duration: int = 3,
+                                     fps: int = 24,
+                                     motion_bucket_id: int = 127,
+                                     guidance_scale: float = 7.0,
+                                     num_inference_steps: int = 50,
+                                     seed: Optional[int] = None,
+                                     model: str = "kling-i2v",
+                                     output_format: str = "mp4",
+                                     quality: str = "medium",
+                                     callback_url: Optional[str] = None) -> Dict:
+        """构建图像到视频请求参数，参数与generate_video_from_image相同"""
         payload = {
+            "image_url": image_url,
             "prompt": prompt,
             "negative_prompt": negative_prompt,
             "duration": duration,
-            "width": width,
-            "height": height,
             "fps": fps,
+            "motion_bucket_id": motion_bucket_id,
             "guidance_scale": guidance_scale,
             "num_inference_steps": num_inference_steps,
             "seed": seed,
             "model": model,
             "output_format": output_format,
-            "quality": quality
+            "quality": quality,
+            "callback_url": callback_url
         }
         
-        if style:
-            payload["style"] = style
-            
         # 移除None值
         payload = {k: v for k, v in payload.items() if v is not None}
         
-        response = requests.post(
-            f"{self.base_url}{self.text_to_video_endpoint}",
-            headers=self._get_headers(),
-            json=payload
-        )
-        response.raise_for_status()
-        
-        result = response.json()
-        return VideoGenerationRequest(
-            task_id=result["task_id"],
-            status=VideoGenerationStatus.PENDING,
-            created_at=result.get("created_at", datetime.now().isoformat())
-        )
+        return payload
     
     def generate_video_from_image(self,
                                  image_url: str,
@@ -144,7 +234,8 @@ class VideoGenerator:
                                  seed: Optional[int] = None,
                                  model: str = "kling-i2v",
                                  output_format: str = "mp4",
-                                 quality: str = "medium") -> VideoGenerationRequest:
+                                 quality: str = "medium",
+                                 callback_url: Optional[str] = None) -> VideoGenerationRequest:
         """
         根据图片生成视频
         
@@ -161,41 +252,24 @@ class VideoGenerator:
             model: 使用的模型，默认为"kling-i2v"
             output_format: 输出视频格式，默认为"mp4"
             quality: 视频质量，可选值为"low"、"medium"、"high"，默认为"medium"
+            callback_url: 任务结束时的回调通知URL（可选）
             
         Returns:
             视频生成请求信息，包含任务ID
         """
-        payload = {
-            "image_url": image_url,
-            "prompt": prompt,
-            "negative_prompt": negative_prompt,
-            "duration": duration,
-            "fps": fps,
-            "motion_bucket_id": motion_bucket_id,
-            "guidance_scale": guidance_scale,
-            "num_inference_steps": num_inference_steps,
-            "seed": seed,
-            "model": model,
-            "output_format": output_format,
-            "quality": quality
-        }
-        
-        # 移除None值
-        payload = {k: v for k, v in payload.items() if v is not None}
+        payload = self._build_image_to_video_payload(
+            image_url, prompt, negative_prompt, duration, fps, motion_bucket_id, guidance_scale,
+            num_inference_steps, seed, model, output_format, quality, callback_url
+        )
         
-        response = requests.post(
+        response = self.session.post(
             f"{self.base_url}{self.image_to_video_endpoint}",
             headers=self._get_headers(),
             json=payload
         )
         response.raise_for_status()
         
-        result = response.json()
-        return VideoGenerationRequest(
-            task_id=result["task_id"],
-            status=VideoGenerationStatus.PENDING,
-            created_at=result.get("created_at", datetime.now().isoformat())
-        )
+        return self._to_generation_request(response.json())
     
     def get_task_status(self, task_id: str) -> VideoGenerationResult:
         """
@@ -207,20 +281,13 @@ class VideoGenerator:
         Returns:
             任务状态信息
         """
-        response = requests.get(
+        response = self.session.get(
             f"{self.base_url}{self.task_status_endpoint.format(task_id=task_id)}",
             headers=self._get_headers()
         )
         response.raise_for_status()
         
-        result = response.json()
-        return VideoGenerationResult(
-            task_id=result["task_id"],
-            status=result["status"],
-            video_url=result.get("video_url"),
-            created_at=result.get("created_at", ""),
-            completed_at=result.get("completed_at")
-        )
+        return self._to_generation_result(response.json())
     
     def wait_for_result(self, task_id: str, polling_interval: int = 5, timeout: int = 300) -> VideoGenerationResult:
         """
@@ -245,6 +312,36 @@ class VideoGenerator:
             
             time.sleep(polling_interval)
     
+    def check_task(self, task_id: str) -> Optional[VideoGenerationResult]:
+        """
+        查询一次任务状态，不阻塞等待，供轮询调度器使用
+        查询请求本身失败时视为仍在进行中，由调度器的超时兜底
+        
+        Args:
+            task_id: 任务ID
+            
+        Returns:
+            任务完成时返回结果，仍在进行中时返回None
+            
+        Raises:
+            Exception: 任务失败
+        """
+        try:
+            result = self.get_task_status(task_id)
+        except requests.RequestException as e:
+            logger.error(f"查询任务 {task_id} 状态失败: {str(e)}")
+            return None
+        
+        return self._check_result(task_id, result)
+    
+    def _check_result(self, task_id: str, result: VideoGenerationResult) -> Optional[VideoGenerationResult]:
+        """根据任务状态判断任务是否结束，逻辑与check_task相同"""
+        if result.status == VideoGenerationStatus.COMPLETED:
+            return result
+        elif result.status == VideoGenerationStatus.FAILED:
+            raise Exception(f"Task {task_id} failed")
+        return None
+    
     def is_generation_completed(self, task_id: str) -> bool:
         """
         检查视频生成任务是否已完成
@@ -275,14 +372,139 @@ class VideoGenerator:
         # 创建保存目录
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
         
-        response = requests.get(video_url, stream=True)
+        response = self.session.get(video_url, stream=True)
         response.raise_for_status()
         
-        with open(output_path, 'wb') as f:
+        with get_blob_store().writer(output_path) as f:
             for chunk in response.iter_content(chunk_size=8192):
                 f.write(chunk)
         
         return output_path
+    
+    # 异步接口：与同步接口行为相同，共用一个异步连接池，可直接在事件循环中调用
+    
+    async def agenerate_video_from_text(self, prompt: str, **kwargs) -> VideoGenerationRequest:
+        """
+        异步根据文本提示词生成视频
+        
+        Args:
+            prompt: 视频生成的提示词
+            **kwargs: 其他参数与generate_video_from_text相同
+            
+        Returns:
+            视频生成请求信息，包含任务ID
+        """
+        payload = self._build_text_to_video_payload(prompt, **kwargs)
+        
+        response = await get_async_http_client().post(
+            f"{self.base_url}{self.text_to_video_endpoint}",
+            headers=self._get_headers(),
+            json=payload
+        )
+        response.raise_for_status()
+        
+        return self._to_generation_request(response.json())
+    
+    async def agenerate_video_from_image(self, image_url: str, **kwargs) -> VideoGenerationRequest:
+        """
+        异步根据图片生成视频
+        
+        Args:
+            image_url: 输入图片的URL
+            **kwargs: 其他参数与generate_video_from_image相同
+            
+        Returns:
+            视频生成请求信息，包含任务ID
+        """
+        payload = self._build_image_to_video_payload(image_url, **kwargs)
+        
+        response = await get_async_http_client().post(
+            f"{self.base_url}{self.image_to_video_endpoint}",
+            headers=self._get_headers(),
+            json=payload
+        )
+        response.raise_for_status()
+        
+        return self._to_generation_request(response.json())
+    
+    async def aget_task_status(self, task_id: str) -> VideoGenerationResult:
+        """
+        异步获取任务状态
+        
+        Args:
+            task_id: 任务ID
+            
+        Returns:
+            任务状态信息
+        """
+        response = await get_async_http_client().get(
+            f"{self.base_url}{self.task_status_endpoint.format(task_id=task_id)}",
+            headers=self._get_headers()
+        )
+        response.raise_for_status()
+        
+        return self._to_generation_result(response.json())
+    
+    async def acheck_task(self, task_id: str) -> Optional[VideoGenerationResult]:
+        """
+        异步查询一次任务状态，返回值与check_task相同
+        
+        Args:
+            task_id: 任务ID
+            
+        Returns:
+            任务完成时返回结果，仍在进行中时返回None
+        """
+        try:
+            result = await self.aget_task_status(task_id)
+        except httpx.HTTPError as e:
+            logger.error(f"查询任务 {task_id} 状态失败: {str(e)}")
+            return None
+        
+        return self._check_result(task_id, result)
+    
+    async def await_result(self, task_id: str, polling_interval: int = 5, timeout: int = 300) -> VideoGenerationResult:
+        """
+        异步等待任务完成并获取结果
+        
+        Args:
+            task_id: 任务ID
+            polling_interval: 轮询间隔(秒)
+            timeout: 超时时间(秒)
+            
+        Returns:
+            视频生成结果
+        """
+        start_time = time.time()
+        while True:
+            if time.time() - start_time > timeout:
+                raise TimeoutError(f"Task {task_id} timed out after {timeout} seconds")
+            
+            result = await self.aget_task_status(task_id)
+            if result.status in [VideoGenerationStatus.COMPLETED, VideoGenerationStatus.FAILED]:
+                return result
+            
+            await asyncio.sleep(polling_interval)
+    
+    async def adownload_video(self, video_url: str, output_path: str) -> str:
+        """
+        异步下载生成的视频
+        
+        Args:
+            video_url: 视频URL
+            output_path: 保存路径
+            
+        Returns:
+            视频保存的完整路径
+        """
+        # 创建保存目录
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        
+        async with get_async_http_client().stream("GET", video_url) as response:
+            response.raise_for_status()
+            await get_blob_store().awrite_stream(response.aiter_bytes(), output_path)
+        
+        return output_path
 
 def main():
     """示例使用方法"""
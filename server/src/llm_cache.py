@@ -0,0 +1,334 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+import unicodedata
+from typing import Optional, Dict, Any, Iterator
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def normalize_input(value: Any) -> Any:
+    """
+    规范化提示词输入，使只有换行符或首尾空白不同的相同内容得到相同的缓存键
+
+    Args:
+        value: 输入值
+
+    Returns:
+        规范化后的值
+    """
+    if isinstance(value, str):
+        value = unicodedata.normalize("NFC", value).replace("\r\n", "\n").replace("\r", "\n")
+        return "\n".join(line.rstrip() for line in value.split("\n")).strip()
+    if isinstance(value, dict):
+        return {k: normalize_input(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize_input(v) for v in value]
+    return value
+
+class LLMCache:
+    """
+    大语言模型响应的精确匹配缓存
+    缓存键由链名称、提示词模板、模型、温度和规范化后的输入计算得到，
+    结果保存在SQLite中，多个工作进程共享；按TTL过期，超出容量时淘汰最久未访问的条目
+    """
+
+    def __init__(self, db_path: str, max_entries: int = 5000, ttl: float = 7 * 24 * 3600, enabled: bool = True):
+        """
+        初始化缓存
+
+        Args:
+            db_path: 数据库文件路径
+            max_entries: 最大缓存条目数，0表示不限制
+            ttl: 缓存有效期(秒)，0表示永不过期
+            enabled: 是否启用缓存
+        """
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.enabled = enabled
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+        self.evicted_count = 0
+        self._stats_lock = threading.Lock()
+        # 提示词模板指纹，模板修改后旧的缓存自动失效
+        self._fingerprints: Dict[int, str] = {}
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        # sqlite3连接不能跨线程共享，每个线程使用自己的连接
+        self._local = threading.local()
+
+        conn = self._get_conn()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                cache_key TEXT PRIMARY KEY,
+                chain TEXT NOT NULL,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache (accessed_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_created ON llm_cache (created_at)")
+        conn.commit()
+
+    @classmethod
+    def from_env(cls) -> "LLMCache":
+        """根据环境变量创建缓存"""
+        return cls(
+            db_path=os.getenv("LLM_CACHE_PATH", os.path.join("data", "llm_cache.db")),
+            max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000")),
+            ttl=float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600))),
+            enabled=os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+        )
+
+    def _get_conn(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _fingerprint(self, chain: Any) -> str:
+        """计算链的提示词模板指纹"""
+        fingerprint = self._fingerprints.get(id(chain))
+        if fingerprint is None:
+            prompt = getattr(chain, "prompt", None)
+            fingerprint = hashlib.sha256(repr(prompt).encode("utf-8")).hexdigest()[:16]
+            self._fingerprints[id(chain)] = fingerprint
+        return fingerprint
+
+    def make_key(self, name: str, chain: Any, inputs: Dict[str, Any]) -> str:
+        """
+        计算缓存键
+
+        Args:
+            name: 链名称，例如 "cover.wechat"
+            chain: LLMChain实例，用于读取模型、温度和提示词模板
+            inputs: 提示词输入
+
+        Returns:
+            十六进制缓存键
+        """
+        llm = getattr(chain, "llm", None)
+        material = {
+            "chain": name,
+            "template": self._fingerprint(chain),
+            "model": getattr(llm, "model_name", None),
+            "temperature": getattr(llm, "temperature", None),
+            "inputs": normalize_input(inputs)
+        }
+        return hashlib.sha256(json.dumps(material, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def get(self, cache_key: str) -> Optional[str]:
+        """
+        读取缓存
+
+        Args:
+            cache_key: 缓存键
+
+        Returns:
+            缓存的响应文本，不存在或已过期时返回None
+        """
+        conn = self._get_conn()
+        row = conn.execute(
+            "SELECT value, created_at FROM llm_cache WHERE cache_key = ?", (cache_key,)
+        ).fetchone()
+        if not row:
+            return None
+
+        now = time.time()
+        if self.ttl and now - row[1] > self.ttl:
+            conn.execute("DELETE FROM llm_cache WHERE cache_key = ?", (cache_key,))
+            conn.commit()
+            return None
+
+        conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE cache_key = ?", (now, cache_key))
+        conn.commit()
+        return row[0]
+
+    def put(self, cache_key: str, name: str, value: str) -> None:
+        """
+        写入缓存，并按容量淘汰最久未访问的条目
+
+        Args:
+            cache_key: 缓存键
+            name: 链名称
+            value: 响应文本
+        """
+        now = time.time()
+        conn = self._get_conn()
+        conn.execute(
+            """
+            INSERT INTO llm_cache (cache_key, chain, value, created_at, accessed_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(cache_key) DO UPDATE SET
+                value = excluded.value,
+                created_at = excluded.created_at,
+                accessed_at = excluded.accessed_at
+            """,
+            (cache_key, name, value, now, now)
+        )
+
+        evicted = 0
+        if self.ttl:
+            evicted += conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,)).rowcount
+        if self.max_entries:
+            overflow = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                evicted += conn.execute(
+                    """
+                    DELETE FROM llm_cache WHERE cache_key IN (
+                        SELECT cache_key FROM llm_cache ORDER BY accessed_at ASC LIMIT ?
+                    )
+                    """,
+                    (overflow,)
+                ).rowcount
+        conn.commit()
+
+        if evicted:
+            self.evicted_count += evicted
+
+    def invoke(self, name: str, chain: Any, inputs: Dict[str, Any], use_cache: bool = True) -> Dict[str, Any]:
+        """
+        调用LLMChain，相同输入直接返回缓存的结果
+
+        Args:
+            name: 链名称，用于区分不同用途的链并分别统计命中率
+            chain: LLMChain实例
+            inputs: 提示词输入
+            use_cache: 是否读取缓存，为False时强制调用模型并用新结果刷新缓存
+
+        Returns:
+            与chain.invoke相同格式的结果，包含text字段
+        """
+        if not self.enabled:
+            return chain.invoke(inputs)
+
+        cache_key = self.make_key(name, chain, inputs)
+        cached = self._lookup(name, cache_key) if use_cache else None
+        if cached is not None:
+            return {**inputs, "text": cached}
+
+        self._count(self.misses, name)
+        result = chain.invoke(inputs)
+        self._store(name, cache_key, result.get("text", ""))
+        return result
+
+    def stream(self, name: str, chain: Any, inputs: Dict[str, Any], use_cache: bool = True) -> Iterator[str]:
+        """
+        流式调用LLMChain，逐段返回生成的文本。
+        缓存命中时一次性返回完整结果，未命中时在生成结束后写入缓存
+
+        Args:
+            name: 链名称
+            chain: LLMChain实例，使用其提示词模板和模型组成可流式输出的链
+            inputs: 提示词输入
+            use_cache: 是否读取缓存
+
+        Returns:
+            文本片段迭代器
+        """
+        cache_key = self.make_key(name, chain, inputs) if self.enabled else None
+        cached = self._lookup(name, cache_key) if cache_key and use_cache else None
+        if cached is not None:
+            yield cached
+            return
+
+        if cache_key:
+            self._count(self.misses, name)
+        parts = []
+        for chunk in (chain.prompt | chain.llm).stream(inputs):
+            text = getattr(chunk, "content", chunk)
+            if text:
+                parts.append(text)
+                yield text
+        if cache_key:
+            self._store(name, cache_key, "".join(parts))
+
+    def _lookup(self, name: str, cache_key: str) -> Optional[str]:
+        """读取缓存并记录命中，读取失败时按未命中处理"""
+        try:
+            cached = self.get(cache_key)
+        except sqlite3.Error as e:
+            logger.warning(f"读取LLM缓存失败: {str(e)}")
+            return None
+        if cached is not None:
+            self._count(self.hits, name)
+            logger.info(f"LLM缓存命中: {name}")
+        return cached
+
+    def _store(self, name: str, cache_key: str, text: str) -> None:
+        """写入非空的响应，写入失败只记录日志"""
+        if not text or not text.strip():
+            return
+        try:
+            self.put(cache_key, name, text)
+        except sqlite3.Error as e:
+            logger.warning(f"写入LLM缓存失败: {str(e)}")
+
+    def _count(self, counter: Dict[str, int], name: str) -> None:
+        with self._stats_lock:
+            counter[name] = counter.get(name, 0) + 1
+
+    def clear(self) -> int:
+        """
+        清空缓存
+
+        Returns:
+            删除的条目数量
+        """
+        conn = self._get_conn()
+        deleted = conn.execute("DELETE FROM llm_cache").rowcount
+        conn.commit()
+        return deleted
+
+    def stats(self) -> Dict[str, Any]:
+        """返回缓存条目数和当前进程的命中统计"""
+        hits = sum(self.hits.values())
+        misses = sum(self.misses.values())
+        return {
+            "enabled": self.enabled,
+            "entries": self._get_conn().execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0],
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            "evicted_count": self.evicted_count,
+            "by_chain": {
+                name: {"hits": self.hits.get(name, 0), "misses": self.misses.get(name, 0)}
+                for name in sorted(set(self.hits) | set(self.misses))
+            }
+        }
+
+# 单例实例
+_llm_cache = None
+
+def get_llm_cache() -> LLMCache:
+    """
+    获取LLM响应缓存实例（单例模式）
+
+    Returns:
+        LLMCache实例
+    """
+    global _llm_cache
+    if _llm_cache is None:
+        _llm_cache = LLMCache.from_env()
+    return _llm_cache
@@ -3,15 +3,23 @@ import json
 import logging
 import uuid
 import random
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Callable, TYPE_CHECKING
 from enum import Enum
-from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
-from langchain_openai import ChatOpenAI
 from pydantic import BaseModel
 from datetime import datetime
 from dotenv import load_dotenv
-import shutil
+
+try:
+    from .llm_cache import get_llm_cache
+    from .progressive_file import ProgressiveFileWriter
+    from .blob_store import get_blob_store
+except ImportError:
+    from llm_cache import get_llm_cache
+    from progressive_file import ProgressiveFileWriter
+    from blob_store import get_blob_store
+
+if TYPE_CHECKING:
+    from langchain.prompts import PromptTemplate
 
 # 加载环境变量
 load_dotenv()
@@ -66,6 +74,8 @@ class MagazineCardRequest(BaseModel):
     product_description: Optional[str] = None
     qr_code_file: Optional[str] = None  # 保存的二维码文件路径
     product_image_file: Optional[str] = None  # 保存的产品图片路径
+    use_cache: bool = True  # 是否使用LLM响应缓存，False时重新生成
+    stream: bool = False  # 是否流式生成，进度通过 /api/tasks/{task_id}/stream 推送
 
 # 响应模型
 class MagazineCardResponse(BaseModel):
@@ -88,6 +98,9 @@ class MagazineCardGenerator:
             model_name: 使用的语言模型名称
             temperature: 生成的创造性程度控制参数
         """
+        from langchain_openai import ChatOpenAI
+        from langchain.chains import LLMChain
+
         # 如果未指定模型，尝试从环境变量获取或使用默认值
         self.model_name = model_name or os.getenv("LLM_MODEL", "deepseek-chat")
         self.temperature = temperature
@@ -112,6 +125,7 @@ class MagazineCardGenerator:
             logger.error(f"大语言模型初始化失败: {str(e)}")
             # 模型初始化失败时不立即退出，而是在调用时再处理异常
             self.llm = None
+        self.cache = get_llm_cache()
             
         # 创建输出目录
         # 获取当前脚本所在目录
@@ -196,13 +210,15 @@ class MagazineCardGenerator:
         else:
             self.chain = None
     
-    def _create_prompt_template(self) -> PromptTemplate:
+    def _create_prompt_template(self) -> "PromptTemplate":
         """
         创建提示模板
         
         Returns:
             PromptTemplate: 用于生成卡片的提示模板
         """
+        from langchain.prompts import PromptTemplate
+
         template = """
 你是一位国际顶尖的数字杂志艺术总监和前端开发专家，曾为Vogue、Elle等时尚杂志设计过数字版面，擅长将奢华杂志美学与现代网页设计完美融合，创造出令人惊艳的视觉体验。
 
@@ -262,12 +278,14 @@ class MagazineCardGenerator:
             template=template
         )
     
-    def generate_card(self, request: MagazineCardRequest) -> MagazineCardResponse:
+    def generate_card(self, request: MagazineCardRequest,
+                      on_stream_start: Optional[Callable[[str, str], None]] = None) -> MagazineCardResponse:
         """
         生成杂志风格卡片
         
         Args:
             request: 卡片生成请求
+            on_stream_start: 流式生成时的回调，文件创建后以(卡片ID, 文件路径)调用，之后HTML逐段写入该文件
             
         Returns:
             生成的杂志卡片响应，包含文件路径
@@ -294,39 +312,31 @@ class MagazineCardGenerator:
         
         # 如果有本地文件，使用相对路径
         if request.qr_code_file:
-            # 将文件复制到输出目录
+            # 在输出目录中创建指向上传文件的链接
             qr_code_filename = os.path.basename(request.qr_code_file)
             qr_code_dest = os.path.join(self.output_dir, qr_code_filename)
             try:
-                # 确保目标目录存在并有正确的权限
-                os.makedirs(os.path.dirname(qr_code_dest), exist_ok=True)
-                # 如果目标文件已存在，先删除
-                if os.path.exists(qr_code_dest):
-                    os.remove(qr_code_dest)
-                shutil.copy2(request.qr_code_file, qr_code_dest)
+                # 链接到上传文件的同一份内容，已链接过时不再读写
+                get_blob_store().link_file(request.qr_code_file, qr_code_dest)
                 # 使用BASE_URL生成URL路径
                 qr_code_url = f"{BASE_URL}/magazine_cards/{qr_code_filename}"
-                logger.info(f"二维码文件已复制到: {qr_code_dest}, URL: {qr_code_url}")
+                logger.info(f"二维码文件已链接到: {qr_code_dest}, URL: {qr_code_url}")
             except Exception as e:
-                logger.error(f"复制二维码文件失败: {str(e)}")
+                logger.error(f"链接二维码文件失败: {str(e)}")
                 qr_code_url = request.qr_code_file
             
         if request.product_image_file:
-            # 将文件复制到输出目录
+            # 在输出目录中创建指向上传文件的链接
             product_image_filename = os.path.basename(request.product_image_file)
             product_image_dest = os.path.join(self.output_dir, product_image_filename)
             try:
-                # 确保目标目录存在并有正确的权限
-                os.makedirs(os.path.dirname(product_image_dest), exist_ok=True)
-                # 如果目标文件已存在，先删除
-                if os.path.exists(product_image_dest):
-                    os.remove(product_image_dest)
-                shutil.copy2(request.product_image_file, product_image_dest)
+                # 链接到上传文件的同一份内容，已链接过时不再读写
+                get_blob_store().link_file(request.product_image_file, product_image_dest)
                 # 使用BASE_URL生成URL路径
                 product_image_url = f"{BASE_URL}/magazine_cards/{product_image_filename}"
-                logger.info(f"产品图片已复制到: {product_image_dest}, URL: {product_image_url}")
+                logger.info(f"产品图片已链接到: {product_image_dest}, URL: {product_image_url}")
             except Exception as e:
-                logger.error(f"复制产品图片失败: {str(e)}")
+                logger.error(f"链接产品图片失败: {str(e)}")
                 product_image_url = request.product_image_file
         
         # 如果提供的是URL，确保它们使用正确的BASE_URL
@@ -347,14 +357,6 @@ class MagazineCardGenerator:
         }
         
         try:
-            # 生成HTML内容
-            logger.info("开始生成杂志卡片...")
-            result = self.chain.invoke(prompt_inputs)
-            html_content = result.get("text", "")
-            
-            if not html_content.strip():
-                raise ValueError("生成的HTML内容为空")
-                
             # 生成卡片ID
             card_id = str(uuid.uuid4())
             
@@ -363,25 +365,45 @@ class MagazineCardGenerator:
             filename = f"magazine_card_{timestamp}_{style.value}_{card_id}.html"
             file_path = os.path.join(self.output_dir, filename)
             
-            # 确保输出目录存在
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            
-            # 写入文件
-            with open(file_path, "w", encoding="utf-8") as f:
-                f.write(html_content)
+            # 生成HTML内容
+            logger.info("开始生成杂志卡片...")
+            if on_stream_start is None:
+                result = self.cache.invoke("magazine_card", self.chain, prompt_inputs, use_cache=request.use_cache)
+                html_content = result.get("text", "")
+                
+                if not html_content.strip():
+                    raise ValueError("生成的HTML内容为空")
+                
+                # 确保输出目录存在
+                os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                
+                # 写入文件
+                with open(file_path, "w", encoding="utf-8") as f:
+                    f.write(html_content)
+            else:
+                # 流式生成，边生成边写入文件
+                parts = []
+                with ProgressiveFileWriter(file_path) as writer:
+                    on_stream_start(card_id, file_path)
+                    for text in self.cache.stream("magazine_card", self.chain, prompt_inputs, use_cache=request.use_cache):
+                        writer.write(text)
+                        parts.append(text)
+                html_content = "".join(parts)
+                
+                if not html_content.strip():
+                    raise ValueError("生成的HTML内容为空")
             
             logger.info(f"杂志卡片生成成功，保存至: {file_path}")
             
-            # 将文件复制到项目根目录下的magazine_cards目录
+            # 项目根目录下的magazine_cards目录中创建指向同一份内容的链接，不再复制一份
             root_magazine_cards_dir = os.path.join(os.getcwd(), "magazine_cards")
-            os.makedirs(root_magazine_cards_dir, exist_ok=True)
             root_file_path = os.path.join(root_magazine_cards_dir, os.path.basename(file_path))
             
             try:
-                shutil.copy2(file_path, root_file_path)
-                logger.info(f"已复制文件到根目录: {root_file_path}")
+                get_blob_store().link_file(file_path, root_file_path)
+                logger.info(f"已链接文件到根目录: {root_file_path}")
             except Exception as e:
-                logger.error(f"复制文件到根目录失败: {str(e)}")
+                logger.error(f"链接文件到根目录失败: {str(e)}")
                 
             # 返回响应，包含文件路径
             return MagazineCardResponse(
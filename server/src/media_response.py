@@ -0,0 +1,317 @@
+"""
+生成文件（视频、图片、HTML）的响应
+支持Range请求（视频拖动进度条时只下载需要的部分）、ETag/Last-Modified条件请求，
+HTML等文本文件按Accept-Encoding返回预压缩的 .br/.gz 副本，文件名带内容哈希的文件使用长期缓存。
+
+预压缩副本在第一次请求时生成，也可以在部署时预先生成:
+    python -m src.media_response templates magazine_cards
+"""
+import os
+import re
+import sys
+import gzip
+import stat
+import logging
+import uuid
+import argparse
+import mimetypes
+from typing import Optional, Dict, Mapping, Tuple, Iterator, List
+
+from fastapi.responses import FileResponse, StreamingResponse, Response
+from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+
+try:
+    from .artifact_index import file_cache_headers, is_not_modified
+except ImportError:
+    from artifact_index import file_cache_headers, is_not_modified
+
+# brotli为可选依赖，未安装时只提供gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 值得压缩的类型，视频和图片本身已经压缩过
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "image/svg+xml")
+# 小于该大小的文件不压缩
+MIN_COMPRESS_SIZE = 1024
+# 预压缩副本的扩展名，按优先级排列
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+# 文件名中带有内容哈希（16位以上十六进制）的文件内容不会改变，可以长期缓存
+CONTENT_HASH_PATTERN = re.compile(r"(?:^|[._-])[0-9a-f]{16,64}(?=[._-]|$)")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+CHUNK_SIZE = 64 * 1024
+
+def is_content_hashed(path: str) -> bool:
+    """文件名是否带有内容哈希"""
+    return CONTENT_HASH_PATTERN.search(os.path.basename(path)) is not None
+
+def _accepted_encodings(accept_encoding: Optional[str]) -> List[str]:
+    """解析Accept-Encoding，返回客户端接受的编码（忽略q=0）"""
+    encodings = []
+    for item in (accept_encoding or "").split(","):
+        name, _, params = item.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if name:
+            encodings.append(name.strip().lower())
+    return encodings
+
+def _is_compressible(media_type: str, size: int) -> bool:
+    return size >= MIN_COMPRESS_SIZE and media_type.startswith(COMPRESSIBLE_TYPES)
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=11)
+    # mtime=0 使相同内容生成相同的压缩结果
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+def precompressed_path(path: str, encoding: str, source_stat: os.stat_result) -> Optional[str]:
+    """
+    返回与源文件对应的预压缩副本，副本不存在或已过期时重新生成
+
+    副本的修改时间被设置为源文件的修改时间，两者不一致说明源文件已经改变；
+    压缩过程中源文件被改写（例如仍在流式生成的HTML）时不保存副本
+
+    Args:
+        path: 源文件路径
+        encoding: br 或 gzip
+        source_stat: 源文件的stat结果
+
+    Returns:
+        副本路径，无法生成时返回None
+    """
+    if encoding == "br" and brotli is None:
+        return None
+    target = path + ENCODING_SUFFIXES[encoding]
+    try:
+        if os.stat(target).st_mtime_ns == source_stat.st_mtime_ns:
+            return target
+    except FileNotFoundError:
+        pass
+
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        current = os.stat(path)
+        if current.st_mtime_ns != source_stat.st_mtime_ns or current.st_size != source_stat.st_size:
+            return None
+        compressed = _compress(data, encoding)
+        if len(compressed) >= len(data):
+            return None
+        # 先写临时文件再替换，并发请求不会读到写了一半的副本；临时文件名每次不同，同一进程的多个线程也不会互相覆盖
+        temp_path = f"{target}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(compressed)
+            os.utime(temp_path, ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns))
+            os.replace(temp_path, target)
+        except OSError:
+            try:
+                os.remove(temp_path)
+            except FileNotFoundError:
+                pass
+            raise
+    except OSError as e:
+        logger.warning(f"生成预压缩文件失败 {target}: {str(e)}")
+        return None
+    logger.info(f"已生成预压缩文件: {target} ({len(data)} -> {len(compressed)} 字节)")
+    return target
+
+def parse_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    解析单个字节范围
+
+    Args:
+        range_header: Range请求头，例如 bytes=0-1023、bytes=1024-、bytes=-500
+        size: 文件大小
+
+    Returns:
+        (起始位置, 结束位置)，包含结束位置；格式不支持（包括多个范围）时返回None，按完整文件响应
+
+    Raises:
+        ValueError: 范围超出文件大小，应返回416
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    start_text, _, end_text = (part.strip() for part in spec.strip().partition("-"))
+    if not start_text:
+        # 最后N个字节
+        if not end_text.isdigit():
+            return None
+        suffix = int(end_text)
+        if suffix == 0:
+            raise ValueError("范围为空")
+        return max(size - suffix, 0), size - 1
+    if not start_text.isdigit() or (end_text and not end_text.isdigit()):
+        return None
+    start = int(start_text)
+    end = int(end_text) if end_text else size - 1
+    if start >= size or end < start:
+        raise ValueError("范围超出文件大小")
+    return start, min(end, size - 1)
+
+def _iter_file(path: str, start: int, length: int) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+def _range_applies(request_headers: Mapping[str, str], headers: Dict[str, str]) -> bool:
+    """If-Range与当前的ETag或Last-Modified一致时才按范围响应，否则返回完整文件"""
+    if_range = request_headers.get("if-range")
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith(('"', 'W/')):
+        return if_range == headers["ETag"]
+    return if_range == headers["Last-Modified"]
+
+def media_response(path: str, request_headers: Mapping[str, str], stat_result: Optional[os.stat_result] = None,
+                   method: str = "GET", cache_control: Optional[str] = None) -> Response:
+    """
+    生成文件响应
+
+    Args:
+        path: 文件路径
+        request_headers: 请求头
+        stat_result: 文件的stat结果，默认重新获取
+        method: 请求方法，HEAD时不返回内容
+        cache_control: Cache-Control响应头，默认按文件名判断（带内容哈希时长期缓存，否则每次重新验证）
+
+    Returns:
+        200（完整文件或压缩副本）、206（部分内容）、304（未修改）或416（范围无效）响应
+    """
+    if stat_result is None:
+        stat_result = os.stat(path)
+    size = stat_result.st_size
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+    headers = file_cache_headers(stat_result)
+    if cache_control:
+        headers["Cache-Control"] = cache_control
+    elif is_content_hashed(path):
+        headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+    headers["Accept-Ranges"] = "bytes"
+
+    range_header = request_headers.get("range")
+    compressible = _is_compressible(media_type, size)
+    encoding = None
+    if compressible:
+        headers["Vary"] = "Accept-Encoding"
+        # 范围请求按未压缩的内容计算，不使用压缩副本
+        if not range_header:
+            accepted = _accepted_encodings(request_headers.get("accept-encoding"))
+            encoding = next((name for name in ENCODING_SUFFIXES if name in accepted), None)
+            if encoding == "br" and brotli is None:
+                encoding = "gzip" if "gzip" in accepted else None
+    if encoding:
+        # 不同编码是不同的表示，ETag需要区分
+        headers["ETag"] = headers["ETag"][:-1] + f'-{encoding}"'
+
+    if is_not_modified(request_headers, headers["ETag"], stat_result.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    if range_header and _range_applies(request_headers, headers):
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers)
+        if byte_range is not None:
+            start, end = byte_range
+            length = end - start + 1
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            headers["Content-Length"] = str(length)
+            if method == "HEAD":
+                return Response(status_code=206, headers=headers, media_type=media_type)
+            return StreamingResponse(_iter_file(path, start, length), status_code=206, headers=headers,
+                                     media_type=media_type)
+
+    if encoding:
+        compressed = precompressed_path(path, encoding, stat_result)
+        if compressed is not None:
+            headers["Content-Encoding"] = encoding
+            return FileResponse(compressed, headers=headers, media_type=media_type, stat_result=os.stat(compressed),
+                                method=method)
+        # 无法压缩时返回原文件，ETag恢复为原文件的ETag
+        headers["ETag"] = file_cache_headers(stat_result)["ETag"]
+
+    return FileResponse(path, headers=headers, media_type=media_type, stat_result=stat_result, method=method)
+
+class MediaStaticFiles(StaticFiles):
+    """静态文件目录，文件通过media_response响应，支持Range、预压缩和长期缓存；隐藏文件返回404"""
+
+    async def get_response(self, path: str, scope) -> Response:
+        # 隐藏文件和目录（例如文件存储的 .blobs）不对外提供
+        if any(part.startswith(".") for part in path.replace("\\", "/").split("/")):
+            raise HTTPException(status_code=404)
+        if scope["method"] in ("GET", "HEAD"):
+            try:
+                full_path, stat_result = await run_in_threadpool(self.lookup_path, path)
+            except OSError:
+                # 权限等错误交给StaticFiles处理
+                return await super().get_response(path, scope)
+            if stat_result is not None and stat.S_ISREG(stat_result.st_mode):
+                # 压缩可能耗时，在线程池中进行
+                return await run_in_threadpool(media_response, full_path, Headers(scope=scope), stat_result,
+                                               scope["method"])
+        return await super().get_response(path, scope)
+
+def precompress_directory(directory: str) -> int:
+    """
+    为目录中所有可压缩的文件生成预压缩副本
+
+    Args:
+        directory: 目录路径
+
+    Returns:
+        生成或已是最新的副本数量
+    """
+    count = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.endswith(tuple(ENCODING_SUFFIXES.values())) or name.endswith(".tmp"):
+                continue
+            path = os.path.join(root, name)
+            source_stat = os.stat(path)
+            if not _is_compressible(mimetypes.guess_type(path)[0] or "", source_stat.st_size):
+                continue
+            for encoding in ENCODING_SUFFIXES:
+                if precompressed_path(path, encoding, source_stat):
+                    count += 1
+    return count
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="为生成的HTML等文本文件预先生成 .br/.gz 压缩副本")
+    parser.add_argument("directories", nargs="*", default=["templates", "magazine_cards"], help="要处理的目录")
+    args = parser.parse_args(argv)
+    for directory in args.directories:
+        if os.path.isdir(directory):
+            print(f"{directory}: {precompress_directory(directory)} 个压缩副本")
+    if brotli is None:
+        print("未安装brotli，只生成了gzip副本（pip install brotli）")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,9 @@
-from typing import Optional, Dict, List, Union, Any
+from typing import Optional, Dict, List, Union, Any, Tuple
 import os
 import requests
 import time
+import asyncio
+import httpx
 import json
 import base64
 from io import BytesIO
@@ -11,6 +13,13 @@ from enum import Enum
 from dotenv import load_dotenv
 import logging
 
+try:
+    from .http_client import get_http_session, get_async_http_client
+    from .blob_store import get_blob_store
+except ImportError:
+    from http_client import get_http_session, get_async_http_client
+    from blob_store import get_blob_store
+
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -55,7 +64,8 @@ class MiniMaxiImageGenerator:
     def __init__(self):
         """初始化图像生成器"""
         self.api_key = os.getenv("MINIMAXI_API_KEY")
-        self.base_url = "https://api.minimaxi.com/v1"
+        self.session = get_http_session()
+        self.base_url = os.getenv("MINIMAXI_BASE_URL", "https://api.minimaxi.com/v1")
         self.image_generation_endpoint = "/images/generation"
         self.image_query_endpoint = "/images/generation/{task_id}"
         self.image_upscale_endpoint = "/images/upscale"
@@ -74,41 +84,21 @@ class MiniMaxiImageGenerator:
             "Authorization": f"Bearer {self.api_key}"
         }
     
-    def generate_image(self, 
-                      prompt: str,
-                      negative_prompt: Optional[str] = None,
-                      model: Union[str, ImageModel] = ImageModel.SD_XL,
-                      style: Union[str, ImageStyle] = ImageStyle.NONE,
-                      size: Union[str, ImageSize] = ImageSize.SMALL,
-                      format: Union[str, ImageFormat] = ImageFormat.PNG,
-                      width: Optional[int] = None,
-                      height: Optional[int] = None,
-                      guidance_scale: Optional[float] = None,
-                      num_images: int = 1,
-                      webhook_url: Optional[str] = None,
-                      seed: Optional[int] = None,
-                      reference_images: Optional[List[str]] = None) -> Dict[str, Any]:
-        """
-        生成图像
-        
-        Args:
-            prompt: 图像生成的提示词
-            negative_prompt: 负面提示词，指定不想出现的内容
-            model: 使用的模型，默认为SD-XL
-            style: 图像风格，默认为无特定风格
-            size: 图像尺寸，默认为1024x1024
-            format: 图像格式，默认为PNG
-            width: 自定义宽度（像素），仅当size为custom时使用
-            height: 自定义高度（像素），仅当size为custom时使用
-            guidance_scale: 提示词引导强度，默认由系统决定
-            num_images: 生成图像的数量，默认为1
-            webhook_url: 回调通知URL
-            seed: 随机种子，用于复现结果
-            reference_images: 参考图片URL列表，用于图像引导
-            
-        Returns:
-            包含任务ID的字典
-        """
+    def _build_generation_payload(self, 
+                                 prompt: str,
+                                 negative_prompt: Optional[str] = None,
+                                 model: Union[str, ImageModel] = ImageModel.SD_XL,
+                                 style: Union[str, ImageStyle] = ImageStyle.NONE,
+                                 size: Union[str, ImageSize] = ImageSize.SMALL,
+                                 format: Union[str, ImageFormat] = ImageFormat.PNG,
+                                 width: Optional[int] = None,
+                                 height: Optional[int] = None,
+                                 guidance_scale: Optional[float] = None,
+                                 num_images: int = 1,
+                                 webhook_url: Optional[str] = None,
+                                 seed: Optional[int] = None,
+                                 reference_images: Optional[List[str]] = None) -> Dict[str, Any]:
+        """构建图像生成请求参数，参数与generate_image相同"""
         # 转换枚举为字符串
         if isinstance(model, ImageModel):
             model = model.value
@@ -158,10 +148,52 @@ class MiniMaxiImageGenerator:
         if reference_images:
             payload["reference_images"] = reference_images
         
+        return payload
+    
+    def generate_image(self, 
+                      prompt: str,
+                      negative_prompt: Optional[str] = None,
+                      model: Union[str, ImageModel] = ImageModel.SD_XL,
+                      style: Union[str, ImageStyle] = ImageStyle.NONE,
+                      size: Union[str, ImageSize] = ImageSize.SMALL,
+                      format: Union[str, ImageFormat] = ImageFormat.PNG,
+                      width: Optional[int] = None,
+                      height: Optional[int] = None,
+                      guidance_scale: Optional[float] = None,
+                      num_images: int = 1,
+                      webhook_url: Optional[str] = None,
+                      seed: Optional[int] = None,
+                      reference_images: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        生成图像
+        
+        Args:
+            prompt: 图像生成的提示词
+            negative_prompt: 负面提示词，指定不想出现的内容
+            model: 使用的模型，默认为SD-XL
+            style: 图像风格，默认为无特定风格
+            size: 图像尺寸，默认为1024x1024
+            format: 图像格式，默认为PNG
+            width: 自定义宽度（像素），仅当size为custom时使用
+            height: 自定义高度（像素），仅当size为custom时使用
+            guidance_scale: 提示词引导强度，默认由系统决定
+            num_images: 生成图像的数量，默认为1
+            webhook_url: 回调通知URL
+            seed: 随机种子，用于复现结果
+            reference_images: 参考图片URL列表，用于图像引导
+            
+        Returns:
+            包含任务ID的字典
+        """
+        payload = self._build_generation_payload(
+            prompt, negative_prompt, model, style, size, format, width, height,
+            guidance_scale, num_images, webhook_url, seed, reference_images
+        )
+        
         try:
             # 发送请求
             logger.info(f"发送图像生成请求: {prompt[:50]}...")
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}{self.image_generation_endpoint}",
                 headers=self._get_headers(),
                 json=payload
@@ -187,7 +219,7 @@ class MiniMaxiImageGenerator:
             任务状态信息
         """
         try:
-            response = requests.get(
+            response = self.session.get(
                 f"{self.base_url}{self.image_query_endpoint.format(task_id=task_id)}",
                 headers=self._get_headers()
             )
@@ -218,6 +250,36 @@ class MiniMaxiImageGenerator:
             logger.error(f"检查任务状态失败: {str(e)}")
             return False
     
+    def check_task(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """
+        查询一次任务状态，不阻塞等待，供轮询调度器使用
+        
+        Args:
+            task_id: 任务ID
+            
+        Returns:
+            任务成功时返回结果，仍在进行中时返回None
+            
+        Raises:
+            Exception: 任务失败
+        """
+        return self._check_result(task_id, self.query_task(task_id))
+    
+    def _check_result(self, task_id: str, result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """根据任务查询结果判断任务是否结束，逻辑与check_task相同"""
+        status = result.get("status")
+        
+        if status == "success":
+            logger.info(f"任务 {task_id} 已成功完成")
+            return result
+        elif status == "failed":
+            error_msg = f"任务 {task_id} 失败: {result.get('message', '未知错误')}"
+            logger.error(error_msg)
+            raise Exception(error_msg)
+        
+        logger.info(f"任务 {task_id} 当前状态: {status}, 继续等待...")
+        return None
+    
     def wait_for_result(self, task_id: str, polling_interval: int = 2, timeout: int = 180) -> Dict[str, Any]:
         """
         等待任务完成并获取结果
@@ -237,31 +299,14 @@ class MiniMaxiImageGenerator:
             if time.time() - start_time > timeout:
                 raise TimeoutError(f"任务 {task_id} 在 {timeout} 秒后超时")
             
-            result = self.query_task(task_id)
-            status = result.get("status")
-            
-            if status == "success":
-                logger.info(f"任务 {task_id} 已成功完成")
+            result = self.check_task(task_id)
+            if result is not None:
                 return result
-            elif status == "failed":
-                error_msg = f"任务 {task_id} 失败: {result.get('message', '未知错误')}"
-                logger.error(error_msg)
-                raise Exception(error_msg)
             
-            logger.info(f"任务 {task_id} 当前状态: {status}, 继续等待...")
             time.sleep(polling_interval)
     
-    def download_image(self, image_url: str, output_path: Optional[str] = None) -> str:
-        """
-        下载生成的图像
-        
-        Args:
-            image_url: 图像URL
-            output_path: 保存路径，如果不提供则自动生成
-            
-        Returns:
-            图像保存的完整路径
-        """
+    def _prepare_output_path(self, image_url: str, output_path: Optional[str] = None) -> str:
+        """确定图像保存路径并确保目录存在，未提供路径时根据URL自动生成"""
         if not output_path:
             # 从URL获取文件名
             file_name = os.path.basename(image_url.split('?')[0])
@@ -275,13 +320,27 @@ class MiniMaxiImageGenerator:
         
         # 确保输出目录存在
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        return output_path
+    
+    def download_image(self, image_url: str, output_path: Optional[str] = None) -> str:
+        """
+        下载生成的图像
+        
+        Args:
+            image_url: 图像URL
+            output_path: 保存路径，如果不提供则自动生成
+            
+        Returns:
+            图像保存的完整路径
+        """
+        output_path = self._prepare_output_path(image_url, output_path)
         
         try:
             # 下载文件
-            response = requests.get(image_url, stream=True)
+            response = self.session.get(image_url, stream=True)
             response.raise_for_status()
             
-            with open(output_path, 'wb') as f:
+            with get_blob_store().writer(output_path) as f:
                 for chunk in response.iter_content(chunk_size=8192):
                     f.write(chunk)
             
@@ -304,9 +363,20 @@ class MiniMaxiImageGenerator:
         """
         paths = []
         
+        for image_url, output_path in self._image_download_targets(result, prefix):
+            image_path = self.download_image(image_url, output_path)
+            if image_path:
+                paths.append(image_path)
+        
+        return paths
+    
+    def _image_download_targets(self, result: Dict[str, Any], prefix: Optional[str] = None) -> List[Tuple[str, str]]:
+        """列出结果中每张图像的URL和保存路径"""
+        targets = []
+        
         if "images" not in result:
             logger.warning("结果中没有找到图像")
-            return paths
+            return targets
         
         for i, image_data in enumerate(result["images"]):
             if "url" not in image_data:
@@ -315,13 +385,9 @@ class MiniMaxiImageGenerator:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             file_prefix = prefix or "image"
             file_name = f"{file_prefix}_{timestamp}_{i+1}.png"
-            output_path = os.path.join(self.output_dir, file_name)
-            
-            image_path = self.download_image(image_data["url"], output_path)
-            if image_path:
-                paths.append(image_path)
+            targets.append((image_data["url"], os.path.join(self.output_dir, file_name)))
         
-        return paths
+        return targets
     
     def upscale_image(self, image_url: str, scale: int = 2) -> Dict[str, Any]:
         """
@@ -343,7 +409,7 @@ class MiniMaxiImageGenerator:
         }
         
         try:
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}{self.image_upscale_endpoint}",
                 headers=self._get_headers(),
                 json=payload
@@ -358,6 +424,140 @@ class MiniMaxiImageGenerator:
                 logger.error(f"响应内容: {e.response.text}")
             return {"error": error_msg}
 
+    # 异步接口：与同步接口行为相同，共用一个异步连接池，可直接在事件循环中调用
+    
+    async def agenerate_image(self, prompt: str, **kwargs) -> Dict[str, Any]:
+        """
+        异步生成图像
+        
+        Args:
+            prompt: 图像生成的提示词
+            **kwargs: 其他参数与generate_image相同
+            
+        Returns:
+            包含任务ID的字典
+        """
+        payload = self._build_generation_payload(prompt, **kwargs)
+        
+        try:
+            logger.info(f"发送图像生成请求: {prompt[:50]}...")
+            response = await get_async_http_client().post(
+                f"{self.base_url}{self.image_generation_endpoint}",
+                headers=self._get_headers(),
+                json=payload
+            )
+            response.raise_for_status()
+            
+            return response.json()
+        except httpx.HTTPError as e:
+            error_msg = f"API请求失败: {str(e)}"
+            if isinstance(e, httpx.HTTPStatusError):
+                logger.error(f"响应状态码: {e.response.status_code}")
+                logger.error(f"响应内容: {e.response.text}")
+            return {"error": error_msg}
+    
+    async def aquery_task(self, task_id: str) -> Dict[str, Any]:
+        """
+        异步查询任务状态
+        
+        Args:
+            task_id: 任务ID
+            
+        Returns:
+            任务状态信息
+        """
+        try:
+            response = await get_async_http_client().get(
+                f"{self.base_url}{self.image_query_endpoint.format(task_id=task_id)}",
+                headers=self._get_headers()
+            )
+            response.raise_for_status()
+            
+            return response.json()
+        except httpx.HTTPError as e:
+            error_msg = f"查询任务状态失败: {str(e)}"
+            if isinstance(e, httpx.HTTPStatusError):
+                logger.error(f"响应状态码: {e.response.status_code}")
+                logger.error(f"响应内容: {e.response.text}")
+            return {"error": error_msg}
+    
+    async def acheck_task(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """
+        异步查询一次任务状态，返回值与check_task相同
+        
+        Args:
+            task_id: 任务ID
+            
+        Returns:
+            任务成功时返回结果，仍在进行中时返回None
+        """
+        return self._check_result(task_id, await self.aquery_task(task_id))
+    
+    async def await_result(self, task_id: str, polling_interval: int = 2, timeout: int = 180) -> Dict[str, Any]:
+        """
+        异步等待任务完成并获取结果
+        
+        Args:
+            task_id: 任务ID
+            polling_interval: 轮询间隔(秒)
+            timeout: 超时时间(秒)
+            
+        Returns:
+            图像生成结果
+        """
+        start_time = time.time()
+        
+        while True:
+            if time.time() - start_time > timeout:
+                raise TimeoutError(f"任务 {task_id} 在 {timeout} 秒后超时")
+            
+            result = await self.acheck_task(task_id)
+            if result is not None:
+                return result
+            
+            await asyncio.sleep(polling_interval)
+    
+    async def adownload_image(self, image_url: str, output_path: Optional[str] = None) -> str:
+        """
+        异步下载生成的图像
+        
+        Args:
+            image_url: 图像URL
+            output_path: 保存路径，如果不提供则自动生成
+            
+        Returns:
+            图像保存的完整路径，下载失败时返回空字符串
+        """
+        output_path = self._prepare_output_path(image_url, output_path)
+        
+        try:
+            async with get_async_http_client().stream("GET", image_url) as response:
+                response.raise_for_status()
+                await get_blob_store().awrite_stream(response.aiter_bytes(), output_path)
+            
+            logger.info(f"图像已保存: {output_path}")
+            return output_path
+        except httpx.HTTPError as e:
+            logger.error(f"下载图像失败: {str(e)}")
+            return ""
+    
+    async def adownload_all_images(self, result: Dict[str, Any], prefix: Optional[str] = None) -> List[str]:
+        """
+        异步并发下载结果中的所有图像
+        
+        Args:
+            result: 任务查询结果
+            prefix: 文件名前缀
+            
+        Returns:
+            保存的图像路径列表
+        """
+        paths = await asyncio.gather(*[
+            self.adownload_image(image_url, output_path)
+            for image_url, output_path in self._image_download_targets(result, prefix)
+        ])
+        return [path for path in paths if path]
+
 def main():
     """示例使用方法"""
     generator = MiniMaxiImageGenerator()
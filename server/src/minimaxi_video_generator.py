@@ -3,10 +3,19 @@ import os
 import requests
 import time
 import json
+import asyncio
+import httpx
 from datetime import datetime
 from enum import Enum
 from dotenv import load_dotenv
 
+try:
+    from .http_client import get_http_session, get_async_http_client
+    from .blob_store import get_blob_store
+except ImportError:
+    from http_client import get_http_session, get_async_http_client
+    from blob_store import get_blob_store
+
 load_dotenv()
 
 class VideoQuality(str, Enum):
@@ -44,7 +53,8 @@ class MiniMaxiVideoGenerator:
     def __init__(self):
         """初始化视频生成器"""
         self.api_key = os.getenv("MINIMAXI_API_KEY")
-        self.base_url = "https://api.minimaxi.com/v1"
+        self.session = get_http_session()
+        self.base_url = os.getenv("MINIMAXI_BASE_URL", "https://api.minimaxi.com/v1")
         self.video_generation_endpoint = "/videos/generation"
         self.video_query_endpoint = "/videos/generation/{task_id}"
         
@@ -62,33 +72,17 @@ class MiniMaxiVideoGenerator:
             "Authorization": f"Bearer {self.api_key}"
         }
     
-    def generate_video(self, 
-                      prompt: str,
-                      negative_prompt: Optional[str] = None,
-                      images: Optional[List[str]] = None,
-                      duration: Optional[int] = None,
-                      content_type: Optional[Union[str, VideoContentType]] = None,
-                      quality: Union[str, VideoQuality] = VideoQuality.STANDARD,
-                      format: Union[str, VideoFormat] = VideoFormat.MP4,
-                      webhook_url: Optional[str] = None,
-                      seed: Optional[int] = None) -> Dict[str, Any]:
-        """
-        生成视频
-        
-        Args:
-            prompt: 视频生成的提示词
-            negative_prompt: 负面提示词，指定不想出现的内容
-            images: 参考图片URL列表（可选）
-            duration: 视频时长，单位秒（可选）
-            content_type: 视频内容类型（可选）
-            quality: 视频质量，默认为standard
-            format: 视频格式，默认为mp4
-            webhook_url: 回调通知URL（可选）
-            seed: 随机种子，用于复现结果（可选）
-            
-        Returns:
-            包含任务ID的字典
-        """
+    def _build_generation_payload(self, 
+                                 prompt: str,
+                                 negative_prompt: Optional[str] = None,
+                                 images: Optional[List[str]] = None,
+                                 duration: Optional[int] = None,
+                                 content_type: Optional[Union[str, VideoContentType]] = None,
+                                 quality: Union[str, VideoQuality] = VideoQuality.STANDARD,
+                                 format: Union[str, VideoFormat] = VideoFormat.MP4,
+                                 webhook_url: Optional[str] = None,
+                                 seed: Optional[int] = None) -> Dict[str, Any]:
+        """构建视频生成请求参数，参数与generate_video相同"""
         # 转换枚举为字符串
         if isinstance(quality, VideoQuality):
             quality = quality.value
@@ -125,9 +119,42 @@ class MiniMaxiVideoGenerator:
         if seed is not None:
             payload["seed"] = seed
         
+        return payload
+    
+    def generate_video(self, 
+                      prompt: str,
+                      negative_prompt: Optional[str] = None,
+                      images: Optional[List[str]] = None,
+                      duration: Optional[int] = None,
+                      content_type: Optional[Union[str, VideoContentType]] = None,
+                      quality: Union[str, VideoQuality] = VideoQuality.STANDARD,
+                      format: Union[str, VideoFormat] = VideoFormat.MP4,
+                      webhook_url: Optional[str] = None,
+                      seed: Optional[int] = None) -> Dict[str, Any]:
+        """
+        生成视频
+        
+        Args:
+            prompt: 视频生成的提示词
+            negative_prompt: 负面提示词，指定不想出现的内容
+            images: 参考图片URL列表（可选）
+            duration: 视频时长，单位秒（可选）
+            content_type: 视频内容类型（可选）
+            quality: 视频质量，默认为standard
+            format: 视频格式，默认为mp4
+            webhook_url: 回调通知URL（可选）
+            seed: 随机种子，用于复现结果（可选）
+            
+        Returns:
+            包含任务ID的字典
+        """
+        payload = self._build_generation_payload(
+            prompt, negative_prompt, images, duration, content_type, quality, format, webhook_url, seed
+        )
+        
         try:
             # 发送请求
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}{self.video_generation_endpoint}",
                 headers=self._get_headers(),
                 json=payload
@@ -155,7 +182,7 @@ class MiniMaxiVideoGenerator:
             任务状态信息
         """
         try:
-            response = requests.get(
+            response = self.session.get(
                 f"{self.base_url}{self.video_query_endpoint.format(task_id=task_id)}",
                 headers=self._get_headers()
             )
@@ -188,6 +215,33 @@ class MiniMaxiVideoGenerator:
             print(f"检查任务状态失败: {str(e)}")
             return False
     
+    def check_task(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """
+        查询一次任务状态，不阻塞等待，供轮询调度器使用
+        
+        Args:
+            task_id: 任务ID
+            
+        Returns:
+            任务成功时返回结果，仍在进行中时返回None
+            
+        Raises:
+            Exception: 任务失败
+        """
+        return self._check_result(task_id, self.query_task(task_id))
+    
+    def _check_result(self, task_id: str, result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """根据任务查询结果判断任务是否结束，逻辑与check_task相同"""
+        status = result.get("status")
+        
+        if status == "success":
+            return result
+        elif status == "failed":
+            raise Exception(f"任务 {task_id} 失败: {result.get('message', '未知错误')}")
+        
+        print(f"任务 {task_id} 当前状态: {status}, 等待中...")
+        return None
+    
     def wait_for_result(self, task_id: str, polling_interval: int = 5, timeout: int = 600) -> Dict[str, Any]:
         """
         等待任务完成并获取结果
@@ -206,28 +260,14 @@ class MiniMaxiVideoGenerator:
             if time.time() - start_time > timeout:
                 raise TimeoutError(f"任务 {task_id} 在 {timeout} 秒后超时")
             
-            result = self.query_task(task_id)
-            status = result.get("status")
-            
-            if status == "success":
+            result = self.check_task(task_id)
+            if result is not None:
                 return result
-            elif status == "failed":
-                raise Exception(f"任务 {task_id} 失败: {result.get('message', '未知错误')}")
             
-            print(f"任务 {task_id} 当前状态: {status}, 等待中...")
             time.sleep(polling_interval)
     
-    def download_video(self, video_url: str, output_path: Optional[str] = None) -> str:
-        """
-        下载生成的视频
-        
-        Args:
-            video_url: 视频URL
-            output_path: 保存路径，如果不提供则自动生成
-            
-        Returns:
-            视频保存的完整路径
-        """
+    def _prepare_output_path(self, video_url: str, output_path: Optional[str] = None) -> str:
+        """确定视频保存路径并确保目录存在，未提供路径时根据URL自动生成"""
         if not output_path:
             # 从URL获取文件名
             file_name = os.path.basename(video_url.split('?')[0])
@@ -241,13 +281,27 @@ class MiniMaxiVideoGenerator:
         
         # 确保输出目录存在
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        return output_path
+    
+    def download_video(self, video_url: str, output_path: Optional[str] = None) -> str:
+        """
+        下载生成的视频
+        
+        Args:
+            video_url: 视频URL
+            output_path: 保存路径，如果不提供则自动生成
+            
+        Returns:
+            视频保存的完整路径
+        """
+        output_path = self._prepare_output_path(video_url, output_path)
         
         try:
             # 下载文件
-            response = requests.get(video_url, stream=True)
+            response = self.session.get(video_url, stream=True)
             response.raise_for_status()
             
-            with open(output_path, 'wb') as f:
+            with get_blob_store().writer(output_path) as f:
                 for chunk in response.iter_content(chunk_size=8192):
                     f.write(chunk)
             
@@ -257,6 +311,127 @@ class MiniMaxiVideoGenerator:
             error_msg = f"下载视频失败: {str(e)}"
             print(error_msg)
             return ""
+    
+    # 异步接口：与同步接口行为相同，共用一个异步连接池，可直接在事件循环中调用
+    
+    async def agenerate_video(self, prompt: str, **kwargs) -> Dict[str, Any]:
+        """
+        异步生成视频
+        
+        Args:
+            prompt: 视频生成的提示词
+            **kwargs: 其他参数与generate_video相同
+            
+        Returns:
+            包含任务ID的字典
+        """
+        payload = self._build_generation_payload(prompt, **kwargs)
+        
+        try:
+            response = await get_async_http_client().post(
+                f"{self.base_url}{self.video_generation_endpoint}",
+                headers=self._get_headers(),
+                json=payload
+            )
+            response.raise_for_status()
+            
+            return response.json()
+        except httpx.HTTPError as e:
+            error_msg = f"视频生成请求失败: {str(e)}"
+            if isinstance(e, httpx.HTTPStatusError):
+                error_msg += f"\n状态码: {e.response.status_code}"
+                error_msg += f"\n响应内容: {e.response.text}"
+            
+            print(error_msg)
+            return {"error": error_msg}
+    
+    async def aquery_task(self, task_id: str) -> Dict[str, Any]:
+        """
+        异步查询任务状态
+        
+        Args:
+            task_id: 任务ID
+            
+        Returns:
+            任务状态信息
+        """
+        try:
+            response = await get_async_http_client().get(
+                f"{self.base_url}{self.video_query_endpoint.format(task_id=task_id)}",
+                headers=self._get_headers()
+            )
+            response.raise_for_status()
+            
+            return response.json()
+        except httpx.HTTPError as e:
+            error_msg = f"查询任务状态失败: {str(e)}"
+            if isinstance(e, httpx.HTTPStatusError):
+                error_msg += f"\n状态码: {e.response.status_code}"
+                error_msg += f"\n响应内容: {e.response.text}"
+            
+            print(error_msg)
+            return {"error": error_msg}
+    
+    async def acheck_task(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """
+        异步查询一次任务状态，返回值与check_task相同
+        
+        Args:
+            task_id: 任务ID
+            
+        Returns:
+            任务成功时返回结果，仍在进行中时返回None
+        """
+        return self._check_result(task_id, await self.aquery_task(task_id))
+    
+    async def await_result(self, task_id: str, polling_interval: int = 5, timeout: int = 600) -> Dict[str, Any]:
+        """
+        异步等待任务完成并获取结果
+        
+        Args:
+            task_id: 任务ID
+            polling_interval: 轮询间隔(秒)
+            timeout: 超时时间(秒)
+            
+        Returns:
+            视频生成结果
+        """
+        start_time = time.time()
+        
+        while True:
+            if time.time() - start_time > timeout:
+                raise TimeoutError(f"任务 {task_id} 在 {timeout} 秒后超时")
+            
+            result = await self.acheck_task(task_id)
+            if result is not None:
+                return result
+            
+            await asyncio.sleep(polling_interval)
+    
+    async def adownload_video(self, video_url: str, output_path: Optional[str] = None) -> str:
+        """
+        异步下载生成的视频
+        
+        Args:
+            video_url: 视频URL
+            output_path: 保存路径，如果不提供则自动生成
+            
+        Returns:
+            视频保存的完整路径，下载失败时返回空字符串
+        """
+        output_path = self._prepare_output_path(video_url, output_path)
+        
+        try:
+            async with get_async_http_client().stream("GET", video_url) as response:
+                response.raise_for_status()
+                await get_blob_store().awrite_stream(response.aiter_bytes(), output_path)
+            
+            print(f"视频成功下载到: {output_path}")
+            return output_path
+        except httpx.HTTPError as e:
+            error_msg = f"下载视频失败: {str(e)}"
+            print(error_msg)
+            return ""
 
 def main():
     """示例使用方法"""
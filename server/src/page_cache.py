@@ -0,0 +1,310 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from typing import Optional, Dict, Any, Callable
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+class PageCache:
+    """
+    网页正文缓存
+    保存从URL提取的正文及响应的ETag/Last-Modified，过了新鲜期后用条件请求重新验证；
+    同时按URL保存译文，正文变化时译文自动作废。
+    结果保存在SQLite中，多个工作进程共享；总大小超出上限时淘汰最久未访问的条目
+    """
+
+    def __init__(self, db_path: str, max_bytes: int = 50 * 1024 * 1024, fresh_for: float = 300, enabled: bool = True):
+        """
+        初始化缓存
+
+        Args:
+            db_path: 数据库文件路径
+            max_bytes: 正文和译文的最大总字节数，0表示不限制
+            fresh_for: 新鲜期(秒)，期间直接使用缓存不发请求，过期后发送条件请求重新验证
+            enabled: 是否启用缓存
+        """
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.fresh_for = fresh_for
+        self.enabled = enabled
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.translation_hits = 0
+        self.evicted_count = 0
+        self._stats_lock = threading.Lock()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        # sqlite3连接不能跨线程共享，每个线程使用自己的连接
+        self._local = threading.local()
+
+        conn = self._get_conn()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS page_cache (
+                url TEXT PRIMARY KEY,
+                text TEXT NOT NULL,
+                translated TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_page_cache_accessed ON page_cache (accessed_at)")
+        conn.commit()
+
+    @classmethod
+    def from_env(cls) -> "PageCache":
+        """根据环境变量创建缓存"""
+        return cls(
+            db_path=os.getenv("PAGE_CACHE_PATH", os.path.join("data", "page_cache.db")),
+            max_bytes=int(os.getenv("PAGE_CACHE_MAX_BYTES", str(50 * 1024 * 1024))),
+            fresh_for=float(os.getenv("PAGE_CACHE_FRESH", "300")),
+            enabled=os.getenv("PAGE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+        )
+
+    def _get_conn(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name: str) -> None:
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        """
+        读取缓存的网页
+
+        Args:
+            url: 网页URL
+
+        Returns:
+            包含text、etag、last_modified、fetched_at和fresh（是否在新鲜期内）的字典，不存在时返回None
+        """
+        if not self.enabled:
+            return None
+        conn = self._get_conn()
+        row = conn.execute(
+            "SELECT text, etag, last_modified, fetched_at FROM page_cache WHERE url = ?", (url,)
+        ).fetchone()
+        if not row:
+            return None
+
+        now = time.time()
+        conn.execute("UPDATE page_cache SET accessed_at = ? WHERE url = ?", (now, url))
+        conn.commit()
+        return {
+            "text": row[0],
+            "etag": row[1],
+            "last_modified": row[2],
+            "fetched_at": row[3],
+            "fresh": now - row[3] < self.fresh_for
+        }
+
+    def put(self, url: str, text: str, etag: Optional[str] = None, last_modified: Optional[str] = None) -> None:
+        """
+        写入网页正文，正文与缓存不同时清除旧的译文，并按总大小淘汰最久未访问的条目
+
+        Args:
+            url: 网页URL
+            text: 提取的正文
+            etag: 响应的ETag
+            last_modified: 响应的Last-Modified
+        """
+        if not self.enabled:
+            return
+        now = time.time()
+        conn = self._get_conn()
+        conn.execute(
+            """
+            INSERT INTO page_cache (url, text, translated, etag, last_modified, size, fetched_at, accessed_at)
+            VALUES (?, ?, NULL, ?, ?, ?, ?, ?)
+            ON CONFLICT(url) DO UPDATE SET
+                translated = CASE WHEN page_cache.text = excluded.text THEN page_cache.translated ELSE NULL END,
+                size = CASE WHEN page_cache.text = excluded.text THEN page_cache.size ELSE excluded.size END,
+                text = excluded.text,
+                etag = excluded.etag,
+                last_modified = excluded.last_modified,
+                fetched_at = excluded.fetched_at,
+                accessed_at = excluded.accessed_at
+            """,
+            (url, text, etag, last_modified, len(text.encode("utf-8")), now, now)
+        )
+        self._evict(conn)
+        conn.commit()
+
+    def fetch(self, url: str, session: Any, extract: Callable[[Any], str],
+              headers: Optional[Dict[str, str]] = None, use_cache: bool = True) -> str:
+        """
+        读取网页正文，新鲜期内直接返回缓存；过期后带上ETag/Last-Modified发送条件请求，
+        服务器返回304时继续使用缓存的正文，否则重新提取并刷新缓存
+
+        Args:
+            url: 网页URL
+            session: requests会话
+            extract: 从响应中提取正文的函数
+            headers: 额外的请求头
+            use_cache: 是否读取缓存，为False时强制重新下载并用新结果刷新缓存
+
+        Returns:
+            网页正文
+        """
+        cached = self.get(url) if use_cache else None
+        if cached and cached["fresh"]:
+            self._count("hits")
+            logger.info(f"网页缓存命中: {url}")
+            return cached["text"]
+
+        request_headers = dict(headers or {})
+        if cached:
+            if cached["etag"]:
+                request_headers["If-None-Match"] = cached["etag"]
+            if cached["last_modified"]:
+                request_headers["If-Modified-Since"] = cached["last_modified"]
+
+        response = session.get(url, headers=request_headers)
+        if cached and response.status_code == 304:
+            self.mark_validated(url)
+            self._count("revalidated")
+            logger.info(f"网页未修改，使用缓存: {url}")
+            return cached["text"]
+
+        response.raise_for_status()
+        self._count("misses")
+        text = extract(response)
+        self.put(url, text, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        return text
+
+    def mark_validated(self, url: str) -> None:
+        """
+        条件请求返回304后刷新新鲜期
+
+        Args:
+            url: 网页URL
+        """
+        now = time.time()
+        conn = self._get_conn()
+        conn.execute("UPDATE page_cache SET fetched_at = ?, accessed_at = ? WHERE url = ?", (now, now, url))
+        conn.commit()
+
+    def get_translation(self, url: str, text: str) -> Optional[str]:
+        """
+        读取网页正文的译文
+
+        Args:
+            url: 网页URL
+            text: 需要翻译的正文，与缓存中的正文不同时视为没有译文
+
+        Returns:
+            译文，不存在时返回None
+        """
+        if not self.enabled:
+            return None
+        row = self._get_conn().execute(
+            "SELECT translated FROM page_cache WHERE url = ? AND text = ?", (url, text)
+        ).fetchone()
+        if row and row[0] is not None:
+            self._count("translation_hits")
+            return row[0]
+        return None
+
+    def put_translation(self, url: str, text: str, translated: str) -> None:
+        """
+        保存译文，只有缓存中的正文仍是被翻译的正文时才写入
+
+        Args:
+            url: 网页URL
+            text: 被翻译的正文
+            translated: 译文
+        """
+        if not self.enabled or not translated.strip():
+            return
+        conn = self._get_conn()
+        conn.execute(
+            "UPDATE page_cache SET translated = ?, size = ? WHERE url = ? AND text = ?",
+            (translated, len(text.encode("utf-8")) + len(translated.encode("utf-8")), url, text)
+        )
+        self._evict(conn)
+        conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        """总大小超出上限时按最久未访问的顺序淘汰条目"""
+        if not self.max_bytes:
+            return
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM page_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for url, size in conn.execute("SELECT url, size FROM page_cache ORDER BY accessed_at ASC").fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM page_cache WHERE url = ?", (url,))
+            total -= size
+            evicted += 1
+        self.evicted_count += evicted
+
+    def clear(self) -> int:
+        """
+        清空缓存
+
+        Returns:
+            删除的条目数量
+        """
+        conn = self._get_conn()
+        deleted = conn.execute("DELETE FROM page_cache").rowcount
+        conn.commit()
+        return deleted
+
+    def stats(self) -> Dict[str, Any]:
+        """返回缓存条目数、总大小和当前进程的命中统计"""
+        entries, total = self._get_conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM page_cache"
+        ).fetchone()
+        requests_total = self.hits + self.revalidated + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": entries,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "fresh_for": self.fresh_for,
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.revalidated) / requests_total, 4) if requests_total else 0.0,
+            "translation_hits": self.translation_hits,
+            "evicted_count": self.evicted_count
+        }
+
+# 单例实例
+_page_cache = None
+
+def get_page_cache() -> PageCache:
+    """
+    获取网页正文缓存实例（单例模式）
+
+    Returns:
+        PageCache实例
+    """
+    global _page_cache
+    if _page_cache is None:
+        _page_cache = PageCache.from_env()
+    return _page_cache
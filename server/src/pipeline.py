@@ -0,0 +1,177 @@
+import time
+import asyncio
+import inspect
+import logging
+import functools
+from enum import Enum
+from concurrent.futures import Executor
+from typing import Optional, Dict, Any, Callable, List, Sequence
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+class StageStatus(str, Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    SKIPPED = "skipped"
+
+class PipelineStage:
+    """流水线中的一个阶段"""
+
+    def __init__(self, name: str, fn: Callable[[Dict[str, Any]], Any], depends_on: Sequence[str] = ()):
+        """
+        初始化阶段
+
+        Args:
+            name: 阶段名称，在同一条流水线中唯一
+            fn: 阶段函数（普通函数或协程函数），参数为依赖阶段的结果字典 {阶段名称: 结果}
+            depends_on: 依赖的阶段名称
+        """
+        self.name = name
+        self.fn = fn
+        self.depends_on = list(depends_on)
+
+class Pipeline:
+    """
+    按依赖关系执行的流水线（有向无环图）
+    每个阶段在依赖全部完成后立即开始，互不依赖的分支并发执行；
+    普通函数在线程池中运行，协程函数直接在事件循环上运行。
+    某个阶段失败时依赖它的阶段被跳过，其余分支继续执行
+    """
+
+    def __init__(self,
+                 stages: List[PipelineStage],
+                 on_stage_change: Optional[Callable[["Pipeline"], None]] = None,
+                 executor: Optional[Executor] = None):
+        """
+        初始化流水线
+
+        Args:
+            stages: 阶段列表
+            on_stage_change: 阶段状态变化后的回调，参数为流水线本身，用于更新任务进度
+            executor: 运行普通函数的线程池，默认使用事件循环的默认线程池
+
+        Raises:
+            ValueError: 阶段名称重复、依赖不存在或存在循环依赖
+        """
+        self.stages = self._sort(stages)
+        self.on_stage_change = on_stage_change
+        self.executor = executor
+        self.results: Dict[str, Any] = {}
+        self.reports: Dict[str, Dict[str, Any]] = {
+            stage.name: {"status": StageStatus.PENDING.value, "depends_on": stage.depends_on}
+            for stage in self.stages
+        }
+        self.elapsed: Optional[float] = None
+        self._started: Optional[float] = None
+
+    @staticmethod
+    def _sort(stages: List[PipelineStage]) -> List[PipelineStage]:
+        """按依赖关系拓扑排序，同时检查阶段定义是否合法"""
+        by_name: Dict[str, PipelineStage] = {}
+        for stage in stages:
+            if stage.name in by_name:
+                raise ValueError(f"阶段名称重复: {stage.name}")
+            by_name[stage.name] = stage
+        for stage in stages:
+            for dep in stage.depends_on:
+                if dep not in by_name:
+                    raise ValueError(f"阶段 {stage.name} 依赖的阶段不存在: {dep}")
+
+        ordered: List[PipelineStage] = []
+        done = set()
+        visiting = set()
+
+        def visit(stage: PipelineStage):
+            if stage.name in done:
+                return
+            if stage.name in visiting:
+                raise ValueError(f"阶段存在循环依赖: {stage.name}")
+            visiting.add(stage.name)
+            for dep in stage.depends_on:
+                visit(by_name[dep])
+            visiting.discard(stage.name)
+            done.add(stage.name)
+            ordered.append(stage)
+
+        for stage in stages:
+            visit(stage)
+        return ordered
+
+    @property
+    def incomplete(self) -> List[str]:
+        """未成功完成的阶段名称"""
+        return [name for name, report in self.reports.items() if report["status"] != StageStatus.COMPLETED.value]
+
+    @property
+    def succeeded(self) -> bool:
+        """是否所有阶段都已完成"""
+        return not self.incomplete
+
+    def report(self) -> Dict[str, Any]:
+        """返回各阶段的状态和耗时"""
+        elapsed = self.elapsed
+        if elapsed is None and self._started is not None:
+            elapsed = time.monotonic() - self._started
+        return {
+            "stages": self.reports,
+            "elapsed": round(elapsed, 3) if elapsed is not None else None
+        }
+
+    def _update(self, name: str, **fields) -> None:
+        """更新阶段状态并通知回调，回调出错只记录日志"""
+        self.reports[name].update(fields)
+        if self.on_stage_change:
+            try:
+                self.on_stage_change(self)
+            except Exception as e:
+                logger.error(f"流水线进度回调失败: {str(e)}")
+
+    async def _call(self, fn: Callable, *args) -> Any:
+        """调用普通函数或协程函数，普通函数在线程池中运行"""
+        if inspect.iscoroutinefunction(fn):
+            return await fn(*args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(fn, *args))
+
+    async def _run_stage(self, stage: PipelineStage, tasks: Dict[str, "asyncio.Task"]) -> bool:
+        """等待依赖完成后运行一个阶段，返回是否成功"""
+        for dep in stage.depends_on:
+            if not await tasks[dep]:
+                self._update(stage.name, status=StageStatus.SKIPPED.value, error=f"依赖的阶段 {dep} 未完成")
+                return False
+
+        started = time.monotonic()
+        self._update(stage.name, status=StageStatus.RUNNING.value, started_at=round(started - self._started, 3))
+        try:
+            result = await self._call(stage.fn, {dep: self.results[dep] for dep in stage.depends_on})
+        except Exception as e:
+            logger.error(f"流水线阶段 {stage.name} 失败: {str(e)}")
+            self._update(stage.name, status=StageStatus.FAILED.value, error=str(e),
+                         elapsed=round(time.monotonic() - started, 3))
+            return False
+
+        self.results[stage.name] = result
+        self._update(stage.name, status=StageStatus.COMPLETED.value, elapsed=round(time.monotonic() - started, 3))
+        return True
+
+    async def run(self) -> Dict[str, Any]:
+        """
+        执行流水线
+
+        Returns:
+            各阶段的结果字典 {阶段名称: 结果}，只包含成功的阶段
+        """
+        self._started = time.monotonic()
+        tasks: Dict[str, asyncio.Task] = {}
+        # 按拓扑顺序创建，保证创建阶段任务时其依赖的任务已经存在
+        for stage in self.stages:
+            tasks[stage.name] = asyncio.ensure_future(self._run_stage(stage, tasks))
+        try:
+            await asyncio.gather(*tasks.values())
+        finally:
+            self.elapsed = time.monotonic() - self._started
+        return self.results
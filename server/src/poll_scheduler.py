@@ -0,0 +1,266 @@
+import os
+import time
+import random
+import asyncio
+import inspect
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Callable, List
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+class PollEntry:
+    """一个正在轮询的远程任务"""
+
+    def __init__(self,
+                 key: str,
+                 check: Callable[[], Any],
+                 on_complete: Callable[[Any], Any],
+                 on_error: Callable[[Exception], Any],
+                 interval: float,
+                 timeout: float):
+        self.key = key
+        self.check = check
+        self.on_complete = on_complete
+        self.on_error = on_error
+        self.interval = interval
+        self.deadline = time.monotonic() + timeout
+        self.timeout = timeout
+        # 首次查询加入随机抖动，把同时提交的任务错开
+        self.next_at = time.monotonic() + interval * random.uniform(0.5, 1.0)
+        self.checking = False
+        self.attempts = 0
+
+class PollScheduler:
+    """
+    远程任务集中轮询调度器
+    所有海螺/Kling远程任务都登记在一个asyncio循环里，每轮把到期的任务合并查询，
+    查询间隔按指数退避逐渐拉长并加入抖动，任务结束后触发回调写回任务存储。
+    这样上千个在途任务只占用少量协程和一个小线程池，而不是每个任务一个阻塞线程
+    """
+
+    def __init__(self,
+                 max_concurrency: int = 16,
+                 min_interval: float = 2.0,
+                 max_interval: float = 30.0,
+                 backoff: float = 1.5,
+                 callback_workers: int = 4,
+                 wakeup_interval: float = 1.0):
+        """
+        初始化轮询调度器
+
+        Args:
+            max_concurrency: 同时进行的状态查询数量上限
+            min_interval: 默认的首次查询间隔(秒)
+            max_interval: 退避后的最大查询间隔(秒)
+            backoff: 每次查询仍未完成时间隔的放大倍数
+            callback_workers: 执行同步查询和完成回调（如下载视频）的线程数
+            wakeup_interval: 检查共享唤醒通知的间隔(秒)
+        """
+        self.max_concurrency = max_concurrency
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.wakeup_interval = wakeup_interval
+        # 读取其他进程收到的唤醒通知的函数，参数为本进程正在轮询的任务，返回需要立即查询的任务
+        self.wakeup_source: Optional[Callable[[List[str]], List[str]]] = None
+        self._next_wakeup_check = 0.0
+
+        self._entries: Dict[str, PollEntry] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._runner: Optional[asyncio.Task] = None
+        self._check_pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="poll-check")
+        self._callback_pool = ThreadPoolExecutor(max_workers=callback_workers, thread_name_prefix="poll-callback")
+        self.completed_count = 0
+        self.failed_count = 0
+
+    @classmethod
+    def from_env(cls) -> "PollScheduler":
+        """根据环境变量创建调度器"""
+        return cls(
+            max_concurrency=int(os.getenv("POLL_MAX_CONCURRENCY", "16")),
+            min_interval=float(os.getenv("POLL_MIN_INTERVAL", "2")),
+            max_interval=float(os.getenv("POLL_MAX_INTERVAL", "30")),
+            callback_workers=int(os.getenv("POLL_CALLBACK_WORKERS", "4")),
+            wakeup_interval=float(os.getenv("POLL_WAKEUP_INTERVAL", "1"))
+        )
+
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        """
+        在事件循环中启动调度器
+
+        Args:
+            loop: 事件循环，默认为当前运行的事件循环
+        """
+        if self._runner is not None and not self._runner.done():
+            return
+        self._loop = loop or asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._runner = self._loop.create_task(self._run())
+        logger.info("远程任务轮询调度器已启动")
+
+    def watch(self,
+              key: str,
+              check: Callable[[], Any],
+              on_complete: Callable[[Any], Any],
+              on_error: Callable[[Exception], Any],
+              interval: Optional[float] = None,
+              timeout: float = 600) -> None:
+        """
+        登记一个需要轮询的远程任务，可以在任意线程中调用
+
+        Args:
+            key: 远程任务的唯一标识，例如 "minimaxi_video:<provider_task_id>"
+            check: 查询一次状态的函数（普通函数或协程函数），完成时返回结果，
+                   仍在进行中返回None，失败时抛出异常
+            on_complete: 完成回调，参数为check的返回值
+            on_error: 失败或超时回调，参数为异常
+            interval: 首次查询间隔(秒)，默认为min_interval
+            timeout: 超时时间(秒)
+        """
+        if self._loop is None:
+            raise RuntimeError("轮询调度器尚未启动")
+
+        entry = PollEntry(key, check, on_complete, on_error, interval or self.min_interval, timeout)
+        self._loop.call_soon_threadsafe(self._add, entry)
+
+    def _add(self, entry: PollEntry) -> None:
+        self._entries[entry.key] = entry
+        self._wakeup.set()
+
+    def poke(self, key: str) -> bool:
+        """
+        让指定任务尽快查询一次（例如收到了提供方的回调通知），可以在任意线程中调用。
+        回调通知的内容不可信，只作为唤醒信号，结果总是通过check向提供方查询
+
+        Args:
+            key: 远程任务标识
+
+        Returns:
+            任务是否仍在轮询中
+        """
+        if self._loop is None or key not in self._entries:
+            return False
+
+        def _poke():
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.next_at = time.monotonic()
+                self._wakeup.set()
+
+        self._loop.call_soon_threadsafe(_poke)
+        return True
+
+    async def _check_wakeups(self) -> None:
+        """读取共享的唤醒通知（回调通知可能落到其他工作进程），立即查询对应的任务"""
+        try:
+            keys = await self._loop.run_in_executor(self._check_pool, self.wakeup_source, list(self._entries))
+        except Exception as e:
+            logger.warning(f"读取唤醒通知失败: {str(e)}")
+            return
+        for key in keys:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.next_at = time.monotonic()
+                self._wakeup.set()
+
+    async def _run(self) -> None:
+        """主循环：每轮合并查询所有到期的任务"""
+        while True:
+            now = time.monotonic()
+            if self.wakeup_source is not None and self._entries and now >= self._next_wakeup_check:
+                self._next_wakeup_check = now + self.wakeup_interval
+                self._loop.create_task(self._check_wakeups())
+            due = [e for e in self._entries.values() if not e.checking and e.next_at <= now]
+            for entry in due:
+                entry.checking = True
+                self._loop.create_task(self._check(entry))
+
+            pending = [e.next_at for e in self._entries.values() if not e.checking]
+            if self.wakeup_source is not None and self._entries:
+                pending.append(self._next_wakeup_check)
+            delay = max(0.05, min(pending) - time.monotonic()) if pending else self.max_interval
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _call(self, fn: Callable, *args, pool: ThreadPoolExecutor) -> Any:
+        """调用普通函数或协程函数，普通函数在线程池中运行"""
+        if inspect.iscoroutinefunction(fn):
+            return await fn(*args)
+        return await self._loop.run_in_executor(pool, fn, *args)
+
+    async def _check(self, entry: PollEntry) -> None:
+        """查询一次远程任务状态"""
+        result = None
+        error = None
+        async with self._semaphore:
+            try:
+                entry.attempts += 1
+                result = await self._call(entry.check, pool=self._check_pool)
+            except Exception as e:
+                error = e
+
+        # 查询期间同一个键被重新登记时，旧的查询结果不再处理
+        if self._entries.get(entry.key) is not entry:
+            return
+
+        if error is None and result is None:
+            if time.monotonic() > entry.deadline:
+                error = TimeoutError(f"远程任务 {entry.key} 在 {entry.timeout} 秒后超时")
+            else:
+                entry.interval = min(self.max_interval, entry.interval * self.backoff)
+                entry.next_at = time.monotonic() + entry.interval * random.uniform(0.8, 1.2)
+                entry.checking = False
+                self._wakeup.set()
+                return
+
+        self._entries.pop(entry.key, None)
+        await self._finish(entry, result, error)
+
+    async def _finish(self, entry: PollEntry, result: Any, error: Optional[Exception]) -> None:
+        """触发完成或失败回调"""
+        try:
+            if error is None:
+                self.completed_count += 1
+                logger.info(f"远程任务 {entry.key} 已完成，共查询 {entry.attempts} 次")
+                await self._call(entry.on_complete, result, pool=self._callback_pool)
+            else:
+                self.failed_count += 1
+                logger.error(f"远程任务 {entry.key} 失败: {str(error)}")
+                await self._call(entry.on_error, error, pool=self._callback_pool)
+        except Exception as e:
+            logger.error(f"远程任务 {entry.key} 回调执行失败: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """返回调度器运行情况"""
+        return {
+            "watching": len(self._entries),
+            "completed": self.completed_count,
+            "failed": self.failed_count
+        }
+
+# 单例实例
+_poll_scheduler = None
+
+def get_poll_scheduler() -> PollScheduler:
+    """
+    获取轮询调度器实例（单例模式）
+
+    Returns:
+        PollScheduler实例
+    """
+    global _poll_scheduler
+    if _poll_scheduler is None:
+        _poll_scheduler = PollScheduler.from_env()
+    return _poll_scheduler
@@ -0,0 +1,95 @@
+import os
+import codecs
+import logging
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+class ProgressiveFileWriter:
+    """
+    渐进式文件写入器
+    流式生成HTML时每收到一段文本就追加并刷新到磁盘，
+    其他连接（包括其他工作进程）可以在生成过程中读取已写入的部分
+    """
+
+    def __init__(self, path: str):
+        """
+        初始化写入器
+
+        Args:
+            path: 输出文件路径，所在目录不存在时自动创建
+        """
+        self.path = path
+        self.size = 0
+        self._file = None
+
+    def open(self) -> "ProgressiveFileWriter":
+        """创建（或清空）输出文件"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, "w", encoding="utf-8")
+        return self
+
+    def write(self, text: str) -> None:
+        """
+        追加一段文本并立即刷新
+
+        Args:
+            text: 文本片段
+        """
+        if not text:
+            return
+        self._file.write(text)
+        self._file.flush()
+        self.size += len(text)
+
+    def close(self) -> None:
+        """关闭文件"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> "ProgressiveFileWriter":
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+class ProgressiveFileReader:
+    """
+    渐进式文件读取器
+    记住上次读到的位置，每次只返回新写入的内容；
+    按增量方式解码UTF-8，多字节字符被截断在两次读取之间时不会出现乱码
+    """
+
+    def __init__(self, path: str):
+        """
+        初始化读取器
+
+        Args:
+            path: 正在写入的文件路径
+        """
+        self.path = path
+        self.offset = 0
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    def read_new(self, final: bool = False) -> str:
+        """
+        读取自上次以来新写入的内容
+
+        Args:
+            final: 写入是否已经结束，为True时输出解码器中剩余的字节
+
+        Returns:
+            新增的文本，文件不存在或没有新内容时返回空字符串
+        """
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(self.offset)
+                data = f.read()
+        except FileNotFoundError:
+            data = b""
+        self.offset += len(data)
+        return self._decoder.decode(data, final=final)
@@ -0,0 +1,301 @@
+"""
+服务启动耗时基准，测量导入耗时（按模块统计，同 python -X importtime）、应用构建耗时和从启动进程到 /health 可用的耗时，
+并可与预算文件比较，启动变慢时以非零状态退出，用于CI中防止启动时间回退。
+
+测量并输出结果:
+    python -m src.startup_benchmark --runs 3
+
+与预算比较（超出预算时退出码为1）:
+    python -m src.startup_benchmark --check
+
+按当前结果重新生成预算（在测量值上乘以余量系数）:
+    python -m src.startup_benchmark --write-budget --margin 1.5
+
+每次测量都在新的子进程中进行，避免模块缓存影响结果，取多次运行的中位数；
+子进程在临时目录中运行，服务启动时创建的输出目录和数据库不会留在代码目录中。
+"""
+import os
+import sys
+import json
+import time
+import socket
+import logging
+import argparse
+import statistics
+import tempfile
+import subprocess
+from typing import Dict, Any, List, Optional
+
+import requests
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# server目录，加入子进程的PYTHONPATH，与 uvicorn src.api_service:app 的启动方式一致
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BUDGET_PATH = os.path.join(SERVER_DIR, "startup_budget.json")
+
+# 在子进程中分别计时导入src包和导入api_service（后者包括创建应用、注册路由和初始化各个存储）
+_APP_TIMING_SCRIPT = """
+import sys, time, json
+started = time.perf_counter()
+import src
+package_loaded = time.perf_counter()
+import src.api_service
+app_loaded = time.perf_counter()
+print(json.dumps({
+    "package_import": package_loaded - started,
+    "app_construction": app_loaded - package_loaded,
+    "total_import": app_loaded - started,
+    "modules": sorted(sys.modules)
+}))
+"""
+
+def _subprocess_env() -> Dict[str, str]:
+    """子进程的环境变量，保证能导入src包"""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [SERVER_DIR, env.get("PYTHONPATH")]))
+    return env
+
+def measure_import_times(cwd: str, top: int = 15) -> Dict[str, float]:
+    """
+    用 -X importtime 测量导入 src.api_service 时各模块的累计导入耗时
+
+    Args:
+        cwd: 子进程的工作目录
+        top: 除src模块外，额外保留耗时最多的顶层第三方包数量
+
+    Returns:
+        {模块名称: 累计耗时(秒)}，包括所有src模块和耗时最多的顶层第三方包
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import src.api_service"],
+        cwd=cwd, env=_subprocess_env(), capture_output=True, text=True, check=True
+    )
+    times: Dict[str, float] = {}
+    for line in result.stderr.splitlines():
+        # 格式: import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2].strip()
+        cumulative = int(parts[1].strip()) / 1e6
+        times[name] = max(times.get(name, 0.0), cumulative)
+
+    own = {name: t for name, t in times.items() if name == "src" or name.startswith("src.")}
+    third_party = sorted(
+        ((name, t) for name, t in times.items() if "." not in name and name not in own),
+        key=lambda item: item[1],
+        reverse=True
+    )[:top]
+    return {**own, **dict(third_party)}
+
+def measure_app_construction(cwd: str) -> Dict[str, Any]:
+    """
+    测量导入src包和构建应用的耗时
+
+    Args:
+        cwd: 子进程的工作目录
+
+    Returns:
+        包含package_import、app_construction、total_import(秒)和已加载模块列表modules的字典
+    """
+    result = subprocess.run(
+        [sys.executable, "-c", _APP_TIMING_SCRIPT],
+        cwd=cwd, env=_subprocess_env(), capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def _free_port() -> int:
+    """获取一个空闲端口"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def measure_time_to_health(cwd: str, timeout: float = 60) -> float:
+    """
+    启动uvicorn进程，测量从启动到 /health 第一次返回200的耗时
+
+    Args:
+        cwd: 子进程的工作目录
+        timeout: 最长等待时间(秒)
+
+    Returns:
+        耗时(秒)
+
+    Raises:
+        RuntimeError: 服务进程提前退出或超时
+    """
+    port = _free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.api_service:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=cwd, env=_subprocess_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        url = f"http://127.0.0.1:{port}/health"
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"服务进程提前退出，退出码: {process.returncode}")
+            try:
+                if requests.get(url, timeout=1).status_code == 200:
+                    return time.perf_counter() - started
+            except requests.RequestException:
+                pass
+            time.sleep(0.02)
+        raise RuntimeError(f"等待 /health 超时({timeout}秒)")
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+def run_benchmark(runs: int = 3, top: int = 15) -> Dict[str, Any]:
+    """
+    多次测量并取中位数
+
+    Args:
+        runs: 测量次数
+        top: 输出的顶层第三方包数量
+
+    Returns:
+        测量结果，时间单位为秒
+    """
+    import_runs: List[Dict[str, float]] = []
+    app_runs: List[Dict[str, Any]] = []
+    health_runs: List[float] = []
+    for i in range(runs):
+        # 每次使用新的工作目录，测量的是首次启动（需要创建目录和数据库）的耗时
+        with tempfile.TemporaryDirectory(prefix="startup-benchmark-") as cwd:
+            import_runs.append(measure_import_times(cwd, top))
+            app_runs.append(measure_app_construction(cwd))
+            health_runs.append(measure_time_to_health(cwd))
+        logger.info(f"第{i + 1}/{runs}次: 导入 {app_runs[-1]['total_import']:.3f}秒, /health {health_runs[-1]:.3f}秒")
+
+    def median(values: List[float]) -> float:
+        return round(statistics.median(values), 4)
+
+    module_names = sorted({name for run in import_runs for name in run})
+    return {
+        "runs": runs,
+        "package_import": median([run["package_import"] for run in app_runs]),
+        "app_construction": median([run["app_construction"] for run in app_runs]),
+        "total_import": median([run["total_import"] for run in app_runs]),
+        "time_to_health": median(health_runs),
+        "modules": {
+            name: median([run.get(name, 0.0) for run in import_runs])
+            for name in sorted(module_names, key=lambda n: -max(run.get(n, 0.0) for run in import_runs))
+        },
+        "loaded_modules": app_runs[-1]["modules"]
+    }
+
+def check_budget(result: Dict[str, Any], budget: Dict[str, Any]) -> List[str]:
+    """
+    与预算比较
+
+    Args:
+        result: run_benchmark的结果
+        budget: 预算，total_import/app_construction/time_to_health为秒数上限，
+                modules为各模块的导入耗时上限，forbidden_modules为启动时不允许加载的模块
+
+    Returns:
+        超出预算的项目说明，为空表示全部满足
+    """
+    violations = []
+    for key in ("package_import", "app_construction", "total_import", "time_to_health"):
+        limit = budget.get(key)
+        if limit is not None and result[key] > limit:
+            violations.append(f"{key}: {result[key]:.3f}秒 超出预算 {limit:.3f}秒")
+    for name, limit in budget.get("modules", {}).items():
+        value = result["modules"].get(name)
+        if value is not None and value > limit:
+            violations.append(f"导入 {name}: {value:.3f}秒 超出预算 {limit:.3f}秒")
+    loaded = set(result["loaded_modules"])
+    for name in budget.get("forbidden_modules", []):
+        if name in loaded:
+            violations.append(f"启动时加载了不应加载的模块: {name}")
+    return violations
+
+def build_budget(result: Dict[str, Any], margin: float, previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    根据测量结果生成预算，保留原预算中的forbidden_modules
+
+    Args:
+        result: run_benchmark的结果
+        margin: 余量系数，预算为测量值乘以该系数
+        previous: 原预算
+
+    Returns:
+        新的预算
+    """
+    budget = {
+        key: round(result[key] * margin, 3)
+        for key in ("total_import", "app_construction", "time_to_health")
+    }
+    budget["modules"] = {
+        name: round(value * margin, 3)
+        for name, value in result["modules"].items()
+        if name == "src.api_service" or name == "src"
+    }
+    budget["forbidden_modules"] = (previous or {}).get("forbidden_modules", [])
+    return budget
+
+def _print_report(result: Dict[str, Any]) -> None:
+    """输出易读的测量结果"""
+    print(f"测量次数:          {result['runs']}（取中位数）")
+    print(f"导入src包:         {result['package_import']:.3f}秒")
+    print(f"构建应用:          {result['app_construction']:.3f}秒")
+    print(f"导入合计:          {result['total_import']:.3f}秒")
+    print(f"启动到/health可用: {result['time_to_health']:.3f}秒")
+    print("模块导入耗时（累计）:")
+    for name, value in result["modules"].items():
+        print(f"  {value:8.3f}秒  {name}")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="测量服务启动耗时，并可与预算比较")
+    parser.add_argument("--runs", type=int, default=3, help="测量次数，取中位数")
+    parser.add_argument("--top", type=int, default=15, help="输出耗时最多的顶层第三方包数量")
+    parser.add_argument("--budget", type=str, default=DEFAULT_BUDGET_PATH, help="预算文件路径")
+    parser.add_argument("--check", action="store_true", help="与预算比较，超出时退出码为1")
+    parser.add_argument("--write-budget", action="store_true", help="按本次测量结果写入预算文件")
+    parser.add_argument("--margin", type=float, default=1.5, help="写入预算时的余量系数")
+    parser.add_argument("--json", action="store_true", help="以JSON格式输出测量结果")
+    args = parser.parse_args(argv)
+
+    result = run_benchmark(runs=args.runs, top=args.top)
+    if args.json:
+        print(json.dumps({k: v for k, v in result.items() if k != "loaded_modules"}, ensure_ascii=False, indent=2))
+    else:
+        _print_report(result)
+
+    previous = None
+    if os.path.exists(args.budget):
+        with open(args.budget, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+
+    if args.write_budget:
+        budget = build_budget(result, args.margin, previous)
+        with open(args.budget, "w", encoding="utf-8") as f:
+            json.dump(budget, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"预算已写入: {args.budget}")
+
+    if args.check:
+        if previous is None:
+            print(f"预算文件不存在: {args.budget}")
+            return 1
+        violations = check_budget(result, previous)
+        if violations:
+            print("启动耗时超出预算:")
+            for violation in violations:
+                print(f"  - {violation}")
+            return 1
+        print("启动耗时在预算之内")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+import asyncio
+import threading
+import logging
+from typing import Optional, Dict, Any, Iterable, Set
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+class TaskSubscription:
+    """
+    任务事件订阅
+    每个SSE连接或WebSocket连接持有一个订阅，事件通过asyncio队列投递到订阅者所在的事件循环
+    """
+
+    def __init__(self, bus: "TaskEventBus", task_ids: Optional[Iterable[str]] = None):
+        """
+        初始化订阅
+
+        Args:
+            bus: 所属的事件总线
+            task_ids: 关注的任务ID，为None时接收所有任务的事件
+        """
+        self.bus = bus
+        self.task_ids: Optional[Set[str]] = set(task_ids) if task_ids is not None else None
+        self.loop = asyncio.get_running_loop()
+        self.queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+
+    def add(self, task_id: str) -> None:
+        """增加关注的任务"""
+        if self.task_ids is not None:
+            self.task_ids.add(task_id)
+
+    def discard(self, task_id: str) -> None:
+        """取消关注的任务"""
+        if self.task_ids is not None:
+            self.task_ids.discard(task_id)
+
+    def wants(self, task_id: str) -> bool:
+        """判断是否关注该任务"""
+        return self.task_ids is None or task_id in self.task_ids
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        等待下一个任务事件
+
+        Args:
+            timeout: 超时时间(秒)
+
+        Returns:
+            任务数据，超时返回None
+        """
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self) -> None:
+        """取消订阅"""
+        self.bus.unsubscribe(self)
+
+    def __enter__(self) -> "TaskSubscription":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+class TaskEventBus:
+    """
+    进程内任务事件总线
+    update_task_status在工作线程中调用publish，事件被线程安全地转发到各订阅者的事件循环。
+    其他工作进程产生的事件无法通过总线收到，订阅方需要定期回查任务存储作为兜底
+    """
+
+    def __init__(self):
+        self._subscriptions: Set[TaskSubscription] = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, task_ids: Optional[Iterable[str]] = None) -> TaskSubscription:
+        """
+        创建订阅，必须在事件循环中调用
+
+        Args:
+            task_ids: 关注的任务ID，为None时接收所有任务的事件
+
+        Returns:
+            订阅对象
+        """
+        subscription = TaskSubscription(self, task_ids)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: TaskSubscription) -> None:
+        """取消订阅"""
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, task: Dict[str, Any]) -> None:
+        """
+        发布任务状态变化，可以在任意线程中调用
+
+        Args:
+            task: 任务数据，需要包含task_id
+        """
+        task_id = task.get("task_id")
+        with self._lock:
+            targets = [s for s in self._subscriptions if s.wants(task_id)]
+
+        for subscription in targets:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.queue.put_nowait, task)
+            except RuntimeError:
+                # 事件循环已关闭，订阅已失效
+                self.unsubscribe(subscription)
+
+# 单例实例
+_task_event_bus = None
+
+def get_task_event_bus() -> TaskEventBus:
+    """
+    获取任务事件总线实例（单例模式）
+
+    Returns:
+        TaskEventBus实例
+    """
+    global _task_event_bus
+    if _task_event_bus is None:
+        _task_event_bus = TaskEventBus()
+    return _task_event_bus
@@ -0,0 +1,745 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import logging
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple, List
+from pydantic import BaseModel, Field
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 已结束（不会再变化）的任务状态
+FINISHED_STATUSES = ("completed", "failed")
+
+class RetentionPolicy(BaseModel):
+    """任务保留策略，字段为None时表示不启用该项限制"""
+    max_age_seconds: Optional[float] = Field(default=7 * 24 * 3600, description="已结束任务的最长保留时间(秒)")
+    max_finished: Optional[int] = Field(default=5000, description="最多保留的已结束任务数量，超出时先淘汰最早结束的")
+    lru_capacity: Optional[int] = Field(default=20000, description="任务总数上限，超出时淘汰最久未访问的任务")
+
+    @classmethod
+    def from_env(cls) -> "RetentionPolicy":
+        """从环境变量读取保留策略，设置为0表示不限制"""
+        def _read(name: str, default, cast):
+            value = os.getenv(name)
+            if value is None or value == "":
+                return default
+            value = cast(value)
+            return value if value > 0 else None
+
+        defaults = cls()
+        return cls(
+            max_age_seconds=_read("TASK_RETENTION_MAX_AGE", defaults.max_age_seconds, float),
+            max_finished=_read("TASK_RETENTION_MAX_COUNT", defaults.max_finished, int),
+            lru_capacity=_read("TASK_RETENTION_LRU_CAPACITY", defaults.lru_capacity, int)
+        )
+
+class TaskStore:
+    """
+    任务存储后端接口
+    任务以可JSON序列化的字典形式保存，所有后端都需要实现以下方法，
+    以便多个工作进程（或多个节点）共享同一份任务状态
+    """
+
+    # 按保留策略淘汰的任务累计数量（当前进程）
+    evicted_count: int = 0
+    retention: RetentionPolicy = RetentionPolicy()
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """
+        读取任务
+
+        Args:
+            task_id: 任务ID
+
+        Returns:
+            任务数据，不存在时返回None
+        """
+        raise NotImplementedError
+
+    def put(self, task_id: str, data: Dict[str, Any]) -> None:
+        """
+        写入（新增或覆盖）任务
+
+        Args:
+            task_id: 任务ID
+            data: 任务数据
+        """
+        raise NotImplementedError
+
+    def delete(self, task_id: str) -> bool:
+        """
+        删除任务
+
+        Args:
+            task_id: 任务ID
+
+        Returns:
+            任务存在并被删除时返回True
+        """
+        raise NotImplementedError
+
+    def count(self) -> int:
+        """返回当前保存的任务数量"""
+        raise NotImplementedError
+
+    def claim_key(self, key: str, value: str, ttl: float) -> Optional[str]:
+        """
+        原子地登记一个键（例如请求合并键、幂等键），键已存在且未过期时不覆盖
+
+        Args:
+            key: 键
+            value: 值，通常是任务ID
+            ttl: 有效期(秒)
+
+        Returns:
+            登记成功返回None，键已被占用时返回已有的值
+        """
+        raise NotImplementedError
+
+    def get_key(self, key: str) -> Optional[str]:
+        """
+        读取一个键
+
+        Args:
+            key: 键
+
+        Returns:
+            键的值，不存在或已过期时返回None
+        """
+        raise NotImplementedError
+
+    def list_keys(self, prefix: str) -> Dict[str, str]:
+        """
+        列出指定前缀的所有未过期的键
+
+        Args:
+            prefix: 键前缀
+
+        Returns:
+            键 -> 值
+        """
+        raise NotImplementedError
+
+    def set_key(self, key: str, value: str, ttl: float) -> None:
+        """
+        写入（覆盖）一个键
+
+        Args:
+            key: 键
+            value: 值
+            ttl: 有效期(秒)
+        """
+        raise NotImplementedError
+
+    def release_key(self, key: str, value: Optional[str] = None) -> bool:
+        """
+        删除一个键
+
+        Args:
+            key: 键
+            value: 仅当键的当前值等于value时才删除，为None时无条件删除
+
+        Returns:
+            键被删除时返回True
+        """
+        raise NotImplementedError
+
+    def _evict(self, now: float) -> int:
+        """
+        按保留策略删除过期任务，由各后端实现
+        只淘汰已结束的任务，等待中和处理中的任务即使超出数量上限也会保留
+
+        Args:
+            now: 当前时间戳
+
+        Returns:
+            本次删除的任务数量
+        """
+        raise NotImplementedError
+
+    def compact(self) -> int:
+        """
+        执行一次压缩，按保留策略淘汰任务
+
+        Returns:
+            本次淘汰的任务数量
+        """
+        evicted = self._evict(time.time())
+        if evicted:
+            self.evicted_count += evicted
+            logger.info(f"任务存储压缩完成，淘汰 {evicted} 个任务，累计淘汰 {self.evicted_count} 个")
+        return evicted
+
+    def start_compaction(self, interval: float = 300) -> threading.Thread:
+        """
+        启动后台压缩线程，定期按保留策略淘汰任务
+
+        Args:
+            interval: 压缩间隔(秒)
+
+        Returns:
+            后台线程
+        """
+        existing = getattr(self, "_compaction_thread", None)
+        if existing is not None and existing.is_alive():
+            return existing
+
+        def _run():
+            while True:
+                try:
+                    self.compact()
+                except Exception as e:
+                    logger.error(f"任务存储压缩失败: {str(e)}")
+                time.sleep(interval)
+
+        self._compaction_thread = threading.Thread(target=_run, name="task-store-compaction", daemon=True)
+        self._compaction_thread.start()
+        logger.info(f"任务存储后台压缩已启动，间隔 {interval} 秒")
+        return self._compaction_thread
+
+class MemoryTaskStore(TaskStore):
+    """进程内存任务存储，仅适用于单进程开发调试"""
+
+    def __init__(self, retention: Optional[RetentionPolicy] = None):
+        # 按访问顺序排列，最久未访问的任务在最前面
+        self._tasks: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._updated_at: Dict[str, float] = {}
+        # 键 -> (值, 过期时间)
+        self._keys: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+        self.retention = retention or RetentionPolicy()
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            data = self._tasks.get(task_id)
+            if data is None:
+                return None
+            self._tasks.move_to_end(task_id)
+            return dict(data)
+
+    def put(self, task_id: str, data: Dict[str, Any]) -> None:
+        with self._lock:
+            self._tasks[task_id] = dict(data)
+            self._tasks.move_to_end(task_id)
+            self._updated_at[task_id] = time.time()
+
+    def delete(self, task_id: str) -> bool:
+        with self._lock:
+            self._updated_at.pop(task_id, None)
+            return self._tasks.pop(task_id, None) is not None
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._tasks)
+
+    def claim_key(self, key: str, value: str, ttl: float) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            existing = self._keys.get(key)
+            if existing is not None and existing[1] > now:
+                return existing[0]
+            self._keys[key] = (value, now + ttl)
+            return None
+
+    def get_key(self, key: str) -> Optional[str]:
+        with self._lock:
+            existing = self._keys.get(key)
+            if existing is None or existing[1] <= time.time():
+                return None
+            return existing[0]
+
+    def list_keys(self, prefix: str) -> Dict[str, str]:
+        now = time.time()
+        with self._lock:
+            return {
+                key: value for key, (value, expires_at) in self._keys.items()
+                if key.startswith(prefix) and expires_at > now
+            }
+
+    def set_key(self, key: str, value: str, ttl: float) -> None:
+        with self._lock:
+            self._keys[key] = (value, time.time() + ttl)
+
+    def release_key(self, key: str, value: Optional[str] = None) -> bool:
+        with self._lock:
+            existing = self._keys.get(key)
+            if existing is None or (value is not None and existing[0] != value):
+                return False
+            del self._keys[key]
+            return True
+
+    def _evict(self, now: float) -> int:
+        policy = self.retention
+        with self._lock:
+            finished = [
+                task_id for task_id, data in self._tasks.items()
+                if data.get("status") in FINISHED_STATUSES
+            ]
+            expired = set()
+
+            if policy.max_age_seconds is not None:
+                expired.update(
+                    task_id for task_id in finished
+                    if now - self._updated_at.get(task_id, now) > policy.max_age_seconds
+                )
+
+            if policy.max_finished is not None:
+                remaining = [task_id for task_id in finished if task_id not in expired]
+                overflow = len(remaining) - policy.max_finished
+                if overflow > 0:
+                    remaining.sort(key=lambda task_id: self._updated_at.get(task_id, 0))
+                    expired.update(remaining[:overflow])
+
+            for task_id in expired:
+                self._tasks.pop(task_id, None)
+                self._updated_at.pop(task_id, None)
+
+            for key in [key for key, (_, expires_at) in self._keys.items() if expires_at <= now]:
+                del self._keys[key]
+
+            evicted = len(expired)
+            if policy.lru_capacity is not None:
+                overflow = len(self._tasks) - policy.lru_capacity
+                if overflow > 0:
+                    # 按访问顺序淘汰已结束的任务，跳过仍在进行中的任务
+                    lru = [
+                        task_id for task_id, data in self._tasks.items()
+                        if data.get("status") in FINISHED_STATUSES
+                    ][:overflow]
+                    for task_id in lru:
+                        del self._tasks[task_id]
+                        self._updated_at.pop(task_id, None)
+                    evicted += len(lru)
+
+            return evicted
+
+class SQLiteTaskStore(TaskStore):
+    """
+    基于SQLite(WAL模式)的任务存储
+    多个uvicorn工作进程可以同时读写同一个数据库文件，服务重启后任务也不会丢失
+    """
+
+    # 访问时间的记录粒度(秒)，避免每次轮询都产生一次写操作
+    ACCESS_GRANULARITY = 60
+
+    def __init__(self, db_path: str, retention: Optional[RetentionPolicy] = None):
+        """
+        初始化SQLite任务存储
+
+        Args:
+            db_path: 数据库文件路径
+            retention: 任务保留策略
+        """
+        self.db_path = db_path
+        self.retention = retention or RetentionPolicy()
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        # sqlite3连接不能跨线程共享，每个线程使用自己的连接
+        self._local = threading.local()
+
+        conn = self._get_conn()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tasks (
+                task_id TEXT PRIMARY KEY,
+                status TEXT,
+                data TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                accessed_at REAL NOT NULL DEFAULT 0
+            )
+            """
+        )
+        # 兼容没有accessed_at列的旧数据库
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(tasks)")]
+        if "accessed_at" not in columns:
+            conn.execute("ALTER TABLE tasks ADD COLUMN accessed_at REAL NOT NULL DEFAULT 0")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status_updated ON tasks (status, updated_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_accessed ON tasks (accessed_at)")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS task_keys (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_task_keys_expires ON task_keys (expires_at)")
+        conn.commit()
+        logger.info(f"SQLite任务存储已就绪: {db_path}")
+
+    def _get_conn(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        conn = self._get_conn()
+        row = conn.execute(
+            "SELECT data, accessed_at FROM tasks WHERE task_id = ?", (task_id,)
+        ).fetchone()
+        if not row:
+            return None
+
+        now = time.time()
+        if now - row[1] > self.ACCESS_GRANULARITY:
+            conn.execute("UPDATE tasks SET accessed_at = ? WHERE task_id = ?", (now, task_id))
+            conn.commit()
+        return json.loads(row[0])
+
+    def put(self, task_id: str, data: Dict[str, Any]) -> None:
+        now = time.time()
+        conn = self._get_conn()
+        conn.execute(
+            """
+            INSERT INTO tasks (task_id, status, data, created_at, updated_at, accessed_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(task_id) DO UPDATE SET
+                status = excluded.status,
+                data = excluded.data,
+                updated_at = excluded.updated_at,
+                accessed_at = excluded.accessed_at
+            """,
+            (task_id, data.get("status"), json.dumps(data, ensure_ascii=False), now, now, now)
+        )
+        conn.commit()
+
+    def delete(self, task_id: str) -> bool:
+        conn = self._get_conn()
+        cursor = conn.execute("DELETE FROM tasks WHERE task_id = ?", (task_id,))
+        conn.commit()
+        return cursor.rowcount > 0
+
+    def count(self) -> int:
+        return self._get_conn().execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+
+    def claim_key(self, key: str, value: str, ttl: float) -> Optional[str]:
+        now = time.time()
+        conn = self._get_conn()
+        # 过期的键视为不存在，直接覆盖；INSERT的原子性保证多个进程只有一个登记成功
+        cursor = conn.execute(
+            """
+            INSERT INTO task_keys (key, value, expires_at) VALUES (?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at
+            WHERE task_keys.expires_at <= ?
+            """,
+            (key, value, now + ttl, now)
+        )
+        conn.commit()
+        if cursor.rowcount > 0:
+            return None
+        row = conn.execute("SELECT value FROM task_keys WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def get_key(self, key: str) -> Optional[str]:
+        row = self._get_conn().execute(
+            "SELECT value FROM task_keys WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def list_keys(self, prefix: str) -> Dict[str, str]:
+        # 用范围条件代替LIKE，可以使用主键索引
+        rows = self._get_conn().execute(
+            "SELECT key, value FROM task_keys WHERE key >= ? AND key < ? AND expires_at > ?",
+            (prefix, prefix + "\uffff", time.time())
+        ).fetchall()
+        return dict(rows)
+
+    def set_key(self, key: str, value: str, ttl: float) -> None:
+        conn = self._get_conn()
+        conn.execute(
+            """
+            INSERT INTO task_keys (key, value, expires_at) VALUES (?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at
+            """,
+            (key, value, time.time() + ttl)
+        )
+        conn.commit()
+
+    def release_key(self, key: str, value: Optional[str] = None) -> bool:
+        conn = self._get_conn()
+        if value is None:
+            cursor = conn.execute("DELETE FROM task_keys WHERE key = ?", (key,))
+        else:
+            cursor = conn.execute("DELETE FROM task_keys WHERE key = ? AND value = ?", (key, value))
+        conn.commit()
+        return cursor.rowcount > 0
+
+    def _evict(self, now: float) -> int:
+        policy = self.retention
+        conn = self._get_conn()
+        placeholders = ", ".join("?" for _ in FINISHED_STATUSES)
+        evicted = 0
+
+        if policy.max_age_seconds is not None:
+            cursor = conn.execute(
+                f"DELETE FROM tasks WHERE status IN ({placeholders}) AND updated_at < ?",
+                (*FINISHED_STATUSES, now - policy.max_age_seconds)
+            )
+            evicted += cursor.rowcount
+
+        if policy.max_finished is not None:
+            cursor = conn.execute(
+                f"""
+                DELETE FROM tasks WHERE task_id IN (
+                    SELECT task_id FROM tasks WHERE status IN ({placeholders})
+                    ORDER BY updated_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (*FINISHED_STATUSES, policy.max_finished)
+            )
+            evicted += cursor.rowcount
+
+        if policy.lru_capacity is not None:
+            overflow = conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0] - policy.lru_capacity
+            if overflow > 0:
+                # 只淘汰已结束的任务，进行中的任务不受数量上限影响
+                cursor = conn.execute(
+                    f"""
+                    DELETE FROM tasks WHERE task_id IN (
+                        SELECT task_id FROM tasks WHERE status IN ({placeholders})
+                        ORDER BY accessed_at LIMIT ?
+                    )
+                    """,
+                    (*FINISHED_STATUSES, overflow)
+                )
+                evicted += cursor.rowcount
+
+        conn.execute("DELETE FROM task_keys WHERE expires_at <= ?", (now,))
+        conn.commit()
+        return evicted
+
+class RedisTaskStore(TaskStore):
+    """
+    基于Redis（或兼容Redis协议的存储）的任务存储，适用于多节点部署
+    需要额外安装redis包: pip install redis
+    """
+
+    def __init__(self, url: str, key_prefix: str = "xhs2ai:task:", retention: Optional[RetentionPolicy] = None):
+        """
+        初始化Redis任务存储
+        已结束任务通过键过期实现max_age；已结束任务另外记录在两个有序集合中，分数分别为结束时间和最近访问时间，
+        压缩时按前者执行max_age清理和数量上限、按后者执行LRU淘汰，进行中的任务不会被淘汰。
+        所有任务ID记录在一个集合中，任务总数直接取集合大小，不需要遍历键空间
+
+        Args:
+            url: Redis连接地址，例如 redis://localhost:6379/0
+            key_prefix: 任务键前缀
+            retention: 任务保留策略
+        """
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("使用Redis任务存储需要安装redis包: pip install redis") from e
+
+        self.client = redis.Redis.from_url(url)
+        self.key_prefix = key_prefix
+        self.retention = retention or RetentionPolicy()
+        self._build_index()
+        logger.info(f"Redis任务存储已就绪: {url}")
+
+    def _key(self, task_id: str) -> str:
+        return f"{self.key_prefix}{task_id}"
+
+    # 以下索引键不与任务键使用相同前缀
+    @property
+    def _finished_key(self) -> str:
+        """已结束任务的有序集合，分数为结束时间"""
+        return f"{self.key_prefix.rstrip(':')}-finished"
+
+    @property
+    def _accessed_key(self) -> str:
+        """已结束任务的有序集合，分数为最近访问时间"""
+        return f"{self.key_prefix.rstrip(':')}-accessed"
+
+    @property
+    def _ids_key(self) -> str:
+        """所有任务ID的集合"""
+        return f"{self.key_prefix.rstrip(':')}-ids"
+
+    def _build_index(self) -> None:
+        """从旧版本升级时（还没有任务ID集合和访问时间集合）根据已有数据建立一次"""
+        if not self.client.exists(self._ids_key):
+            start = len(self.key_prefix)
+            task_ids = [key.decode("utf-8")[start:] for key in self.client.scan_iter(match=f"{self.key_prefix}*")]
+            if task_ids:
+                self.client.sadd(self._ids_key, *task_ids)
+        if not self.client.exists(self._accessed_key) and self.client.exists(self._finished_key):
+            # 旧版本的已结束集合记录的是访问时间
+            self.client.zunionstore(self._accessed_key, [self._finished_key])
+
+    def _forget(self, task_ids: List[Any]) -> None:
+        """从各索引中移除任务（任务键已不存在）"""
+        pipe = self.client.pipeline()
+        pipe.srem(self._ids_key, *task_ids)
+        pipe.zrem(self._finished_key, *task_ids)
+        pipe.zrem(self._accessed_key, *task_ids)
+        pipe.execute()
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        raw = self.client.get(self._key(task_id))
+        if not raw:
+            # 任务键可能已按过期时间被删除，顺便清理索引
+            self._forget([task_id])
+            return None
+        data = json.loads(raw)
+        if data.get("status") in FINISHED_STATUSES:
+            # 记录访问时间，xx只更新已有成员
+            self.client.zadd(self._accessed_key, {task_id: time.time()}, xx=True)
+        return data
+
+    def put(self, task_id: str, data: Dict[str, Any]) -> None:
+        expire = None
+        finished = data.get("status") in FINISHED_STATUSES
+        if finished and self.retention.max_age_seconds is not None:
+            expire = int(self.retention.max_age_seconds)
+        now = time.time()
+        pipe = self.client.pipeline()
+        pipe.set(self._key(task_id), json.dumps(data, ensure_ascii=False), ex=expire)
+        pipe.sadd(self._ids_key, task_id)
+        if finished:
+            # 结束时间与键的过期时间一致，都从最后一次写入开始计算
+            pipe.zadd(self._finished_key, {task_id: now})
+            pipe.zadd(self._accessed_key, {task_id: now})
+        else:
+            pipe.zrem(self._finished_key, task_id)
+            pipe.zrem(self._accessed_key, task_id)
+        pipe.execute()
+
+    def delete(self, task_id: str) -> bool:
+        pipe = self.client.pipeline()
+        pipe.delete(self._key(task_id))
+        pipe.srem(self._ids_key, task_id)
+        pipe.zrem(self._finished_key, task_id)
+        pipe.zrem(self._accessed_key, task_id)
+        return pipe.execute()[0] > 0
+
+    def count(self) -> int:
+        return self.client.scard(self._ids_key)
+
+    def _claim_key(self, key: str) -> str:
+        return f"{self.key_prefix.rstrip(':')}-key:{key}"
+
+    def claim_key(self, key: str, value: str, ttl: float) -> Optional[str]:
+        redis_key = self._claim_key(key)
+        if self.client.set(redis_key, value, px=int(ttl * 1000), nx=True):
+            return None
+        existing = self.client.get(redis_key)
+        return existing.decode("utf-8") if existing else None
+
+    def get_key(self, key: str) -> Optional[str]:
+        existing = self.client.get(self._claim_key(key))
+        return existing.decode("utf-8") if existing else None
+
+    def list_keys(self, prefix: str) -> Dict[str, str]:
+        redis_prefix = self._claim_key(prefix)
+        keys = list(self.client.scan_iter(match=f"{redis_prefix}*"))
+        if not keys:
+            return {}
+        start = len(self._claim_key(""))
+        return {
+            key.decode("utf-8")[start:]: value.decode("utf-8")
+            for key, value in zip(keys, self.client.mget(keys)) if value is not None
+        }
+
+    def set_key(self, key: str, value: str, ttl: float) -> None:
+        self.client.set(self._claim_key(key), value, px=int(ttl * 1000))
+
+    def release_key(self, key: str, value: Optional[str] = None) -> bool:
+        redis_key = self._claim_key(key)
+        if value is None:
+            return self.client.delete(redis_key) > 0
+        # 比较并删除需要在服务端原子执行
+        script = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+        return self.client.eval(script, 1, redis_key, value) > 0
+
+    def _remove_finished(self, task_ids: List[bytes]) -> int:
+        """删除已结束的任务并从各索引中移除，返回实际删除的任务键数量"""
+        if not task_ids:
+            return 0
+        pipe = self.client.pipeline()
+        pipe.delete(*(self._key(task_id.decode("utf-8")) for task_id in task_ids))
+        pipe.srem(self._ids_key, *task_ids)
+        pipe.zrem(self._finished_key, *task_ids)
+        pipe.zrem(self._accessed_key, *task_ids)
+        return pipe.execute()[0]
+
+    def _evict(self, now: float) -> int:
+        policy = self.retention
+        evicted = 0
+
+        if policy.max_age_seconds is not None:
+            # 任务键通常已由Redis按过期时间删除，这里清理索引，只有仍存在的键计入淘汰数量
+            cutoff = now - policy.max_age_seconds
+            evicted += self._remove_finished(self.client.zrangebyscore(self._finished_key, "-inf", cutoff))
+
+        if policy.max_finished is not None:
+            overflow = self.client.zcard(self._finished_key) - policy.max_finished
+            if overflow > 0:
+                evicted += self._remove_finished(self.client.zrange(self._finished_key, 0, overflow - 1))
+
+        if policy.lru_capacity is not None:
+            overflow = self.count() - policy.lru_capacity
+            if overflow > 0:
+                evicted += self._remove_finished(self.client.zrange(self._accessed_key, 0, overflow - 1))
+
+        return evicted
+
+def create_task_store(backend: Optional[str] = None) -> TaskStore:
+    """
+    根据配置创建任务存储后端
+
+    Args:
+        backend: 后端类型(sqlite/memory/redis)，默认读取TASK_STORE_BACKEND环境变量
+
+    Returns:
+        任务存储实例
+    """
+    backend = (backend or os.getenv("TASK_STORE_BACKEND", "sqlite")).lower()
+    retention = RetentionPolicy.from_env()
+
+    if backend == "memory":
+        return MemoryTaskStore(retention=retention)
+    if backend == "sqlite":
+        return SQLiteTaskStore(
+            os.getenv("TASK_STORE_PATH", os.path.join("data", "tasks.db")),
+            retention=retention
+        )
+    if backend == "redis":
+        return RedisTaskStore(
+            os.getenv("TASK_STORE_REDIS_URL", "redis://localhost:6379/0"),
+            retention=retention
+        )
+
+    raise ValueError(f"不支持的任务存储后端: {backend}，可选值为 sqlite、memory、redis")
+
+# 单例实例
+_task_store = None
+
+def get_task_store() -> TaskStore:
+    """
+    获取任务存储实例（单例模式）
+
+    Returns:
+        TaskStore实例
+    """
+    global _task_store
+    if _task_store is None:
+        _task_store = create_task_store()
+    return _task_store
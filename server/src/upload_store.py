@@ -0,0 +1,183 @@
+import os
+import json
+import logging
+from typing import Optional, Dict, Any
+from dotenv import load_dotenv
+from starlette.concurrency import run_in_threadpool
+
+try:
+    from .blob_store import BlobStore
+except ImportError:
+    from blob_store import BlobStore
+
+load_dotenv()
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 每次从上传文件读取的字节数
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# 图片文件头 -> 扩展名
+IMAGE_SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"GIF87a", ".gif"),
+    (b"GIF89a", ".gif"),
+    (b"BM", ".bmp"),
+]
+
+class UploadRejectedError(ValueError):
+    """上传文件过大或不是支持的图片"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+def detect_image_type(head: bytes) -> Optional[str]:
+    """
+    根据文件头判断图片类型，不信任客户端提供的文件名和Content-Type
+
+    Args:
+        head: 文件开头的字节
+
+    Returns:
+        扩展名（例如 .png），不是支持的图片时返回None
+    """
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    for signature, extension in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    return None
+
+async def save_image_upload(upload: Any, blob_store: BlobStore, directory: str = "uploads",
+                            max_bytes: int = 10 * 1024 * 1024) -> Dict[str, Any]:
+    """
+    分块读取上传的图片，边写入边计算哈希，文件按内容命名，相同内容的重复上传返回同一个路径
+
+    读取在事件循环中异步进行，写入和哈希计算在线程池中进行，
+    第一块数据不是图片或累计大小超出上限时立即停止并丢弃已写入的内容
+
+    Args:
+        upload: FastAPI的UploadFile
+        blob_store: 文件存储
+        directory: 上传目录
+        max_bytes: 单个文件的大小上限
+
+    Returns:
+        包含path（文件路径）、url、sha256、size和deduplicated（是否与已有文件相同）的字典
+
+    Raises:
+        UploadRejectedError: 文件为空、不是支持的图片(415)或超出大小上限(413)
+    """
+    writer = blob_store.writer(directory=directory)
+    await run_in_threadpool(writer.open)
+    extension = None
+    try:
+        while True:
+            chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            if extension is None:
+                extension = detect_image_type(chunk)
+                if extension is None:
+                    raise UploadRejectedError(415, f"不支持的文件类型: {upload.filename}，只能上传PNG、JPEG、GIF、WebP或BMP图片")
+            if writer.size + len(chunk) > max_bytes:
+                raise UploadRejectedError(413, f"文件过大: {upload.filename}，最大 {max_bytes // (1024 * 1024)}MB")
+            await run_in_threadpool(writer.write, chunk)
+        if extension is None:
+            raise UploadRejectedError(400, f"文件为空: {upload.filename}")
+    except BaseException:
+        await run_in_threadpool(writer.abort)
+        raise
+
+    digest = await run_in_threadpool(writer.close)
+    # 按内容命名（两级目录），相同内容得到相同的路径
+    path = os.path.join(directory, digest[:2], f"{digest}{extension}")
+    await run_in_threadpool(writer.link, path)
+    if writer.existed:
+        logger.info(f"上传文件与已有文件相同: {path}")
+    return {
+        "path": path,
+        "url": "/" + path.replace(os.sep, "/"),
+        "sha256": digest,
+        "size": writer.size,
+        "deduplicated": writer.existed
+    }
+
+class RequestBodyTooLargeError(Exception):
+    """请求体在接收过程中超出大小上限"""
+
+class UploadSizeLimitMiddleware:
+    """
+    上传请求大小限制（ASGI中间件）
+    在解析multipart请求体之前按Content-Length拒绝过大的请求，不再先把整个请求体读入临时文件；
+    没有Content-Length的请求（分块传输）在接收时累计字节数，超出上限时停止接收并返回413
+    """
+
+    def __init__(self, app, path: str, max_bytes: int):
+        """
+        初始化中间件
+
+        Args:
+            app: ASGI应用
+            path: 需要限制的请求路径
+            max_bytes: 请求体的大小上限
+        """
+        self.app = app
+        self.path = path
+        self.max_bytes = max_bytes
+
+    async def _reject(self, send) -> None:
+        """返回413"""
+        body = json.dumps({"detail": f"上传内容过大，最大 {self.max_bytes // (1024 * 1024)}MB"},
+                          ensure_ascii=False).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] != self.path:
+            await self.app(scope, receive, send)
+            return
+        for name, value in scope["headers"]:
+            if name == b"content-length" and value.isdigit() and int(value) > self.max_bytes:
+                await self._reject(send)
+                return
+
+        received = 0
+        exceeded = False
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    exceeded = True
+                    raise RequestBodyTooLargeError(f"请求体超过 {self.max_bytes} 字节")
+            return message
+
+        async def guarded_send(message):
+            nonlocal response_started
+            if exceeded:
+                # 应用可能把接收请求体时的异常转换成了其他响应（例如FastAPI返回400），改为返回413
+                if message["type"] == "http.response.start" and not response_started:
+                    response_started = True
+                    await self._reject(send)
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except RequestBodyTooLargeError:
+            if not response_started:
+                await self._reject(send)
@@ -1,14 +1,26 @@
 from typing import Optional
-from langchain_community.document_loaders import WebBaseLoader
-from langchain_openai import ChatOpenAI
-from langchain.prompts import ChatPromptTemplate
-from langchain.chains import LLMChain
-from langchain.output_parsers import PydanticOutputParser
+from bs4 import BeautifulSoup
 from pydantic import BaseModel, Field
 import os
 from dotenv import load_dotenv
 import logging
 import json
+import re
+import math
+from typing import List, Tuple, Callable, TYPE_CHECKING
+try:
+    from .llm_cache import get_llm_cache
+    from .page_cache import get_page_cache
+    from .http_client import get_http_session
+    from .job_executor import map_sequentially
+except ImportError:
+    from llm_cache import get_llm_cache
+    from page_cache import get_page_cache
+    from http_client import get_http_session
+    from job_executor import map_sequentially
+
+if TYPE_CHECKING:
+    from langchain.chains import LLMChain
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -20,8 +32,160 @@ class RewrittenContent(BaseModel):
     title: str = Field(description="重写后的标题")
     content: str = Field(description="重写后的正文内容")
 
+# 中日韩文字，每个字大约对应一个token
+CJK_PATTERN = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]")
+WORD_PATTERN = re.compile(r"[A-Za-z0-9]+")
+SENTENCE_PATTERN = re.compile(r"(?<=[。！？!?.;；])\s*")
+# 语言检测用的文字类别：汉字、日文假名和韩文、其他文字的单词（不含数字、标点和表情）
+HAN_PATTERN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]")
+KANA_HANGUL_PATTERN = re.compile(r"[\u3040-\u30ff\uac00-\ud7af]")
+OTHER_WORD_PATTERN = re.compile(r"[^\W\d_\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]+")
+# 汉字占（汉字+假名谚文+其他文字单词）的比例不低于该值时视为中文，中文里夹杂英文术语仍判为中文
+CHINESE_RATIO = 0.5
+
+def sample_text(text: str, sample_chars: int = 600, windows: int = 3) -> str:
+    """
+    从长文本的开头、中间和结尾等距截取若干片段，语言检测不必扫描全文
+
+    Args:
+        text: 文本
+        sample_chars: 抽样的总字符数
+        windows: 抽样片段数
+
+    Returns:
+        抽样得到的文本，短文本原样返回
+    """
+    if len(text) <= sample_chars:
+        return text
+    size = sample_chars // windows
+    step = (len(text) - size) / (windows - 1)
+    return "".join(text[int(i * step):int(i * step) + size] for i in range(windows))
+
+def is_chinese(text: str) -> bool:
+    """
+    按文字比例判断文本是否为中文，只统计抽样片段中的文字，汉字按字、其他文字按单词计数，
+    弯引号、表情、数字等不影响判断；没有文字的文本（纯数字、符号）视为不需要翻译
+
+    Args:
+        text: 文本
+
+    Returns:
+        是否为中文（或不需要翻译）
+    """
+    sample = sample_text(text)
+    han = len(HAN_PATTERN.findall(sample))
+    kana_hangul = len(KANA_HANGUL_PATTERN.findall(sample))
+    words = len(OTHER_WORD_PATTERN.findall(sample))
+    units = han + kana_hangul + words
+    if not units:
+        return True
+    # 日文和韩文同样可能包含汉字，中文里几乎不会出现假名和谚文
+    if kana_hangul >= max(1, 0.1 * (han + kana_hangul)):
+        return False
+    return han / units >= CHINESE_RATIO
+
+def split_by_language(text: str) -> List[Tuple[bool, str]]:
+    """
+    按段落检测语言，把相邻的同语言段落合并成片段
+
+    Args:
+        text: 文本
+
+    Returns:
+        (是否为中文, 片段文本) 列表，保持原文顺序
+    """
+    segments: List[Tuple[bool, List[str]]] = []
+    for paragraph in (p.strip() for p in text.split("\n")):
+        if not paragraph:
+            continue
+        chinese = is_chinese(paragraph)
+        if segments and segments[-1][0] == chinese:
+            segments[-1][1].append(paragraph)
+        else:
+            segments.append((chinese, [paragraph]))
+    return [(chinese, "\n".join(paragraphs)) for chinese, paragraphs in segments]
+
+def estimate_tokens(text: str) -> int:
+    """
+    估算文本的token数量，不依赖分词器：汉字按1个、英文单词按1.3个、其余符号按1个计算
+
+    Args:
+        text: 文本
+
+    Returns:
+        估算的token数量
+    """
+    cjk = len(CJK_PATTERN.findall(text))
+    words = WORD_PATTERN.findall(text)
+    others = len(re.sub(r"\s", "", CJK_PATTERN.sub("", WORD_PATTERN.sub("", text))))
+    return cjk + math.ceil(len(words) * 1.3) + others
+
+def split_into_chunks(text: str, max_tokens: int) -> List[str]:
+    """
+    按段落把长文本切分成不超过max_tokens的块，超长的段落再按句子切分，
+    单个句子仍然超长时按字符硬切
+
+    Args:
+        text: 文本
+        max_tokens: 每块的最大token数
+
+    Returns:
+        文本块列表，保持原文顺序
+    """
+    pieces: List[str] = []
+    for paragraph in (p.strip() for p in text.split("\n")):
+        if not paragraph:
+            continue
+        if estimate_tokens(paragraph) <= max_tokens:
+            pieces.append(paragraph)
+            continue
+        for sentence in (s for s in SENTENCE_PATTERN.split(paragraph) if s):
+            while estimate_tokens(sentence) > max_tokens:
+                # 按估算比例截取，保证每次至少前进一个字符
+                cut = max(1, len(sentence) * max_tokens // estimate_tokens(sentence))
+                pieces.append(sentence[:cut])
+                sentence = sentence[cut:]
+            pieces.append(sentence)
+
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    for piece in pieces:
+        tokens = estimate_tokens(piece)
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append("\n".join(current))
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += tokens
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
 class UrlContentRewriter:
-    def __init__(self):
+    def __init__(self,
+                 chunk_tokens: int = None,
+                 rewrite_max_tokens: int = None,
+                 max_parallel: int = None,
+                 map_fn: Optional[Callable] = None):
+        """
+        初始化URL内容重写器
+
+        Args:
+            chunk_tokens: 长文分块翻译/提炼时每块的最大token数，默认读取URL_CHUNK_TOKENS（2000）
+            rewrite_max_tokens: 一次重写的最大输入token数，超出时先分块提炼要点，默认读取URL_REWRITE_MAX_TOKENS（6000）
+            max_parallel: 每个请求分块并发调用模型的数量上限，默认读取URL_MAX_PARALLEL（4）
+            map_fn: 并发调用模型的函数，签名与JobExecutor.map（已指定作业类型）相同，默认依次调用
+        """
+        from langchain_openai import ChatOpenAI
+        from langchain.prompts import ChatPromptTemplate
+        from langchain.chains import LLMChain
+
+        self.chunk_tokens = chunk_tokens or int(os.getenv("URL_CHUNK_TOKENS", "2000"))
+        self.rewrite_max_tokens = rewrite_max_tokens or int(os.getenv("URL_REWRITE_MAX_TOKENS", "6000"))
+        self.max_parallel = max_parallel or int(os.getenv("URL_MAX_PARALLEL", "4"))
+        # 分块的并发调用通过map_fn借用作业执行器的名额，计入LLM作业的并发上限
+        self.map_fn = map_fn or map_sequentially
+
         self.llm = ChatOpenAI(
             model="deepseek-chat",
             openai_api_key=os.getenv("LLM_API_KEY"),
@@ -30,7 +194,7 @@ class UrlContentRewriter:
         )
         
         self.translation_prompt = ChatPromptTemplate.from_messages([
-            ("system", "你是一个专业的翻译专家。请将以下英文内容翻译成中文，保持原文的语气和风格。"),
+            ("system", "你是一个专业的翻译专家。请将以下外文内容翻译成中文，保持原文的语气和风格。"),
             ("user", "{text}")
         ])
         
@@ -50,6 +214,13 @@ class UrlContentRewriter:
             ("user", "{text}")
         ])
         
+        # 长文先分块提炼要点，再对提炼后的内容做一次重写
+        self.condense_prompt = ChatPromptTemplate.from_messages([
+            ("system", """你是一个专业的编辑。以下是一篇长文章中的一个片段，请用中文提炼出其中的要点。
+            保留关键事实、数据、案例、人物和引语，去掉重复和无关的内容，按原文顺序输出，不需要任何格式标记。"""),
+            ("user", "{text}")
+        ])
+        
         self.translation_chain = LLMChain(
             llm=self.llm,
             prompt=self.translation_prompt
@@ -59,24 +230,127 @@ class UrlContentRewriter:
             llm=self.llm,
             prompt=self.rewrite_prompt
         )
+        
+        self.condense_chain = LLMChain(
+            llm=self.llm,
+            prompt=self.condense_prompt
+        )
+        
+        self.cache = get_llm_cache()
+        self.page_cache = get_page_cache()
     
-    def _is_english(self, text: str) -> bool:
-        """简单判断文本是否为英文"""
-        return all(ord(char) < 128 for char in text)
+    def _parse_page(self, response) -> str:
+        """从网页响应中提取正文文本"""
+        response.encoding = response.apparent_encoding
+        parser = "xml" if response.url.endswith(".xml") else "html.parser"
+        return BeautifulSoup(response.text, parser).get_text()
     
-    def _extract_content(self, url: str) -> str:
-        """从URL中提取内容"""
+    def _extract_content(self, url: str, use_cache: bool = True) -> str:
+        """
+        从URL中提取内容，同一URL的正文由网页缓存提供，过期后用条件请求重新验证
+
+        Args:
+            url: 文章URL
+            use_cache: 是否使用网页缓存，为False时重新下载
+
+        Returns:
+            网页正文
+        """
         logger.info(f"开始从URL提取内容: {url}")
         try:
-            loader = WebBaseLoader(url)
-            docs = loader.load()
-            content = "\n".join(doc.page_content for doc in docs)
+            content = self.page_cache.fetch(
+                url,
+                get_http_session(),
+                self._parse_page,
+                headers={"User-Agent": os.getenv("USER_AGENT", "Mozilla/5.0")},
+                use_cache=use_cache
+            )
             logger.info(f"成功提取内容，长度: {len(content)}")
             return content
         except Exception as e:
             logger.error(f"提取内容失败: {str(e)}")
             raise
     
+    def _map_chunks(self, name: str, chain: "LLMChain", chunks: List[str], use_cache: bool) -> List[str]:
+        """
+        并发地对每个文本块调用同一个链，结果保持原文顺序
+
+        Args:
+            name: 缓存中的链名称
+            chain: LLMChain实例
+            chunks: 文本块列表
+            use_cache: 是否使用LLM响应缓存，每个块分别缓存
+
+        Returns:
+            各块的输出文本
+        """
+        if len(chunks) == 1:
+            return [self.cache.invoke(name, chain, {"text": chunks[0]}, use_cache=use_cache)["text"]]
+        outputs: List[str] = [""] * len(chunks)
+        for index, result, error in self.map_fn(
+            lambda i: self.cache.invoke(name, chain, {"text": chunks[i]}, use_cache),
+            range(len(chunks)),
+            self.max_parallel
+        ):
+            if error is not None:
+                raise error
+            outputs[index] = result["text"]
+        return outputs
+    
+    def _translate(self, segments: List[Tuple[bool, str]], use_cache: bool = True) -> str:
+        """
+        只翻译非中文的片段，中文片段保持原样；所有待翻译片段分块后一起并发翻译
+
+        Args:
+            segments: split_by_language返回的片段列表
+            use_cache: 是否使用LLM响应缓存
+
+        Returns:
+            按原文顺序拼接的中文内容
+        """
+        chunks: List[str] = []
+        spans: List[Tuple[int, int]] = []
+        for chinese, segment in segments:
+            if chinese:
+                continue
+            segment_chunks = split_into_chunks(segment, self.chunk_tokens)
+            spans.append((len(chunks), len(chunks) + len(segment_chunks)))
+            chunks.extend(segment_chunks)
+        logger.info(f"翻译分块数: {len(chunks)}")
+        translated = self._map_chunks("url.translate", self.translation_chain, chunks, use_cache)
+
+        parts = []
+        foreign = iter(spans)
+        for chinese, segment in segments:
+            if chinese:
+                parts.append(segment)
+            else:
+                start, end = next(foreign)
+                parts.append("\n".join(translated[start:end]))
+        return "\n".join(parts)
+    
+    def _condense(self, content: str, use_cache: bool = True) -> str:
+        """
+        内容超过一次重写的长度上限时，分块并发提炼要点，直到长度满足上限
+
+        Args:
+            content: 中文内容
+            use_cache: 是否使用LLM响应缓存
+
+        Returns:
+            可以一次重写的内容
+        """
+        for _ in range(3):
+            if estimate_tokens(content) <= self.rewrite_max_tokens:
+                break
+            chunks = split_into_chunks(content, self.chunk_tokens)
+            logger.info(f"内容过长，分{len(chunks)}块提炼要点")
+            condensed = "\n".join(self._map_chunks("url.condense", self.condense_chain, chunks, use_cache))
+            if estimate_tokens(condensed) >= estimate_tokens(content):
+                break
+            content = condensed
+        return content
+    
     def _parse_llm_output(self, output: str) -> RewrittenContent:
         """解析LLM输出的内容"""
         logger.info("开始解析LLM输出")
@@ -112,23 +386,41 @@ class UrlContentRewriter:
             logger.error(f"错误堆栈: {traceback.format_exc()}")
             raise
     
-    def process_url(self, url: str) -> RewrittenContent:
-        """处理URL并返回重写后的内容"""
+    def process_url(self, url: str, use_cache: bool = True) -> RewrittenContent:
+        """
+        处理URL并返回重写后的内容
+
+        Args:
+            url: 文章URL
+            use_cache: 是否使用网页缓存和LLM响应缓存，相同内容的翻译和重写直接返回缓存结果
+
+        Returns:
+            重写后的标题和正文
+        """
         logger.info(f"开始处理URL: {url}")
         try:
             # 1. 提取内容
-            content = self._extract_content(url)
+            content = self._extract_content(url, use_cache=use_cache)
             logger.info(f"提取的原始内容: {content[:500]}...")  # 打印前500个字符
             
-            # 2. 如果是英文，先翻译
-            if self._is_english(content):
-                logger.info("检测到英文内容，进行翻译")
-                content = self.translation_chain.invoke({"text": content})["text"]
-                logger.info(f"翻译后的内容: {content[:500]}...")
+            # 2. 非中文的段落先翻译，中文段落保持原样
+            translated = self.page_cache.get_translation(url, content) if use_cache else None
+            if translated is not None:
+                logger.info("使用缓存的译文")
+                content = translated
+            else:
+                segments = split_by_language(content)
+                if not all(chinese for chinese, _ in segments):
+                    logger.info(f"检测到非中文内容，翻译 {sum(1 for chinese, _ in segments if not chinese)}/{len(segments)} 个片段")
+                    translated = self._translate(segments, use_cache=use_cache)
+                    self.page_cache.put_translation(url, content, translated)
+                    content = translated
+                    logger.info(f"翻译后的内容: {content[:500]}...")
             
-            # 3. 重写内容
+            # 3. 长文先分块提炼要点，再重写内容
+            content = self._condense(content, use_cache=use_cache)
             logger.info("开始重写内容")
-            rewritten = self.rewrite_chain.invoke({"text": content})["text"]
+            rewritten = self.cache.invoke("url.rewrite", self.rewrite_chain, {"text": content}, use_cache=use_cache)["text"]
             logger.info(f"LLM原始输出: {rewritten}")  # 打印完整的LLM输出
             
             # 4. 解析输出
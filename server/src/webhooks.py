@@ -0,0 +1,106 @@
+import os
+import hmac
+import hashlib
+import logging
+from typing import Optional
+from urllib.parse import urlencode
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+class WebhookSigner:
+    """
+    回调通知URL签名器
+    提交远程任务时生成带HMAC签名的回调URL，签名覆盖提供方名称和本地任务ID，
+    收到回调时校验签名，拒绝伪造的通知。签名不覆盖通知内容，通知只用于唤醒对应任务的轮询，
+    结果总是重新向提供方查询。
+    多个工作进程需要配置相同的WEBHOOK_SECRET，回调可能落到任意一个进程
+    """
+
+    def __init__(self, base_url: Optional[str] = None, secret: Optional[str] = None):
+        """
+        初始化签名器
+
+        Args:
+            base_url: 本服务对外可访问的地址，例如 https://example.com
+            secret: 签名密钥
+        """
+        self.base_url = base_url.rstrip("/") if base_url else None
+        self.secret = secret
+
+    @classmethod
+    def from_env(cls) -> "WebhookSigner":
+        """根据环境变量WEBHOOK_BASE_URL和WEBHOOK_SECRET创建签名器"""
+        return cls(base_url=os.getenv("WEBHOOK_BASE_URL"), secret=os.getenv("WEBHOOK_SECRET"))
+
+    @property
+    def enabled(self) -> bool:
+        """是否已配置回调通知"""
+        return bool(self.base_url and self.secret)
+
+    def sign(self, provider: str, task_id: str) -> str:
+        """
+        计算签名
+
+        Args:
+            provider: 提供方名称，例如 minimaxi、kling
+            task_id: 本地任务ID
+
+        Returns:
+            十六进制签名
+        """
+        message = f"{provider}:{task_id}".encode("utf-8")
+        return hmac.new(self.secret.encode("utf-8"), message, hashlib.sha256).hexdigest()
+
+    def verify(self, provider: str, task_id: str, signature: str) -> bool:
+        """
+        校验签名
+
+        Args:
+            provider: 提供方名称
+            task_id: 本地任务ID
+            signature: 回调URL中携带的签名
+
+        Returns:
+            签名是否有效
+        """
+        if not self.secret or not signature:
+            return False
+        return hmac.compare_digest(self.sign(provider, task_id), signature)
+
+    def build_url(self, provider: str, task_id: str) -> Optional[str]:
+        """
+        生成回调通知URL
+
+        Args:
+            provider: 提供方名称
+            task_id: 本地任务ID
+
+        Returns:
+            回调URL，未配置回调通知时返回None
+        """
+        if not self.enabled:
+            return None
+        query = urlencode({"task_id": task_id, "sig": self.sign(provider, task_id)})
+        return f"{self.base_url}/api/webhooks/{provider}?{query}"
+
+# 单例实例
+_webhook_signer = None
+
+def get_webhook_signer() -> WebhookSigner:
+    """
+    获取回调签名器实例（单例模式）
+
+    Returns:
+        WebhookSigner实例
+    """
+    global _webhook_signer
+    if _webhook_signer is None:
+        _webhook_signer = WebhookSigner.from_env()
+        if not _webhook_signer.enabled:
+            logger.info("未配置WEBHOOK_BASE_URL/WEBHOOK_SECRET，远程任务仅通过轮询获取结果")
+    return _webhook_signer
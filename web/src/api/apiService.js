@@ -2,8 +2,8 @@
 
 const API_BASE_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000';
 
-// 基础API请求函数
-const apiRequest = async (endpoint, options = {}) => {
+// 构造API完整URL
+const buildApiUrl = (endpoint) => {
   // 确保baseUrl没有结尾的斜杠
   const baseUrl = API_BASE_URL.endsWith('/') 
     ? API_BASE_URL.slice(0, -1) 
@@ -19,7 +19,12 @@ const apiRequest = async (endpoint, options = {}) => {
     console.log('检测到重复的/api前缀，已修正:', normalizedEndpoint, '->', finalEndpoint);
   }
   
-  const url = `${baseUrl}${finalEndpoint}`;
+  return `${baseUrl}${finalEndpoint}`;
+};
+
+// 基础API请求函数
+const apiRequest = async (endpoint, options = {}) => {
+  const url = buildApiUrl(endpoint);
   console.log('API请求URL:', url);
   
   const defaultHeaders = {
@@ -54,6 +59,60 @@ const checkTaskStatus = async (taskId) => {
   return await apiRequest(`/api/tasks/${taskId}`);
 };
 
+// 订阅任务状态变化
+// 优先使用SSE(/api/tasks/{taskId}/events)由服务端推送，浏览器不支持或连接失败时回退为轮询
+// 任务完成或失败后自动停止，返回取消订阅的函数
+const subscribeTaskStatus = (taskId, onUpdate, onError, pollInterval = 2000) => {
+  let closed = false;
+  let eventSource = null;
+  let intervalId = null;
+  
+  const isFinished = (status) => status === 'completed' || status === 'failed';
+  
+  const unsubscribe = () => {
+    closed = true;
+    if (eventSource) eventSource.close();
+    if (intervalId) clearInterval(intervalId);
+  };
+  
+  const handleUpdate = (result) => {
+    if (closed) return;
+    onUpdate(result);
+    if (isFinished(result.status)) unsubscribe();
+  };
+  
+  const startPolling = () => {
+    if (closed || intervalId) return;
+    intervalId = setInterval(async () => {
+      try {
+        handleUpdate(await checkTaskStatus(taskId));
+      } catch (error) {
+        unsubscribe();
+        if (onError) onError(error);
+      }
+    }, pollInterval);
+  };
+  
+  if (typeof window !== 'undefined' && window.EventSource) {
+    eventSource = new EventSource(buildApiUrl(`/api/tasks/${taskId}/events`));
+    eventSource.addEventListener('status', (event) => {
+      handleUpdate(JSON.parse(event.data));
+    });
+    eventSource.onerror = () => {
+      if (closed) return;
+      // SSE连接失败（例如代理不支持长连接），回退为轮询
+      console.warn('任务状态推送连接失败，回退为轮询:', taskId);
+      eventSource.close();
+      eventSource = null;
+      startPolling();
+    };
+  } else {
+    startPolling();
+  }
+  
+  return unsubscribe;
+};
+
 // 获取生成的文件
 const getFile = (filePath) => {
   console.log('原始文件路径:', filePath);
@@ -90,6 +149,16 @@ const getFile = (filePath) => {
   return finalUrl;
 };
 
+// 获取缩放和转码后的图片（缩略图），格式默认由服务端按浏览器支持选择
+const getImageUrl = (filePath, { width = 320, format = 'auto', quality } = {}) => {
+  const imageId = filePath.replace(/^\/+/, '').replace(/^api\/files\//, '');
+  const params = new URLSearchParams({ w: String(width), fmt: format });
+  if (quality) {
+    params.set('q', String(quality));
+  }
+  return buildApiUrl(`/api/images/${imageId}?${params.toString()}`);
+};
+
 // 标题重写相关API
 const titleApi = {
   rewriteTitle: async (title, style) => {
@@ -237,7 +306,9 @@ const magazineCardApi = {
 // 导出API服务
 const apiService = {
   checkTaskStatus,
+  subscribeTaskStatus,
   getFile,
+  getImageUrl,
   title: titleApi,
   content: contentApi,
   image: imageApi,
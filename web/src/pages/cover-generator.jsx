@@ -130,52 +130,49 @@ export default function CoverGeneratorPage() {
     }, 500);
   };
 
-  // 检查任务状态
+  // 订阅任务状态（优先SSE推送，不可用时自动回退为轮询）
   useEffect(() => {
-    let intervalId;
+    let unsubscribe;
     
-    if (taskId && taskStatus !== 'completed' && taskStatus !== 'failed') {
-      intervalId = setInterval(async () => {
-        try {
-          const result = await apiService.checkTaskStatus(taskId);
-          setTaskStatus(result.status);
-          
-          if (result.status === 'completed') {
-            setIsGenerating(false);
-            if (result.result) {
-              // 获取完整的HTML文件路径
-              const htmlFilePath = result.result.local_path;
-              // 设置预览URL
-              const fileUrl = apiService.getFile(htmlFilePath);
-              setPreviewHtml(fileUrl);
-              
-              // 获取HTML内容
-              fetchHtmlContent(fileUrl);
-              
-              setGeneratedCover({
-                id: taskId,
-                platform: platform,
-                htmlPath: htmlFilePath,
-                timestamp: new Date().toISOString()
-              });
-            }
-          } else if (result.status === 'failed') {
-            setIsGenerating(false);
-            setErrorMessage(result.error || '生成封面时出错');
+    if (taskId) {
+      unsubscribe = apiService.subscribeTaskStatus(taskId, (result) => {
+        setTaskStatus(result.status);
+        
+        if (result.status === 'completed') {
+          setIsGenerating(false);
+          if (result.result) {
+            // 获取完整的HTML文件路径
+            const htmlFilePath = result.result.local_path;
+            // 设置预览URL
+            const fileUrl = apiService.getFile(htmlFilePath);
+            setPreviewHtml(fileUrl);
+            
+            // 获取HTML内容
+            fetchHtmlContent(fileUrl);
+            
+            setGeneratedCover({
+              id: taskId,
+              platform: platform,
+              htmlPath: htmlFilePath,
+              timestamp: new Date().toISOString()
+            });
           }
-        } catch (error) {
-          console.error('检查任务状态失败:', error);
-          setTaskStatus('failed');
+        } else if (result.status === 'failed') {
           setIsGenerating(false);
-          setErrorMessage('检查任务状态时出错');
+          setErrorMessage(result.error || '生成封面时出错');
         }
-      }, 2000);
+      }, (error) => {
+        console.error('检查任务状态失败:', error);
+        setTaskStatus('failed');
+        setIsGenerating(false);
+        setErrorMessage('检查任务状态时出错');
+      });
     }
     
     return () => {
-      if (intervalId) clearInterval(intervalId);
+      if (unsubscribe) unsubscribe();
     };
-  }, [taskId, taskStatus, platform]);
+  }, [taskId, platform]);
 
   // 获取HTML内容
   const fetchHtmlContent = async (url) => {
@@ -91,48 +91,45 @@ export default function ImageGeneratorPage() {
     fetchImageOptions();
   }, []);
   
-  // 检查任务状态
+  // 订阅任务状态（优先SSE推送，不可用时自动回退为轮询）
   useEffect(() => {
-    let intervalId;
+    let unsubscribe;
     
-    if (taskId && taskStatus !== 'completed' && taskStatus !== 'failed') {
-      intervalId = setInterval(async () => {
-        try {
-          const result = await apiService.checkTaskStatus(taskId);
-          setTaskStatus(result.status);
-          
-          if (result.status === 'completed') {
-            setIsGenerating(false);
-            if (result.result && result.result.images) {
-              const images = result.result.images.map(img => ({
-                url: img.url,
-                local_path: img.local_path
-              }));
-              setGeneratedImages(images);
-            } else if (result.result) {
-              // 针对Kling API的单张图片处理
-              setGeneratedImages([{
-                url: result.result.url,
-                local_path: result.result.local_path
-              }]);
-            }
-          } else if (result.status === 'failed') {
-            setIsGenerating(false);
-            setErrorMessage(result.error || '生成图像时出错');
+    if (taskId) {
+      unsubscribe = apiService.subscribeTaskStatus(taskId, (result) => {
+        setTaskStatus(result.status);
+        
+        if (result.status === 'completed') {
+          setIsGenerating(false);
+          if (result.result && result.result.images) {
+            const images = result.result.images.map(img => ({
+              url: img.url,
+              local_path: img.local_path
+            }));
+            setGeneratedImages(images);
+          } else if (result.result) {
+            // 针对Kling API的单张图片处理
+            setGeneratedImages([{
+              url: result.result.url,
+              local_path: result.result.local_path
+            }]);
           }
-        } catch (error) {
-          console.error('检查任务状态失败:', error);
-          setTaskStatus('failed');
+        } else if (result.status === 'failed') {
           setIsGenerating(false);
-          setErrorMessage('检查任务状态时出错');
+          setErrorMessage(result.error || '生成图像时出错');
         }
-      }, 2000);
+      }, (error) => {
+        console.error('检查任务状态失败:', error);
+        setTaskStatus('failed');
+        setIsGenerating(false);
+        setErrorMessage('检查任务状态时出错');
+      });
     }
     
     return () => {
-      if (intervalId) clearInterval(intervalId);
+      if (unsubscribe) unsubscribe();
     };
-  }, [taskId, taskStatus]);
+  }, [taskId]);
   
   // 提交海螺图像生成请求
   const handleMiniMaxiSubmit = async (e) => {
@@ -340,7 +337,10 @@ export default function ImageGeneratorPage() {
                     {generatedImages.map((image, index) => (
                       <div key={index} className="overflow-hidden rounded-lg border">
                         <img 
-                          src={image.url} 
+                          src={image.local_path ? apiService.getImageUrl(image.local_path, { width: 640 }) : image.url} 
+                          srcSet={image.local_path ? `${apiService.getImageUrl(image.local_path, { width: 320 })} 320w, ${apiService.getImageUrl(image.local_path, { width: 640 })} 640w, ${apiService.getImageUrl(image.local_path, { width: 1280 })} 1280w` : undefined}
+                          sizes="(min-width: 768px) 50vw, 100vw"
+                          loading="lazy"
                           alt={`Generated ${index + 1}`} 
                           className="w-full aspect-square object-cover"
                         />
@@ -476,7 +476,10 @@ export default function ImageGeneratorPage() {
                     {generatedImages.map((image, index) => (
                       <div key={index} className="overflow-hidden rounded-lg border">
                         <img 
-                          src={image.url} 
+                          src={image.local_path ? apiService.getImageUrl(image.local_path, { width: 640 }) : image.url} 
+                          srcSet={image.local_path ? `${apiService.getImageUrl(image.local_path, { width: 320 })} 320w, ${apiService.getImageUrl(image.local_path, { width: 640 })} 640w, ${apiService.getImageUrl(image.local_path, { width: 1280 })} 1280w` : undefined}
+                          sizes="(min-width: 768px) 50vw, 100vw"
+                          loading="lazy"
                           alt={`Generated ${index + 1}`} 
                           className="w-full aspect-square object-cover"
                         />
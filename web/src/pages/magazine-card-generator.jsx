@@ -309,50 +309,47 @@ export default function MagazineCardGeneratorPage() {
     }, 500);
   };
 
-  // 检查任务状态
+  // 订阅任务状态（优先SSE推送，不可用时自动回退为轮询）
   useEffect(() => {
-    let intervalId;
+    let unsubscribe;
     
-    if (taskId && taskStatus !== 'completed' && taskStatus !== 'failed') {
-      intervalId = setInterval(async () => {
-        try {
-          const result = await apiService.checkTaskStatus(taskId);
-          setTaskStatus(result.status);
-          
-          if (result.status === 'completed') {
-            setIsGenerating(false);
-            if (result.result) {
-              // 将API返回路径转换为完整URL
-              const fileUrl = apiService.getFile(result.result.html_path);
-              setPreviewHtml(fileUrl);
-              
-              // 获取HTML内容
-              fetchHtmlContent(fileUrl);
-              
-              setGeneratedCard({
-                id: result.result.card_id,
-                style: result.result.style,
-                htmlPath: result.result.html_path,
-                timestamp: new Date().toISOString()
-              });
-            }
-          } else if (result.status === 'failed') {
-            setIsGenerating(false);
-            setErrorMessage(result.error || '生成杂志卡片时出错');
+    if (taskId) {
+      unsubscribe = apiService.subscribeTaskStatus(taskId, (result) => {
+        setTaskStatus(result.status);
+        
+        if (result.status === 'completed') {
+          setIsGenerating(false);
+          if (result.result) {
+            // 将API返回路径转换为完整URL
+            const fileUrl = apiService.getFile(result.result.html_path);
+            setPreviewHtml(fileUrl);
+            
+            // 获取HTML内容
+            fetchHtmlContent(fileUrl);
+            
+            setGeneratedCard({
+              id: result.result.card_id,
+              style: result.result.style,
+              htmlPath: result.result.html_path,
+              timestamp: new Date().toISOString()
+            });
           }
-        } catch (error) {
-          console.error('检查任务状态失败:', error);
-          setTaskStatus('failed');
+        } else if (result.status === 'failed') {
           setIsGenerating(false);
-          setErrorMessage('检查任务状态时出错');
+          setErrorMessage(result.error || '生成杂志卡片时出错');
         }
-      }, 2000);
+      }, (error) => {
+        console.error('检查任务状态失败:', error);
+        setTaskStatus('failed');
+        setIsGenerating(false);
+        setErrorMessage('检查任务状态时出错');
+      });
     }
     
     return () => {
-      if (intervalId) clearInterval(intervalId);
+      if (unsubscribe) unsubscribe();
     };
-  }, [taskId, taskStatus]);
+  }, [taskId]);
 
   // 获取HTML内容
   const fetchHtmlContent = async (url) => {
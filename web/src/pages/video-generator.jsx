@@ -83,43 +83,40 @@ export default function VideoGeneratorPage() {
     setVideoOptions(mockVideoOptions);
   }, []);
   
-  // 检查任务状态
+  // 订阅任务状态（优先SSE推送，不可用时自动回退为轮询）
   useEffect(() => {
-    let intervalId;
+    let unsubscribe;
     
-    if (taskId && taskStatus !== 'completed' && taskStatus !== 'failed') {
-      intervalId = setInterval(async () => {
-        try {
-          const result = await apiService.checkTaskStatus(taskId);
-          setTaskStatus(result.status);
-          
-          if (result.status === 'completed') {
-            setIsGenerating(false);
-            if (result.result) {
-              setGeneratedVideo({
-                id: taskId,
-                videoUrl: result.result.video_url,
-                localPath: result.result.local_path,
-                timestamp: new Date().toISOString()
-              });
-            }
-          } else if (result.status === 'failed') {
-            setIsGenerating(false);
-            setErrorMessage(result.error || '生成视频时出错');
+    if (taskId) {
+      unsubscribe = apiService.subscribeTaskStatus(taskId, (result) => {
+        setTaskStatus(result.status);
+        
+        if (result.status === 'completed') {
+          setIsGenerating(false);
+          if (result.result) {
+            setGeneratedVideo({
+              id: taskId,
+              videoUrl: result.result.video_url,
+              localPath: result.result.local_path,
+              timestamp: new Date().toISOString()
+            });
           }
-        } catch (error) {
-          console.error('检查任务状态失败:', error);
-          setTaskStatus('failed');
+        } else if (result.status === 'failed') {
           setIsGenerating(false);
-          setErrorMessage('检查任务状态时出错');
+          setErrorMessage(result.error || '生成视频时出错');
         }
-      }, 2000);
+      }, (error) => {
+        console.error('检查任务状态失败:', error);
+        setTaskStatus('failed');
+        setIsGenerating(false);
+        setErrorMessage('检查任务状态时出错');
+      });
     }
     
     return () => {
-      if (intervalId) clearInterval(intervalId);
+      if (unsubscribe) unsubscribe();
     };
-  }, [taskId, taskStatus]);
+  }, [taskId]);
   
   // 提交MiniMaxi视频生成请求
   const handleMiniMaxiSubmit = async (e) => {